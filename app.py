@@ -1,64 +1,30 @@
 import streamlit as st
 import os
-import fitz # PyMuPDF
-import re
 from dotenv import load_dotenv
 load_dotenv()
 
-from modules.ingestion import ingest_pdf
-from modules.graph import app_graph
+from modules.ingestion import get_corpus_version, get_indexed_documents
+from modules.highlights import get_highlight_annotations
+from modules.router import get_router_stats
+from modules.answer_cache import get_answer_cache
+from modules.telemetry import trace_request, start_metrics_server
+from modules.async_runtime import run_async, iterate_async
+from modules.corpora import new_corpus_id, touch_corpus, corpus_exists, is_valid_corpus_id
+from modules.blobs import put_blob, blob_path, read_pdf
+from modules.jobs import submit_ingestion, get_job, list_jobs, is_active, get_job_queue
+from modules.warmup import start_warmup, get_warmup_timings
 from streamlit_pdf_viewer import pdf_viewer
 
 st.set_page_config(page_title="Agentic PDF System", layout="wide")
+start_metrics_server() # Serves /metrics only if METRICS_PORT is set
+get_job_queue() # Starts the ingestion worker (and resumes jobs interrupted by a restart)
 
-# --- ROBUST HIGHLIGHTER (Fixed for Rectangles) ---
-def get_highlight_coordinates(pdf_path, text_snippet, page_num):
-    """
-    Finds text using a flexible 'Bag of Words' approach.
-    Uses Standard Rectangles (x0, y0) to prevent AttributeErrors.
-    """
-    if not text_snippet: return []
-    doc = fitz.open(pdf_path)
-    # Safety Check
-    if page_num < 1 or page_num > len(doc): return []
-    page = doc[page_num - 1]
-    
-    annotations = []
-    
-    # 1. Clean the snippet
-    clean_snippet = re.sub(r'[^\w\s]', '', text_snippet).lower()
-    words = clean_snippet.split()
-    
-    # 2. Search Strategy: Try varying lengths of phrases
-    search_terms = []
-    if len(words) >= 15: search_terms.append(" ".join(words[:15]))
-    if len(words) >= 10: search_terms.append(" ".join(words[:10]))
-    if len(words) >= 5:  search_terms.append(" ".join(words[:5]))
-    if len(words) >= 3:  search_terms.append(" ".join(words[:3])) # Last resort
-    
-    # Fallback if text is very short
-    if not search_terms:
-        search_terms.append(clean_snippet)
-
-    # 3. Execute Search
-    for term in search_terms:
-        # CRITICAL FIX: Use quads=False to get Rectangles (safer)
-        rects = page.search_for(term, quads=False)
-        
-        if rects:
-            for rect in rects:
-                annotations.append({
-                    "page": page_num,
-                    "x": rect.x0, 
-                    "y": rect.y0,
-                    "width": rect.width, 
-                    "height": rect.height,
-                    "color": "red",
-                    "opacity": 0.5 
-                })
-            break # Stop if we found a match
-            
-    return annotations
+@st.cache_resource(show_spinner=False)
+def start_background_warmup():
+    # Once per server process: the graph, embedder, Chroma and LLM client load while the first page renders
+    return start_warmup()
+
+start_background_warmup()
 
 # --- SESSION STATE ---
 if "messages" not in st.session_state: st.session_state.messages = []
@@ -68,29 +34,81 @@ if "annotations" not in st.session_state: st.session_state.annotations = []
 if "current_page" not in st.session_state: st.session_state.current_page = 1
 if "show_all_pages" not in st.session_state: st.session_state.show_all_pages = True
 if "current_file_name" not in st.session_state: st.session_state.current_file_name = None
+if "stream_answers" not in st.session_state: st.session_state.stream_answers = True
+if "last_trace" not in st.session_state: st.session_state.last_trace = None
+# Each session indexes and searches its own document set.
+# The corpus ID is kept in the URL so a page refresh finds its documents (and running job) again.
+if "corpus_id" not in st.session_state:
+    requested = st.query_params.get("corpus")
+    # The ID ends up in storage paths: anything not minted by new_corpus_id() gets a fresh corpus
+    st.session_state.corpus_id = requested if requested and is_valid_corpus_id(requested) else new_corpus_id()
+    st.query_params["corpus"] = st.session_state.corpus_id
+if "job_id" not in st.session_state:
+    jobs = list_jobs(st.session_state.corpus_id)
+    st.session_state.job_id = jobs[0]["job_id"] if jobs else None
+
+def sync_indexed_documents():
+    """Documents become available in the chat (and viewer) one by one as ingestion commits them."""
+    indexed = get_indexed_documents(st.session_state.corpus_id)
+    # File name -> content-addressed PDF blob
+    st.session_state.file_map = {name: blob_path(doc_hash) for name, doc_hash in indexed.items()
+                                 if os.path.exists(blob_path(doc_hash))}
+    st.session_state.vector_db_ready = bool(st.session_state.file_map)
+    if st.session_state.current_file_name not in st.session_state.file_map and st.session_state.file_map:
+        st.session_state.current_file_name = next(iter(st.session_state.file_map))
 
 # --- UI ---
 st.title("🤖 Agentic PDF Reasoning System")
 st.caption("Multi-Doc Support | Planner | RAG -> Reason Chain")
 
+if st.session_state.file_map and not corpus_exists(st.session_state.corpus_id):
+    # Evicted after being idle too long (or to stay within the disk budget)
+    st.session_state.vector_db_ready = False
+    st.session_state.file_map = {}
+    st.session_state.annotations = []
+    st.warning("Your documents expired after a period of inactivity. Please upload them again.")
+sync_indexed_documents()
+
 with st.sidebar:
     st.header("📂 Multi-Doc Navigator")
     uploaded_files = st.file_uploader("Upload PDF(s)", type=["pdf"], accept_multiple_files=True)
     
-    if uploaded_files and st.button("🚀 Process All Docs"):
-        with st.spinner("Indexing all documents..."):
-            if not os.path.exists("temp_pdf"): os.makedirs("temp_pdf")
-            st.session_state.file_map = {} 
-            for file in uploaded_files:
-                temp_path = os.path.join("temp_pdf", file.name)
-                with open(temp_path, "wb") as f: f.write(file.getbuffer())
-                st.session_state.file_map[file.name] = temp_path
-            
-            if uploaded_files: st.session_state.current_file_name = uploaded_files[0].name
+    precompute_summaries = st.checkbox("📝 Precompute summaries", value=False,
+                                       help="Builds per-document summaries during indexing so summarize requests answer instantly.")
+    job = get_job(st.session_state.job_id) if st.session_state.job_id else None
+    if uploaded_files and st.button("🚀 Process All Docs", disabled=is_active(job)):
+        # Indexing runs in a background job; the page stays usable and polls its progress
+        # Each PDF is written once, into the content-addressed blob store
+        stored = [(file.name, blob_path(put_blob(file.getbuffer()))) for file in uploaded_files]
+        st.session_state.current_file_name = uploaded_files[0].name
+        st.session_state.job_id = submit_ingestion(stored, st.session_state.corpus_id,
+                                                   summarize=precompute_summaries)
+        st.rerun()
 
-            ingest_pdf(uploaded_files)
-            st.session_state.vector_db_ready = True
-            st.success(f"Processed {len(uploaded_files)} Documents!")
+    @st.fragment(run_every=2)
+    def job_progress():
+        job = get_job(st.session_state.job_id) if st.session_state.job_id else None
+        if not job:
+            return
+        if is_active(job):
+            fraction = job["pages_done"] / job["total_pages"] if job["total_pages"] else 0.0
+            st.progress(min(fraction, 1.0), text=f"{job['message']} ({job['pages_done']}/{job['total_pages']} pages)")
+        elif job["status"] == "done":
+            st.success(f"Processed {len(job['files'])} Documents!")
+        else:
+            st.error(f"Indexing failed: {job['message']}")
+        for name, error in job["errors"].items():
+            st.warning(f"{name}: {error}")
+        # A newly committed document (or the end of the job) refreshes the whole page
+        if len(job["documents_done"]) != st.session_state.get("documents_seen") or \
+                job["status"] != st.session_state.get("job_status"):
+            st.session_state.documents_seen = len(job["documents_done"])
+            st.session_state.job_status = job["status"]
+            if job["status"] == "done":
+                st.session_state.last_trace = job.get("trace")
+            st.rerun()
+
+    job_progress()
 
     if st.session_state.file_map:
         st.divider()
@@ -117,9 +135,9 @@ with st.sidebar:
             st.session_state.annotations = [] 
             st.rerun()
         
-        # Viewer Logic
+        # Viewer Logic (bytes from the shared, memory-mapped handle of the blob)
         viewer_params = {
-            "input": current_path,
+            "input": read_pdf(current_path),
             "height": 600,
             "annotations": st.session_state.annotations or []
         }
@@ -131,6 +149,23 @@ with st.sidebar:
         if not st.session_state.show_all_pages:
             st.caption(f"📍 Page {st.session_state.current_page} of {st.session_state.current_file_name}")
 
+    st.toggle("⚡ Stream answers", key="stream_answers")
+
+    with st.expander("⚙️ Planner Routing Stats"):
+        st.json(get_router_stats())
+    with st.expander("⚡ Answer Cache Stats"):
+        st.json(get_answer_cache().stats())
+    with st.expander("🔥 Warmup Timings"):
+        st.json(get_warmup_timings())
+    with st.expander("⏱️ Latency Breakdown"):
+        trace = st.session_state.last_trace
+        if trace:
+            st.caption(f"Last {trace['kind']}: **{trace['total_ms']:.0f} ms** total")
+            st.dataframe([{"step": s["name"], "ms": s["ms"]} for s in trace["spans"]],
+                         hide_index=True, use_container_width=True)
+        else:
+            st.caption("No request traced yet.")
+
 # --- CHAT LOOP ---
 for msg_index, msg in enumerate(st.session_state.messages):
     with st.chat_message(msg["role"]):
@@ -171,7 +206,7 @@ for msg_index, msg in enumerate(st.session_state.messages):
                         
                         target_path = st.session_state.file_map.get(source)
                         if target_path:
-                            coords = get_highlight_coordinates(target_path, doc.page_content, page_num)
+                            coords = get_highlight_annotations(doc, target_path)
                             st.session_state.annotations = coords
                             st.rerun()
 
@@ -180,27 +215,66 @@ if prompt := st.chat_input("Ask about the documents..."):
     with st.chat_message("user"): st.markdown(prompt)
 
     if not st.session_state.vector_db_ready: st.error("Please upload PDFs first."); st.stop()
+    touch_corpus(st.session_state.corpus_id)
+    # Imported here, not at the top: langgraph is slow to import and only needed to answer.
+    # Usually already loaded by the warmup thread.
+    from modules.graph import async_app_graph, astream_graph
 
     with st.chat_message("assistant"):
-        with st.status("🧠 Planner working...", expanded=True) as status:
+        status = st.status("🧠 Planner working...", expanded=True)
+        answer_placeholder = st.empty()
+
+        with trace_request("question") as trace:
             active_files = list(st.session_state.file_map.keys())
-            initial_state = {
-                "question": prompt, "messages": [], "documents": [], "intent": "",
-                "file_names": active_files
-            }
-            result = app_graph.invoke(initial_state)
-            
-            st.write(f"Intent detected: **{result['intent'].upper()}**")
-            if result['intent'] == 'reason':
-                st.write("🔗 **Chain Activated:** RAG Agent (Fetch) ➡️ Reasoning Agent (Logic)")
-            
-            status.update(label="Complete", state="complete", expanded=False)
+            answer_cache = get_answer_cache()
+            corpus_version = get_corpus_version(corpus_id=st.session_state.corpus_id)
+            cached = answer_cache.lookup(prompt, corpus_version)
+
+            if cached:
+                # Same question (in other words) on the same documents: no LLM call needed
+                result = {"intent": cached["intent"], "messages": [cached["answer"]], "documents": cached["documents"]}
+                status.write("⚡ **Answered from cache**")
+            else:
+                initial_state = {
+                    "question": prompt, "messages": [], "documents": [], "intent": "",
+                    "file_names": active_files, "corpus_id": st.session_state.corpus_id
+                }
+                # The async graph runs on one event loop shared by all sessions (LLM calls are rate-bounded)
+                if st.session_state.stream_answers:
+                    # Node events update the status box; answer tokens are written as they arrive
+                    streamed, evidence_shown = "", False
+                    for kind, payload in iterate_async(astream_graph(initial_state)):
+                        if kind == "node":
+                            node_name, update = payload
+                            if node_name == "planner":
+                                status.write(f"Intent detected: **{update['intent'].upper()}**")
+                            elif update.get("documents") and not evidence_shown:
+                                # Retrieval finishes before generation starts: sources appear while the answer streams
+                                evidence_shown = True
+                                status.write(f"📚 **Evidence ready ({len(update['documents'])} chunks):**")
+                                for d in update["documents"]:
+                                    status.caption(f"{d.metadata.get('source_document')} · page {d.metadata.get('page_number')} · score {d.metadata.get('score', 'N/A')}")
+                        elif kind == "token":
+                            streamed += payload
+                            answer_placeholder.markdown(streamed + "▌")
+                        else:
+                            result = payload
+                else:
+                    result = run_async(async_app_graph.ainvoke(initial_state))
+                    status.write(f"Intent detected: **{result['intent'].upper()}**")
+                answer_cache.store(prompt, corpus_version, result["intent"], result["messages"][0],
+                                   result.get("documents", []))
+        st.session_state.last_trace = trace
+
+        if result['intent'] == 'reason':
+            status.write("🔗 **Chain Activated:** RAG Agent (Fetch) ➡️ Reasoning Agent (Logic)")
+        status.update(label="Complete", state="complete", expanded=False)
 
         final_ans = result["messages"][0]
-        st.markdown(final_ans)
+        answer_placeholder.markdown(final_ans)
         st.session_state.messages.append({
             "role": "assistant", 
             "content": final_ans, 
             "documents": result.get("documents", [])
         })
-        st.rerun()
\ No newline at end of file
+        st.rerun()
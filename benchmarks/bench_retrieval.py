@@ -0,0 +1,131 @@
+"""
+Retrieval benchmark: latency and recall@k for dense, lexical (BM25), hybrid (RRF) and auto modes.
+
+Usage:
+    python -m benchmarks.bench_retrieval --chunks 2000 --queries 100 --output bench_retrieval.json
+    python -m benchmarks.bench_retrieval --fake-embeddings   # offline, no model download
+"""
+import os
+import json
+import time
+import random
+import argparse
+import tempfile
+import statistics
+from langchain_core.documents import Document
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from langchain_chroma import Chroma
+from modules.lexical import LexicalIndex
+from modules.retrieval import hybrid_search
+from benchmarks.run import working_directory
+
+TOPICS = ["payment", "invoice", "termination", "warranty", "delivery", "liability", "confidentiality",
+          "renewal", "pricing", "audit", "insurance", "shipment", "penalty", "license", "support"]
+FILLER = ["the", "supplier", "shall", "customer", "agreement", "within", "days", "of", "receipt",
+          "notice", "party", "written", "period", "terms", "under", "this", "section", "provide"]
+MODES = ["dense", "lexical", "hybrid", "auto"]
+
+
+def make_corpus(n_chunks, rng):
+    """Synthetic chunks: topical filler text plus one unique code per chunk."""
+    docs = []
+    for i in range(n_chunks):
+        topic = rng.choice(TOPICS)
+        words = [rng.choice(FILLER) for _ in range(120)]
+        for _ in range(8):
+            words.insert(rng.randrange(len(words)), topic)
+        code = f"INV-{i:05d}"
+        words.insert(rng.randrange(len(words)), code)
+        docs.append(Document(
+            page_content=" ".join(words),
+            metadata={"chunk_id": f"c{i:06d}", "source_document": f"doc_{i % 20}.pdf", "page_number": i // 20 + 1}
+        ))
+    return docs
+
+
+def make_queries(docs, n_queries, rng):
+    """Exact-term queries ask for a chunk's code; semantic queries reuse a span of its text."""
+    queries = []
+    for doc in rng.sample(docs, min(n_queries, len(docs))):
+        words = doc.page_content.split()
+        code = next(w for w in words if w.startswith("INV-"))
+        start = rng.randrange(max(1, len(words) - 12))
+        queries.append(("exact", f"What does invoice {code} say?", doc.metadata["chunk_id"]))
+        queries.append(("semantic", " ".join(words[start:start + 12]), doc.metadata["chunk_id"]))
+    return queries
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+
+
+def run(n_chunks, n_queries, k, fake_embeddings, seed=0):
+    rng = random.Random(seed)
+    if fake_embeddings:
+        embeddings = DeterministicFakeEmbedding(size=384)
+    else:
+        from modules.embeddings import get_embedding_model
+        embeddings = get_embedding_model()
+
+    docs = make_corpus(n_chunks, rng)
+    queries = make_queries(docs, n_queries, rng)
+
+    # Like run.py: storage/ (query logs, metrics) goes to the temp dir, not into the repo
+    with tempfile.TemporaryDirectory() as tmp, working_directory(tmp):
+        vectorstore = Chroma(collection_name="bench", embedding_function=embeddings,
+                             persist_directory=os.path.join(tmp, "chroma"))
+        index = LexicalIndex(path=os.path.join(tmp, "bm25.json"))
+
+        t0 = time.perf_counter()
+        for i in range(0, len(docs), 256):
+            batch = docs[i:i + 256]
+            vectorstore.add_documents(batch, ids=[d.metadata["chunk_id"] for d in batch])
+        t1 = time.perf_counter()
+        index.add_documents(docs)
+        index.save()
+        t2 = time.perf_counter()
+
+        report = {
+            "config": {"chunks": n_chunks, "queries": len(queries), "k": k, "fake_embeddings": fake_embeddings},
+            "build_seconds": {"chroma": t1 - t0, "bm25": t2 - t1},
+            "bm25_index_bytes": os.path.getsize(index.path),
+            "modes": {}
+        }
+        for mode in MODES:
+            per_type = {}
+            for query_type in ["exact", "semantic"]:
+                latencies, hits = [], 0
+                for qt, question, target in queries:
+                    if qt != query_type:
+                        continue
+                    start = time.perf_counter()
+                    results = hybrid_search(vectorstore, question, k=k, index=index, mode=mode)
+                    latencies.append((time.perf_counter() - start) * 1000)
+                    hits += any(d.metadata.get("chunk_id") == target for d, _ in results)
+                per_type[query_type] = {
+                    f"recall@{k}": hits / len(latencies),
+                    "latency_ms_mean": statistics.mean(latencies),
+                    "latency_ms_p95": percentile(latencies, 95),
+                }
+            report["modes"][mode] = per_type
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunks", type=int, default=2000)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--fake-embeddings", action="store_true", help="Use deterministic hash embeddings")
+    parser.add_argument("--output", default="bench_retrieval.json")
+    args = parser.parse_args()
+
+    report = run(args.chunks, args.queries, args.k, args.fake_embeddings)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(json.dumps(report["modes"], indent=2))
+
+
+if __name__ == "__main__":
+    main()
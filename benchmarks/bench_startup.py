@@ -0,0 +1,203 @@
+"""
+Cold start benchmark: import time of the app's modules, per-resource warmup time,
+latency of the first question with and without warmup, and Streamlit first-run vs
+rerun time of app.py (when streamlit is installed).
+
+Every measurement runs in a fresh process, against a small synthetic corpus indexed
+beforehand, with the deterministic StubChatModel (no API key needed).
+
+Usage:
+    python -m benchmarks.bench_startup --repeats 3 --output bench_startup.json
+    python -m benchmarks.bench_startup --fake-embeddings     # no model download either
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import statistics
+import subprocess
+
+# Must be set before the LLM is created (modules.agents.get_llm)
+os.environ.setdefault("USE_STUB_LLM", "1")
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# What `streamlit run app.py` imports before the first page is drawn
+APP_MODULES = ["modules.ingestion", "modules.highlights", "modules.router", "modules.answer_cache",
+               "modules.telemetry", "modules.async_runtime", "modules.corpora", "modules.blobs",
+               "modules.jobs", "modules.warmup"]
+# Slow imports that should only be paid for on first use (or by the warmup thread)
+HEAVY_MODULES = ["langgraph", "chromadb", "langchain_chroma", "langchain_google_genai",
+                 "sentence_transformers", "torch"]
+QUESTION = "What is the payment amount?"
+
+
+def ms_since(start):
+    return round((time.perf_counter() - start) * 1000, 2)
+
+
+def use_fake_embeddings():
+    from langchain_core.embeddings import DeterministicFakeEmbedding
+    from modules.embeddings import set_embedding_model
+    set_embedding_model(DeterministicFakeEmbedding(size=384))
+
+
+# ==========================================
+# CHILD PROCESS PHASES
+# ==========================================
+def phase_imports():
+    import importlib
+    per_module = {}
+    start = time.perf_counter()
+    for name in APP_MODULES:
+        module_start = time.perf_counter()
+        importlib.import_module(name)
+        per_module[name] = ms_since(module_start)
+    app_modules_ms = ms_since(start)
+    heavy_loaded = [name for name in HEAVY_MODULES if name in sys.modules]
+
+    start = time.perf_counter()
+    importlib.import_module("modules.graph")
+    return {"app_modules_ms": app_modules_ms, "per_module_ms": per_module,
+            "heavy_modules_loaded_by_app": heavy_loaded, "graph_import_ms": ms_since(start)}
+
+
+def phase_warmup():
+    import importlib
+    # As in the app: its own modules are loaded before the warmup thread starts
+    for name in APP_MODULES:
+        importlib.import_module(name)
+    from modules.warmup import warm_up
+    start = time.perf_counter()
+    steps = warm_up()
+    return {"total_ms": ms_since(start), "steps_ms": steps}
+
+
+def phase_question(warm):
+    from modules.ingestion import get_indexed_documents
+    result = {}
+    if warm:
+        from modules.warmup import warm_up
+        start = time.perf_counter()
+        warm_up()
+        result["warmup_ms"] = ms_since(start)
+
+    start = time.perf_counter()
+    from modules.graph import app_graph
+    state = {"question": QUESTION, "messages": [], "documents": [], "intent": "",
+             "file_names": list(get_indexed_documents()), "corpus_id": None}
+    app_graph.invoke(dict(state))
+    result["first_question_ms"] = ms_since(start)
+
+    start = time.perf_counter()
+    app_graph.invoke(dict(state))
+    result["second_question_ms"] = ms_since(start)
+    return result
+
+
+def phase_rerun():
+    try:
+        from streamlit.testing.v1 import AppTest
+    except ImportError:
+        return {"skipped": "streamlit is not installed"}
+    app = AppTest.from_file(os.path.join(REPO_ROOT, "app.py"), default_timeout=300)
+    start = time.perf_counter()
+    app.run()
+    first_run_ms = ms_since(start)
+    reruns = []
+    for _ in range(3):
+        start = time.perf_counter()
+        app.run()
+        reruns.append(ms_since(start))
+    return {"first_run_ms": first_run_ms, "rerun_ms": reruns, "exceptions": [str(e.value) for e in app.exception]}
+
+
+PHASES = {
+    "imports": phase_imports,
+    "warmup": phase_warmup,
+    "question-cold": lambda: phase_question(warm=False),
+    "question-warm": lambda: phase_question(warm=True),
+    "rerun": phase_rerun,
+}
+
+
+# ==========================================
+# DRIVER
+# ==========================================
+def run_child(phase, workdir, fake_embeddings):
+    command = [sys.executable, "-m", "benchmarks.bench_startup", "--phase", phase, workdir]
+    if fake_embeddings:
+        command.append("--fake-embeddings")
+    start = time.perf_counter()
+    output = subprocess.check_output(command, cwd=REPO_ROOT)
+    result = json.loads(output.decode().strip().splitlines()[-1])
+    result["process_ms"] = ms_since(start)
+    return result
+
+
+def build_corpus(workdir, fake_embeddings):
+    """Indexes two synthetic PDFs into the default corpus of `workdir`."""
+    from benchmarks.run import working_directory
+    from benchmarks.synthetic import make_pdf, LocalUpload
+    from modules.ingestion import ingest_pdf
+
+    if fake_embeddings:
+        use_fake_embeddings()
+    with working_directory(workdir):
+        os.makedirs("corpus", exist_ok=True)
+        paths = [make_pdf(os.path.join("corpus", f"synthetic_{i}.pdf"), pages=10, seed=i) for i in range(2)]
+        ingest_pdf([LocalUpload(p) for p in paths])
+
+
+def median_of(runs, key):
+    values = [r[key] for r in runs if key in r]
+    return round(statistics.median(values), 2) if values else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeats", type=int, default=3, help="Fresh processes per measurement")
+    parser.add_argument("--fake-embeddings", action="store_true", help="Use deterministic hash embeddings")
+    parser.add_argument("--output", default="bench_startup.json")
+    parser.add_argument("--phase", nargs=2, help=argparse.SUPPRESS)  # internal: child process entry
+    args = parser.parse_args()
+    sys.path.insert(0, REPO_ROOT)
+
+    if args.phase:
+        phase, workdir = args.phase
+        os.chdir(workdir)
+        if args.fake_embeddings:
+            use_fake_embeddings()
+        print(json.dumps(PHASES[phase]()))
+        return
+
+    output_path = os.path.abspath(args.output)
+    report = {"config": {"repeats": args.repeats, "fake_embeddings": args.fake_embeddings}}
+    with tempfile.TemporaryDirectory() as workdir:
+        build_corpus(workdir, args.fake_embeddings)
+        for phase in ["imports", "warmup", "question-cold", "question-warm"]:
+            runs = [run_child(phase, workdir, args.fake_embeddings) for _ in range(args.repeats)]
+            report[phase] = {"runs": runs, "median_process_ms": median_of(runs, "process_ms")}
+        report["rerun"] = run_child("rerun", workdir, args.fake_embeddings)
+
+    report["summary"] = {
+        "app_modules_import_ms": median_of(report["imports"]["runs"], "app_modules_ms"),
+        "graph_import_ms": median_of(report["imports"]["runs"], "graph_import_ms"),
+        "warmup_ms": median_of(report["warmup"]["runs"], "total_ms"),
+        "first_question_cold_ms": median_of(report["question-cold"]["runs"], "first_question_ms"),
+        "first_question_after_warmup_ms": median_of(report["question-warm"]["runs"], "first_question_ms"),
+        "second_question_ms": median_of(report["question-cold"]["runs"], "second_question_ms"),
+        "streamlit_first_run_ms": report["rerun"].get("first_run_ms"),
+        "streamlit_rerun_ms": statistics.median(report["rerun"]["rerun_ms"]) if "rerun_ms" in report["rerun"] else None,
+    }
+    for name, value in report["summary"].items():
+        print(f"--- {name}: {value if value is not None else 'n/a'} ---")
+
+    with open(output_path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"--- Results written to {output_path} ---")
+
+
+if __name__ == "__main__":
+    main()
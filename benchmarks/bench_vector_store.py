@@ -0,0 +1,193 @@
+"""
+Vector store benchmark: Chroma vs the NumPy store (float16 and int8).
+
+Reports build time, size on disk, resident memory after opening the store and after
+searching, search latency (unfiltered and filtered by source document) and recall@k
+against exact float32 search. Every backend is built and queried in its own process so
+memory numbers are not mixed. Embeddings are synthetic (clustered, bge-small sized), so
+no model download is needed.
+
+Usage:
+    python -m benchmarks.bench_vector_store --chunks 50000 --queries 200 --output bench_vector_store.json
+"""
+import os
+import sys
+import json
+import time
+import zlib
+import argparse
+import tempfile
+import subprocess
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BACKENDS = ["chroma", "numpy-float16", "numpy-int8"]
+DIM = 384
+CLUSTERS = 64
+SOURCES = 200
+BUILD_BATCH = 1000
+
+
+class ClusteredEmbeddings(Embeddings):
+    """Deterministic vectors around CLUSTERS centroids (text hash -> cluster + noise)."""
+
+    def __init__(self, dim=DIM, seed=0):
+        self.dim = dim
+        self.centroids = np.random.default_rng(seed).normal(size=(CLUSTERS, dim)).astype(np.float32)
+
+    def _vector(self, text):
+        h = zlib.crc32(text.encode("utf-8"))
+        noise = np.random.default_rng(h).normal(scale=0.6, size=self.dim).astype(np.float32)
+        return (self.centroids[h % CLUSTERS] + noise) * 0.05
+
+    def embed_documents(self, texts):
+        return [self._vector(t).tolist() for t in texts]
+
+    def embed_query(self, text):
+        return self._vector(text).tolist()
+
+
+def chunk_texts(n):
+    return [f"chunk {i} of document {i % SOURCES}" for i in range(n)]
+
+
+def query_texts(n):
+    return [f"query number {i}" for i in range(n)]
+
+
+def rss_mb():
+    """Current resident set size (Linux); falls back to the peak elsewhere."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError):
+        import resource
+        scale = 1024 * 1024 if sys.platform == "darwin" else 1024
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale
+
+
+def dir_size_mb(path):
+    return sum(os.path.getsize(os.path.join(root, f)) for root, _, files in os.walk(path) for f in files) / (1024 * 1024)
+
+
+def open_store(backend, path, embeddings):
+    if backend == "chroma":
+        from langchain_chroma import Chroma
+        return Chroma(collection_name="bench", embedding_function=embeddings, persist_directory=path)
+    from modules.vector_store import NumpyVectorStore
+    return NumpyVectorStore(path, embeddings, dtype=backend.split("-")[1])
+
+
+def latency(samples_ms):
+    ordered = sorted(samples_ms)
+    return {"p50_ms": ordered[len(ordered) // 2], "p95_ms": ordered[int(0.95 * (len(ordered) - 1))],
+            "mean_ms": sum(ordered) / len(ordered)}
+
+
+# ==========================================
+# CHILD PROCESS PHASES
+# ==========================================
+def phase_build(backend, path, n_chunks):
+    embeddings = ClusteredEmbeddings()
+    texts = chunk_texts(n_chunks)
+    store = open_store(backend, path, embeddings)
+    start = time.perf_counter()
+    for i in range(0, n_chunks, BUILD_BATCH):
+        batch = texts[i:i + BUILD_BATCH]
+        store.add_texts(batch, metadatas=[{"source_document": f"doc_{j % SOURCES}.pdf", "chunk_id": f"c{j}"}
+                                          for j in range(i, i + len(batch))],
+                        ids=[f"c{j}" for j in range(i, i + len(batch))])
+    if hasattr(store, "persist"):
+        store.persist()
+    return {"build_seconds": time.perf_counter() - start, "disk_mb": dir_size_mb(path)}
+
+
+def phase_query(backend, path, n_queries, k):
+    embeddings = ClusteredEmbeddings()
+    rss_before = rss_mb()
+    store = open_store(backend, path, embeddings)
+    # First search pulls the index / memory map in
+    store.similarity_search_by_vector_with_relevance_scores(embeddings.embed_query("warmup"), k=k)
+    rss_open = rss_mb()
+
+    results, unfiltered, filtered = [], [], []
+    for i, text in enumerate(query_texts(n_queries)):
+        vector = embeddings.embed_query(text)
+        start = time.perf_counter()
+        hits = store.similarity_search_by_vector_with_relevance_scores(vector, k=k)
+        unfiltered.append((time.perf_counter() - start) * 1000)
+        results.append([d.metadata["chunk_id"] for d, _ in hits])
+
+        start = time.perf_counter()
+        store.similarity_search_by_vector_with_relevance_scores(
+            vector, k=k, filter={"source_document": f"doc_{i % SOURCES}.pdf"})
+        filtered.append((time.perf_counter() - start) * 1000)
+    return {
+        "rss_open_mb": rss_open - rss_before,
+        "rss_after_queries_mb": rss_mb() - rss_before,
+        "search": latency(unfiltered),
+        "search_filtered": latency(filtered),
+        "results": results,
+    }
+
+
+# ==========================================
+# DRIVER
+# ==========================================
+def run_child(*args):
+    output = subprocess.check_output([sys.executable, "-m", "benchmarks.bench_vector_store", "--phase", *args],
+                                     cwd=REPO_ROOT)
+    return json.loads(output.decode().strip().splitlines()[-1])
+
+
+def exact_top_k(n_chunks, n_queries, k):
+    """Ground truth: float32 brute force squared L2."""
+    embeddings = ClusteredEmbeddings()
+    matrix = np.asarray(embeddings.embed_documents(chunk_texts(n_chunks)), dtype=np.float32)
+    norms = (matrix ** 2).sum(axis=1)
+    truth = []
+    for text in query_texts(n_queries):
+        query = np.asarray(embeddings.embed_query(text), dtype=np.float32)
+        dists = norms - 2 * matrix @ query
+        truth.append({f"c{j}" for j in np.argpartition(dists, k)[:k]})
+    return truth
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunks", type=int, default=20000)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--backends", default=",".join(BACKENDS))
+    parser.add_argument("--output", default="bench_vector_store.json")
+    parser.add_argument("--phase", nargs="+", help=argparse.SUPPRESS)  # internal: child process entry
+    args = parser.parse_args()
+
+    if args.phase:
+        phase, backend, path, *rest = args.phase
+        result = phase_build(backend, path, int(rest[0])) if phase == "build" else \
+            phase_query(backend, path, int(rest[0]), int(rest[1]))
+        print(json.dumps(result))
+        return
+
+    truth = exact_top_k(args.chunks, args.queries, args.k)
+    report = {"config": {"chunks": args.chunks, "queries": args.queries, "k": args.k, "dim": DIM}, "backends": {}}
+    with tempfile.TemporaryDirectory() as tmp:
+        for backend in args.backends.split(","):
+            path = os.path.join(tmp, backend)
+            built = run_child("build", backend, path, str(args.chunks))
+            queried = run_child("query", backend, path, str(args.queries), str(args.k))
+            recall = [len(set(found) & expected) / args.k for found, expected in zip(queried.pop("results"), truth)]
+            report["backends"][backend] = {**built, **queried, f"recall@{args.k}": sum(recall) / len(recall)}
+            print(f"--- {backend}: build {built['build_seconds']:.1f}s, disk {built['disk_mb']:.1f} MB, "
+                  f"RSS +{queried['rss_after_queries_mb']:.0f} MB, search p50 {queried['search']['p50_ms']:.2f} ms, "
+                  f"recall {report['backends'][backend][f'recall@{args.k}']:.3f} ---")
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"--- Results written to {args.output} ---")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,255 @@
+"""
+Offline benchmark suite: ingestion throughput, search latency vs corpus size,
+highlight latency, per-intent end-to-end graph latency and concurrent-session
+throughput of the async graph.
+
+Runs in a throw-away working directory with synthetic PDFs and the deterministic
+StubChatModel, so no API key is needed. Results are written as JSON for comparison
+between runs.
+
+Usage:
+    python -m benchmarks.run --sizes 2,8,32 --pages 20 --output bench_results.json
+    python -m benchmarks.run --fake-embeddings        # no model download either
+"""
+import os
+import sys
+import asyncio
+import json
+import time
+import resource
+import argparse
+import platform
+import tempfile
+import statistics
+import subprocess
+from contextlib import contextmanager
+
+# Must be set before the LLM is created (modules.agents.get_llm)
+os.environ.setdefault("USE_STUB_LLM", "1")
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+INTENT_QUESTIONS = {
+    "rag": ["What is the payment amount?", "Who is the supplier?", "When is the delivery due?"],
+    "reason": ["Compare the warranty terms across the reports", "What are the differences in pricing?"],
+    "summarize": ["Summarize all documents", "Give me an overview of everything"],
+}
+SEARCH_QUERIES = ["payment terms and penalty", "termination notice period", "warranty liability",
+                  "quarterly revenue report", "insurance obligations of the supplier"]
+
+
+@contextmanager
+def working_directory(path):
+    previous = os.getcwd()
+    os.chdir(path)
+    try:
+        yield
+    finally:
+        os.chdir(previous)
+
+
+def latency_stats(samples_ms):
+    ordered = sorted(samples_ms)
+    return {
+        "n": len(ordered),
+        "mean_ms": statistics.mean(ordered),
+        "p50_ms": ordered[len(ordered) // 2],
+        "p95_ms": ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))],
+        "max_ms": ordered[-1],
+    }
+
+
+def timed(fn, *args, **kwargs):
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, (time.perf_counter() - start) * 1000
+
+
+def peak_rss_mb():
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    scale = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return {
+        "self": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale,
+        "children": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / scale,
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT,
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except Exception:
+        return None
+
+
+# ==========================================
+# SCENARIOS
+# ==========================================
+def bench_ingestion_and_search(sizes, pages, workers, repeats):
+    """Grows the corpus step by step (ingestion is incremental) and measures search at each size."""
+    from benchmarks.synthetic import make_pdf, LocalUpload
+    from modules.ingestion import ingest_pdf, load_manifest
+
+    os.makedirs("corpus", exist_ok=True)
+    paths, steps = [], []
+    for size in sizes:
+        while len(paths) < size:
+            i = len(paths)
+            paths.append(make_pdf(os.path.join("corpus", f"synthetic_{i}.pdf"), pages=pages, seed=i,
+                                  two_columns=i % 2 == 1))
+        uploads = [LocalUpload(p) for p in paths]
+
+        chunks_before = sum(len(e["chunk_ids"]) for e in load_manifest()["documents"].values())
+        pages_before = sum(e["pages"] for e in load_manifest()["documents"].values())
+        vectorstore, elapsed_ms = timed(ingest_pdf, uploads, workers=workers)
+        manifest = load_manifest()["documents"]
+        new_chunks = sum(len(e["chunk_ids"]) for e in manifest.values()) - chunks_before
+        new_pages = sum(e["pages"] for e in manifest.values()) - pages_before
+
+        # Same document set again: should be a near no-op thanks to the manifest
+        _, reingest_ms = timed(ingest_pdf, uploads, workers=workers)
+
+        search_ms = []
+        for _ in range(repeats):
+            for query in SEARCH_QUERIES:
+                _, ms = timed(vectorstore.similarity_search_with_score, query, k=10)
+                search_ms.append(ms)
+
+        steps.append({
+            "files": size,
+            "total_pages": sum(e["pages"] for e in manifest.values()),
+            "total_chunks": sum(len(e["chunk_ids"]) for e in manifest.values()),
+            "ingest": {
+                "new_pages": new_pages,
+                "new_chunks": new_chunks,
+                "seconds": elapsed_ms / 1000,
+                "pages_per_second": new_pages / (elapsed_ms / 1000) if elapsed_ms else None,
+                "chunks_per_second": new_chunks / (elapsed_ms / 1000) if elapsed_ms else None,
+                "reingest_unchanged_ms": reingest_ms,
+                "peak_rss_mb": peak_rss_mb(),
+            },
+            "similarity_search_with_score": latency_stats(search_ms),
+        })
+        print(f"--- corpus {size} files: ingest {elapsed_ms / 1000:.1f}s, "
+              f"search p50 {steps[-1]['similarity_search_with_score']['p50_ms']:.1f}ms ---")
+    return steps, paths
+
+
+def bench_highlighting(paths, samples):
+    """Index lookup (get_highlight_annotations) vs the fuzzy fallback (get_highlight_coordinates)."""
+    from modules.ingestion import get_vectorstore
+    from modules.highlights import get_highlight_annotations, get_highlight_coordinates
+    from langchain_core.documents import Document
+
+    from modules.blobs import blob_path
+
+    data = get_vectorstore().get(include=["documents", "metadatas"], limit=samples)
+    docs = [Document(page_content=t, metadata=m) for t, m in zip(data["documents"], data["metadatas"])]
+
+    indexed_ms, fuzzy_ms, found = [], [], 0
+    for doc in docs:
+        pdf_path = blob_path(doc.metadata["doc_hash"])
+        annotations, ms = timed(get_highlight_annotations, doc, pdf_path)
+        indexed_ms.append(ms)
+        found += bool(annotations)
+        _, ms = timed(get_highlight_coordinates, pdf_path, doc.page_content, doc.metadata["page_number"])
+        fuzzy_ms.append(ms)
+    return {
+        "chunks": len(docs),
+        "index_hit_rate": found / len(docs) if docs else None,
+        "get_highlight_annotations": latency_stats(indexed_ms) if docs else None,
+        "get_highlight_coordinates": latency_stats(fuzzy_ms) if docs else None,
+    }
+
+
+def bench_graph(paths, repeats, llm_latency):
+    """End-to-end app_graph.invoke latency grouped by the intent the planner chose."""
+    from modules import agents
+    from modules.graph import app_graph
+
+    agents.get_llm().latency_seconds = llm_latency
+    file_names = [os.path.basename(p) for p in paths]
+    by_intent = {}
+    for _ in range(repeats):
+        for expected, questions in INTENT_QUESTIONS.items():
+            for question in questions:
+                state = {"question": question, "messages": [], "documents": [], "intent": "",
+                         "file_names": file_names}
+                result, ms = timed(app_graph.invoke, state)
+                entry = by_intent.setdefault(result["intent"], {"samples": [], "expected_matches": 0})
+                entry["samples"].append(ms)
+                entry["expected_matches"] += result["intent"] == expected
+    return {intent: {**latency_stats(e["samples"]), "expected_matches": e["expected_matches"]}
+            for intent, e in by_intent.items()}
+
+
+def bench_concurrency(paths, sessions, llm_latency):
+    """N questions answered back to back with app_graph vs all at once with async_app_graph."""
+    from modules import agents
+    from modules.graph import app_graph, async_app_graph
+
+    agents.get_llm().latency_seconds = llm_latency
+    file_names = [os.path.basename(p) for p in paths]
+    questions = [q for qs in INTENT_QUESTIONS.values() for q in qs]
+    states = [{"question": questions[i % len(questions)], "messages": [], "documents": [], "intent": "",
+               "file_names": file_names} for i in range(sessions)]
+
+    async def run_all():
+        return await asyncio.gather(*[async_app_graph.ainvoke(state) for state in states])
+
+    _, sequential_ms = timed(lambda: [app_graph.invoke(state) for state in states])
+    _, concurrent_ms = timed(asyncio.run, run_all())
+    return {
+        "sessions": sessions,
+        "sequential_sync_ms": sequential_ms,
+        "concurrent_async_ms": concurrent_ms,
+        "speedup": sequential_ms / concurrent_ms if concurrent_ms else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="2,8", help="Comma-separated corpus sizes (number of PDFs)")
+    parser.add_argument("--pages", type=int, default=20, help="Pages per synthetic PDF")
+    parser.add_argument("--workers", type=int, default=None, help="Extraction processes (default: INGEST_WORKERS)")
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--highlight-samples", type=int, default=50)
+    parser.add_argument("--llm-latency", type=float, default=0.0, help="Simulated seconds per stub LLM call")
+    parser.add_argument("--sessions", type=int, default=8, help="Concurrent questions for the async graph (pair with --llm-latency)")
+    parser.add_argument("--fake-embeddings", action="store_true", help="Use deterministic hash embeddings")
+    parser.add_argument("--output", default="bench_results.json")
+    args = parser.parse_args()
+
+    sys.path.insert(0, REPO_ROOT)
+    output_path = os.path.abspath(args.output)
+    sizes = [int(s) for s in args.sizes.split(",")]
+
+    if args.fake_embeddings:
+        from langchain_core.embeddings import DeterministicFakeEmbedding
+        from modules.embeddings import set_embedding_model
+        set_embedding_model(DeterministicFakeEmbedding(size=384))
+
+    with tempfile.TemporaryDirectory() as workdir, working_directory(workdir):
+        steps, paths = bench_ingestion_and_search(sizes, args.pages, args.workers, args.repeats)
+        results = {
+            "meta": {
+                "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "git_revision": git_revision(),
+                "python": platform.python_version(),
+                "cpu_count": os.cpu_count(),
+                "config": vars(args),
+            },
+            "ingestion_and_search": steps,
+            "highlighting": bench_highlighting(paths, args.highlight_samples),
+            "graph_invoke_by_intent": bench_graph(paths, args.repeats, args.llm_latency),
+            "concurrent_sessions": bench_concurrency(paths, args.sessions, args.llm_latency),
+            "peak_rss_mb": peak_rss_mb(),
+        }
+
+    with open(output_path, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"--- Benchmark results written to {output_path} ---")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""Synthetic PDF generator for benchmarks (PyMuPDF only, deterministic per seed)."""
+import os
+import random
+import fitz # PyMuPDF
+
+VOCABULARY = (
+    "agreement supplier customer invoice payment delivery warranty liability termination notice "
+    "confidential period renewal pricing audit insurance shipment penalty license support section "
+    "clause party written days receipt amount total schedule obligation service report quarter revenue"
+).split()
+
+
+class LocalUpload:
+    """Minimal stand-in for Streamlit's UploadedFile (what ingest_pdf expects)."""
+
+    def __init__(self, path):
+        self.name = os.path.basename(path)
+        with open(path, "rb") as f:
+            self._data = f.read()
+
+    def getbuffer(self):
+        return memoryview(self._data)
+
+
+def make_paragraph(rng, n_words):
+    words = [rng.choice(VOCABULARY) for _ in range(n_words)]
+    # Sprinkle unique codes so exact-term lookups have something to find
+    words.insert(rng.randrange(len(words)), f"INV-{rng.randrange(100000):05d}")
+    sentences, i = [], 0
+    while i < len(words):
+        n = rng.randint(8, 18)
+        sentences.append(" ".join(words[i:i + n]).capitalize() + ".")
+        i += n
+    return " ".join(sentences)
+
+
+def make_pdf(path, pages=10, words_per_page=350, seed=0, two_columns=False):
+    """Writes a text PDF with `pages` pages of pseudo-contract prose. Returns `path`."""
+    rng = random.Random(seed)
+    doc = fitz.open()
+    for page_no in range(pages):
+        page = doc.new_page()
+        page.insert_text((50, 40), f"Synthetic Report {seed} - Page {page_no + 1}", fontsize=11)
+        if two_columns:
+            half = words_per_page // 2
+            page.insert_textbox(fitz.Rect(40, 60, 290, 800), make_paragraph(rng, half), fontsize=8)
+            page.insert_textbox(fitz.Rect(310, 60, 560, 800), make_paragraph(rng, half), fontsize=8)
+        else:
+            page.insert_textbox(fitz.Rect(50, 60, 550, 800), make_paragraph(rng, words_per_page), fontsize=8)
+    doc.save(path)
+    doc.close()
+    return path
+
+
+def make_corpus(directory, n_files, pages, words_per_page=350, seed=0):
+    os.makedirs(directory, exist_ok=True)
+    return [make_pdf(os.path.join(directory, f"synthetic_{seed}_{i}.pdf"), pages, words_per_page,
+                     seed=seed * 1000 + i, two_columns=i % 2 == 1)
+            for i in range(n_files)]
@@ -1,256 +1,591 @@
-from langchain_google_genai import ChatGoogleGenerativeAI
+import os
+import re
+import difflib
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import StrOutputParser
-from modules.ingestion import get_vectorstore
+from langchain_core.documents import Document
+from modules.ingestion import get_vectorstore, get_indexed_documents
+from modules.retrieval import hybrid_search, ahybrid_search
+from modules.lexical import get_lexical_index
+from modules.router import rule_intent
+from modules.dedup import DuplicateFilter
+from modules.context import pack_context, count_tokens, SUMMARY_TOKEN_BUDGET
+from modules.telemetry import span, log_event, inc, submit_traced
+from modules.summaries import load_summary
+from modules.representatives import representative_chunks
+from modules.async_runtime import llm_slot
 
 # ==========================================
 # CONFIGURATION
 # ==========================================
-# Initialize Gemini Pro (Free & Stable)
-# We use temperature=0 for maximum factual accuracy and consistency
-llm = ChatGoogleGenerativeAI(model="gemini-pro-latest", temperature=0)
+# The chat model is created on first use by get_llm() (see below)
+_llm = None
+_llm_lock = threading.Lock()
+
+# Per-file searches run concurrently on this many threads
+RETRIEVAL_WORKERS = 8
+# Candidates fetched by the RAG agent (and by speculative retrieval in the async graph)
+RAG_FETCH_K = 10
+# Unique chunks kept after deduplication
+RAG_KEEP = 5
+# Chunks spread across the target files by the summarizer (one per embedding cluster,
+# so fewer are needed than with a similarity search for the request text)
+TOTAL_CHUNK_BUDGET = 20
+# Tag on the final-answer LLM runs so the UI streams those tokens and nothing else
+ANSWER_TAG = "final_answer"
+# Words that mean "every uploaded file" for the summarizer
+ALL_FILES_PATTERN = r"\b(all|every|everything|each|both|the documents|the files|the pdfs)\b"
+
+
+def get_llm():
+    """
+    Process-wide chat model, created on first use: the Gemini client is slow to import,
+    so neither importing this module nor a Streamlit rerun pays for it.
+    """
+    global _llm
+    if _llm is None:
+        with _llm_lock:
+            if _llm is None:
+                if os.getenv("USE_STUB_LLM"):
+                    # Deterministic local model (tests, benchmarks, offline runs)
+                    from modules.stub_llm import StubChatModel
+                    _llm = StubChatModel()
+                else:
+                    from langchain_google_genai import ChatGoogleGenerativeAI
+                    # Initialize Gemini Pro (Free & Stable)
+                    # We use temperature=0 for maximum factual accuracy and consistency
+                    _llm = ChatGoogleGenerativeAI(model="gemini-pro-latest", temperature=0)
+    return _llm
 
 
 # ==========================================
-# 1. RAG AGENT
-# Function: Retrieve facts, deduplicate, and answer specific questions.
+# PROMPTS (shared by the sync and async agents)
 # ==========================================
-def rag_agent(state):
+RAG_PROMPT = ChatPromptTemplate.from_template(
+    """You are a helpful assistant. Answer the user's question based ONLY on the context below. 
+    If you answer, you MUST cite the source document and Chunk ID.
+    
+    Context:
+    {context}
+    
+    Question: 
+    {question}
     """
-    Retrieves documents based on the query.
-    - If intent is 'rag': Generates an answer.
-    - If intent is 'reason': Passes documents to the Reasoning Agent (Chaining).
+)
+FILE_SELECTOR_PROMPT = ChatPromptTemplate.from_template(
     """
-    question = state["question"]
-    intent = state.get("intent", "rag")
-    vectorstore = get_vectorstore()
+    You are a File Selector. 
+    User Request: "{question}"
+    Available Files: {file_list}
+    
+    Task: Identify which files the user wants to summarize.
+    - If they ask for "all", "everything", "the documents", or don't specify, return the word: ALL
+    - If they specify a file (e.g., "summarize the invoice"), return ONLY that filename exactly as it appears in the list.
+    - If multiple, return them comma-separated.
+    
+    Return ONLY the filenames or 'ALL'. No other text.
+    """
+)
+SUMMARY_PROMPT = ChatPromptTemplate.from_template(
+    """You are an expert summarizer. 
+    Create a comprehensive summary based on the provided context.
+    
+    Instructions:
+    1. Only summarize the documents provided in the context below.
+    2. If the user asked for a specific document, focus ONLY on that.
+    3. Explicitly mention the document names in your summary.
+    4. Structure with clear headings and bullet points.
+    
+    Context from documents:
+    {context}
+    """
+)
+CACHED_SUMMARY_PROMPT = ChatPromptTemplate.from_template(
+    """You are an expert summarizer. 
+    Below are precomputed summaries of the documents the user asked about.
+    Answer the user's request using only them. Explicitly mention the document names.
+    Structure with clear headings and bullet points.
+    
+    User Request: {question}
+    
+    Context from documents:
+    {context}
+    """
+)
+REASONING_PROMPT = ChatPromptTemplate.from_template(
+    """You are a specialized Reasoning Agent. 
+    The user has asked for a complex analysis (Comparison, Timeline, Aggregation, or Logic).
     
-    print(f"--- RAG Agent processing: {question} ---")
+    Reference the context provided by the RAG agent.
+    If comparing, list similarities and differences.
+    If creating a timeline, order events chronologically.
     
-    # 1. RETRIEVAL (Fetch more candidates to allow for filtering)
-    # We fetch 10 docs to ensure we have enough after removing duplicates
-    results = vectorstore.similarity_search_with_score(question, k=10)
+    Context:
+    {context}
     
+    User Request: 
+    {question}
+    """
+)
+
+
+def generate_answer(prompt, inputs):
+    """
+    Runs prompt | get_llm() | parser in streaming mode and returns the full text.
+    When the graph is streamed, each token is emitted as it arrives (see modules/graph.py).
+    """
+    chain = (prompt | get_llm() | StrOutputParser()).with_config(tags=[ANSWER_TAG])
+    with span("llm:answer") as s:
+        response = "".join(chain.stream(inputs))
+        s.set(tokens_in=count_tokens(prompt.format(**inputs)), tokens_out=count_tokens(response))
+    return response
+
+
+async def agenerate_answer(prompt, inputs):
+    """Async generate_answer. Waits for a free LLM slot so concurrent sessions share the limit."""
+    chain = (prompt | get_llm() | StrOutputParser()).with_config(tags=[ANSWER_TAG])
+    async with llm_slot():
+        with span("llm:answer") as s:
+            response = "".join([token async for token in chain.astream(inputs)])
+            s.set(tokens_in=count_tokens(prompt.format(**inputs)), tokens_out=count_tokens(response))
+    return response
+
+
+def format_rag_chunk(doc, text):
+    # Add a clear label so the LLM knows where this text came from
+    source = doc.metadata.get("source_document", "Unknown")
+    chunk_id = doc.metadata.get("chunk_id", "N/A")
+    return f"[Source: {source} | ID: {chunk_id}] {text}"
+
+
+# ==========================================
+# 1. RAG AGENT
+# Function: Retrieve facts, deduplicate, and answer specific questions.
+# ==========================================
+def keep_unique(results, limit=RAG_KEEP):
+    """Near-duplicate filtering of [(doc, score)]. Returns (docs, duplicates_skipped)."""
     docs = []
-    context_parts = []
-    seen_content = set() # Track duplicates based on text content
+    duplicates = 0
+    seen_content = DuplicateFilter() # Track near-duplicates by shingle similarity
     
     for doc, score in results:
-        # Create a "fingerprint" of the first 100 chars to check for duplicates
-        content_fingerprint = doc.page_content[:100]
-        
-        # Skip if we've seen this text before (Deduplication Logic)
-        if content_fingerprint in seen_content:
+        # Skip if we've seen this (or nearly this) text before (Deduplication Logic)
+        if not seen_content.is_new(doc.page_content):
+            duplicates += 1
             continue
         
-        seen_content.add(content_fingerprint)
-        
         # Stop once we have 5 unique, high-quality documents
-        if len(docs) >= 5:
+        if len(docs) >= limit:
             break
 
         # CRITICAL: Save score to metadata so the UI can display the progress bar
         doc.metadata["score"] = f"{score:.4f}"
         docs.append(doc)
-        
-        # Format the context for the LLM
-        source = doc.metadata.get("source_document", "Unknown")
-        chunk_id = doc.metadata.get("chunk_id", "N/A")
-        
-        # Add a clear label so the LLM knows where this text came from
-        context_parts.append(f"[Source: {source} | ID: {chunk_id}] {doc.page_content}")
+    return docs, duplicates
+
+
+def retrieve_documents(state):
+    """
+    Retrieval node of the rag and reason intents. Runs before the answer is generated,
+    so a streamed graph shows the evidence while the answer is still being written.
+    """
+    question = state["question"]
+    intent = state.get("intent", "rag")
+    # Only the active corpus (the session's uploaded document set) is searched
+    corpus_id = state.get("corpus_id")
+    vectorstore = get_vectorstore(corpus_id)
+    
+    log_event("rag_agent", question=question, intent=intent)
+    
+    with span("retrieval:hybrid") as s:
+        # 1. RETRIEVAL (Fetch more candidates to allow for filtering)
+        # We fetch 10 docs to ensure we have enough after removing duplicates.
+        # Hybrid = dense + BM25 (RRF), so invoice numbers / clause IDs are found too.
+        results = hybrid_search(vectorstore, question, k=RAG_FETCH_K, index=get_lexical_index(corpus_id))
+        docs, duplicates = keep_unique(results)
+        s.set(retrieved=len(results), deduplicated=duplicates, kept=len(docs))
     
     # 2. CHAINING CHECK
-    # If the Planner said "Reason", we do NOT answer. We just pass the data.
+    # If the Planner said "Reason", the Reasoning Agent answers from these documents (see graph.py)
     if intent == "reason":
-        print("--- RAG finished. Passing data to Reasoning Agent. ---")
-        return {"documents": docs, "messages": ["Data retrieved by RAG Agent. Handing off to Reasoning Engine..."]}
-    
+        log_event("rag_handoff", documents=len(docs))
+    return {"documents": docs}
+
+
+def rag_agent(state):
+    """Answers a lookup question from the documents retrieve_documents() put into the state."""
     # 3. ANSWER GENERATION (Standard RAG)
-    context_text = "\n\n".join(context_parts)
-    prompt = ChatPromptTemplate.from_template(
-        """You are a helpful assistant. Answer the user's question based ONLY on the context below. 
-        If you answer, you MUST cite the source document and Chunk ID.
-        
-        Context:
-        {context}
-        
-        Question: 
-        {question}
-        """
-    )
-    chain = prompt | llm | StrOutputParser()
-    response = chain.invoke({"context": context_text, "question": question})
+    # Pack the context by relevance into the token budget
+    context_text, docs, _ = pack_context(state["documents"], formatter=format_rag_chunk)
+    response = generate_answer(RAG_PROMPT, {"context": context_text, "question": state["question"]})
+    
+    return {"messages": [response], "documents": docs}
+
+
+def open_stores(corpus_id):
+    """Vector store and BM25 index of a corpus. Blocking on first use (client construction, JSON load)."""
+    return get_vectorstore(corpus_id), get_lexical_index(corpus_id)
+
+
+async def prefetch_retrieval(state):
+    """
+    Speculative retrieval for the async graph, started while the planner is still deciding.
+    Skipped when the keyword rules already say "summarize" (the summarizer searches per file).
+    """
+    if rule_intent(state["question"]) == "summarize":
+        return {"prefetched": None}
+    with span("retrieval:speculative") as s:
+        # Opened off the event loop, which all sessions share
+        vectorstore, index = await asyncio.to_thread(open_stores, state.get("corpus_id"))
+        results = await ahybrid_search(vectorstore, state["question"], k=RAG_FETCH_K, index=index)
+        s.set(retrieved=len(results))
+    return {"prefetched": results}
+
+
+async def aretrieve_documents(state):
+    """Async retrieve_documents. Reuses the speculative retrieval results when the graph prefetched them."""
+    question = state["question"]
+    intent = state.get("intent", "rag")
+    results = state.get("prefetched")
+    
+    log_event("rag_agent", question=question, intent=intent, prefetched=results is not None)
+    
+    with span("retrieval:hybrid") as s:
+        if results is None:
+            vectorstore, index = await asyncio.to_thread(open_stores, state.get("corpus_id"))
+            results = await ahybrid_search(vectorstore, question, k=RAG_FETCH_K, index=index)
+        docs, duplicates = keep_unique(results)
+        s.set(retrieved=len(results), deduplicated=duplicates, kept=len(docs))
+    
+    if intent == "reason":
+        log_event("rag_handoff", documents=len(docs))
+    return {"documents": docs}
+
+
+async def arag_agent(state):
+    """Async rag_agent."""
+    context_text, docs, _ = pack_context(state["documents"], formatter=format_rag_chunk)
+    response = await agenerate_answer(RAG_PROMPT, {"context": context_text, "question": state["question"]})
     
     return {"messages": [response], "documents": docs}
 
 
+# ==========================================
+# FILE TARGETING (Local fuzzy match, LLM only when ambiguous)
+# ==========================================
+def match_target_files(question, file_names):
+    """
+    Picks the files a summarize request refers to without calling the LLM.
+    Returns (target_files, confident). `confident` is False only when several file
+    names partially match the request and it is unclear which one was meant.
+    """
+    text = question.lower()
+    words = re.findall(r"\w+", text)
+    if re.search(ALL_FILES_PATTERN, text):
+        return file_names, True
+
+    scores = {}
+    for name in file_names:
+        stem = os.path.splitext(name)[0].lower()
+        if stem in text:
+            scores[name] = 1.0
+            continue
+        tokens = [t for t in re.split(r"[\W_]+", stem) if len(t) > 2 and not t.isdigit()]
+        if not tokens:
+            scores[name] = 0.0
+            continue
+        hits = sum(1 for t in tokens if difflib.get_close_matches(t, words, n=1, cutoff=0.8))
+        scores[name] = hits / len(tokens)
+
+    best = max(scores.values(), default=0.0)
+    strong = [f for f in file_names if scores[f] >= 0.6]
+    partial = [f for f in file_names if 0.3 <= scores[f] < 0.6]
+    if strong:
+        return strong, True
+    if partial:
+        # A single partial match ("the agreement" -> rental_agreement.pdf) is still clear
+        return partial, len(partial) == 1
+    # Nothing named -> summarize everything (same rule the LLM selector follows)
+    return file_names, best < 0.3
+
+def parse_file_selection(response, all_file_names):
+    cleaned_response = response.strip().replace("'", "").replace('"', "")
+    
+    if "ALL" in cleaned_response.upper():
+        return all_file_names
+    # Fuzzy matching to find the correct filename
+    target_files = []
+    suggested_files = [f.strip() for f in cleaned_response.split(",")]
+    for f in all_file_names:
+        for suggestion in suggested_files:
+            if suggestion in f or f in suggestion:
+                target_files.append(f)
+                break
+    # Fallback if matching failed
+    return target_files or all_file_names
+
+def select_files_with_llm(question, all_file_names):
+    chain = FILE_SELECTOR_PROMPT | get_llm() | StrOutputParser()
+    try:
+        with span("llm:file_selector"):
+            response = chain.invoke({"question": question, "file_list": ", ".join(all_file_names)})
+        return parse_file_selection(response, all_file_names)
+    except:
+        return all_file_names
+
+async def aselect_files_with_llm(question, all_file_names):
+    chain = FILE_SELECTOR_PROMPT | get_llm() | StrOutputParser()
+    try:
+        async with llm_slot():
+            with span("llm:file_selector"):
+                response = await chain.ainvoke({"question": question, "file_list": ", ".join(all_file_names)})
+        return parse_file_selection(response, all_file_names)
+    except:
+        return all_file_names
+
+
 # ==========================================
 # 2. SUMMARIZATION AGENT
 # Function: Smartly select files, fetch chunks, interleave results, and summarize.
 # ==========================================
+def precomputed_summaries(target_files, corpus_id=None):
+    """
+    Precomputed summaries of every target file, or None if any of them is missing.
+    Summaries are shared by content hash; the file name is the one used in this corpus.
+    """
+    doc_hashes = get_indexed_documents(corpus_id)
+    summaries = [load_summary(doc_hashes[f]) if f in doc_hashes else None for f in target_files]
+    hit = bool(target_files) and all(summaries)
+    inc("pdf_chat_cache_total", cache="summary", result="hit" if hit else "miss")
+    if not hit:
+        return None
+    return [dict(summary, source_document=name) for name, summary in zip(target_files, summaries)]
+
+
+def coverage_group(vectorstore, file, doc_hashes, k):
+    """Representative chunks of one file in page order ([] if it is not indexed)."""
+    if file not in doc_hashes:
+        return []
+    return representative_chunks(vectorstore, doc_hashes[file], k)
+
+
+def scored_group(results):
+    group = []
+    for doc, score in results:
+        doc.metadata["score"] = f"{score:.4f}" # Save Score
+        group.append(doc)
+    return group
+
+
+def interleave_unique(docs_by_file_group):
+    """Turns [[A1, A2], [B1, B2]] into [A1, B1, A2, B2], dropping near-duplicates."""
+    all_results = []
+    seen_content = DuplicateFilter()
+    
+    if docs_by_file_group:
+        max_len = max(len(g) for g in docs_by_file_group)
+        for i in range(max_len):
+            for group in docs_by_file_group:
+                if i < len(group):
+                    doc = group[i]
+                    # Similarity-based check (catches boilerplate, not just equal prefixes)
+                    if seen_content.is_new(doc.page_content):
+                        all_results.append(doc)
+    retrieved = sum(len(g) for g in docs_by_file_group)
+    log_event("summarizer_dedup", retrieved=retrieved, deduplicated=retrieved - len(all_results))
+    return all_results
+
+
+def pack_summary_context(all_results):
+    # We format the context to clearly label which document each chunk comes from.
+    # Interleaved order is kept (fairness across files); the budget caps prompt size.
+    return pack_context(
+        all_results,
+        formatter=lambda d, text: f"== SOURCE DOC: {d.metadata.get('source_document')} ==\n{text}",
+        budget=SUMMARY_TOKEN_BUDGET,
+        order_by_score=False
+    )
+
+
 def summarization_agent(state):
     """
     Complex Summarizer: 
-    1. Asks LLM which files to focus on.
+    1. Matches target files locally (LLM only when ambiguous).
     2. Dynamically budgets chunks per file.
-    3. Fetches chunks WITH scores.
+    3. Picks chunks for coverage: the one nearest each embedding cluster's centroid, in page order
+       (a similarity search for the request text picks arbitrary, redundant chunks).
     4. Mixes results (Interleaving) so UI shows A, B, C...
     5. Deduplicates results.
     """
-    vectorstore = get_vectorstore()
+    vectorstore = get_vectorstore(state.get("corpus_id"))
     question = state["question"]
     all_file_names = state.get("file_names", [])
-    
-    target_files = []
 
     # --- PHASE 1: SMART FILE SELECTION ---
     if all_file_names:
-        print(f"--- Summarizer identifying target files from: {all_file_names} ---")
-        selection_prompt = ChatPromptTemplate.from_template(
-            """
-            You are a File Selector. 
-            User Request: "{question}"
-            Available Files: {file_list}
-            
-            Task: Identify which files the user wants to summarize.
-            - If they ask for "all", "everything", "the documents", or don't specify, return the word: ALL
-            - If they specify a file (e.g., "summarize the invoice"), return ONLY that filename exactly as it appears in the list.
-            - If multiple, return them comma-separated.
-            
-            Return ONLY the filenames or 'ALL'. No other text.
-            """
-        )
-        chain = selection_prompt | llm | StrOutputParser()
-        try:
-            response = chain.invoke({"question": question, "file_list": ", ".join(all_file_names)})
-            cleaned_response = response.strip().replace("'", "").replace('"', "")
-            
-            if "ALL" in cleaned_response.upper():
-                target_files = all_file_names
-                print(f"--- Summarizer Target: ALL FILES ---")
-            else:
-                # Fuzzy matching to find the correct filename
-                suggested_files = [f.strip() for f in cleaned_response.split(",")]
-                for f in all_file_names:
-                    for suggestion in suggested_files:
-                        if suggestion in f or f in suggestion:
-                            target_files.append(f)
-                            break
-                
-                # Fallback if matching failed
-                if not target_files: 
-                    target_files = all_file_names
-                
-                print(f"--- Summarizer Target: {target_files} ---")
-        except:
-            target_files = all_file_names
+        target_files, confident = match_target_files(question, all_file_names)
+        if not confident:
+            log_event("summarizer_ambiguous_match", candidates=target_files)
+            target_files = select_files_with_llm(question, all_file_names)
+        log_event("summarizer_targets", targets=target_files, local=confident)
     else:
         target_files = [] # No files uploaded
 
-    # --- PHASE 2: DYNAMIC RETRIEVAL WITH SCORES ---
+    # --- FAST PATH: PRECOMPUTED SUMMARIES ---
+    # If every target file was summarized at ingestion time, answer with one short reduce call
+    summaries = precomputed_summaries(target_files, state.get("corpus_id"))
+    if summaries:
+        log_event("summarizer_precomputed", targets=target_files)
+        return summarize_from_cache(question, summaries)
+
+    # --- PHASE 2: COVERAGE-BASED SELECTION ---
     # We collect lists of docs per file first: [[DocA_1, DocA_2], [DocB_1, DocB_2]]
     docs_by_file_group = []
-    TOTAL_CHUNK_BUDGET = 30
     
     if target_files:
         # Calculate how many chunks we can afford per document
-        # e.g., if 3 files, we get 10 chunks each.
+        # e.g., if 2 files, we get 10 chunks each.
         k_per_doc = max(1, TOTAL_CHUNK_BUDGET // len(target_files))
-        
-        for file in target_files:
-            # CRITICAL FIX: Use similarity_search_with_score
-            res = vectorstore.similarity_search_with_score(
-                question, 
-                k=k_per_doc, 
-                filter={"source_document": file} # Strict filtering by file
-            )
-            
-            file_group = []
-            for doc, score in res:
-                doc.metadata["score"] = f"{score:.4f}" # Save Score
-                file_group.append(doc)
-            
-            if file_group:
-                docs_by_file_group.append(file_group)
+        doc_hashes = get_indexed_documents(state.get("corpus_id"))
+
+        # Per-file clustering runs concurrently (cached per content hash), results in file order
+        with span("retrieval:per_file", files=len(target_files)) as s:
+            with ThreadPoolExecutor(max_workers=min(RETRIEVAL_WORKERS, len(target_files))) as pool:
+                futures = [submit_traced(pool, coverage_group, vectorstore, file, doc_hashes, k_per_doc)
+                           for file in target_files]
+                per_file_results = [future.result() for future in futures]
+            s.set(retrieved=sum(len(res) for res in per_file_results))
+
+        docs_by_file_group = [group for group in per_file_results if group]
     else:
         # Fallback (Should rarely happen if files are uploaded)
-        res = vectorstore.similarity_search_with_score(question, k=20)
-        file_group = []
-        for doc, score in res:
-            doc.metadata["score"] = f"{score:.4f}"
-            file_group.append(doc)
-        docs_by_file_group.append(file_group)
+        with span("embedding:query"):
+            query_vector = vectorstore.embeddings.embed_query(question)
+        with span("retrieval:all_files"):
+            res = vectorstore.similarity_search_by_vector_with_relevance_scores(query_vector, k=20)
+        docs_by_file_group.append(scored_group(res))
 
     # --- PHASE 3: INTERLEAVING & DEDUPLICATION ---
     # Turn [[A1, A2], [B1, B2]] into [A1, B1, A2, B2] so UI shows variety
-    all_results = []
-    seen_content = set()
-    
-    if docs_by_file_group:
-        max_len = max(len(g) for g in docs_by_file_group)
-        for i in range(max_len):
-            for group in docs_by_file_group:
-                if i < len(group):
-                    doc = group[i]
-                    # Check Fingerprint (First 100 chars)
-                    fingerprint = doc.page_content[:100]
-                    if fingerprint not in seen_content:
-                        seen_content.add(fingerprint)
-                        all_results.append(doc)
+    all_results = interleave_unique(docs_by_file_group)
 
     # --- PHASE 4: GENERATE SUMMARY ---
-    # We format the context to clearly label which document each chunk comes from
-    context_text = "\n\n".join([f"== SOURCE DOC: {d.metadata.get('source_document')} ==\n{d.page_content}" for d in all_results])
+    context_text, all_results, _ = pack_summary_context(all_results)
+    response = generate_answer(SUMMARY_PROMPT, {"context": context_text})
     
-    prompt = ChatPromptTemplate.from_template(
-        """You are an expert summarizer. 
-        Create a comprehensive summary based on the provided context.
-        
-        Instructions:
-        1. Only summarize the documents provided in the context below.
-        2. If the user asked for a specific document, focus ONLY on that.
-        3. Explicitly mention the document names in your summary.
-        4. Structure with clear headings and bullet points.
-        
-        Context from documents:
-        {context}
-        """
-    )
-    chain = prompt | llm | StrOutputParser()
-    response = chain.invoke({"context": context_text})
+    return {"messages": [response], "documents": all_results}
+
+
+async def asummarization_agent(state):
+    """Async summarization_agent: the per-file chunk selections fan out as concurrent tasks."""
+    vectorstore = await asyncio.to_thread(get_vectorstore, state.get("corpus_id"))
+    question = state["question"]
+    all_file_names = state.get("file_names", [])
+
+    # --- PHASE 1: SMART FILE SELECTION ---
+    if all_file_names:
+        target_files, confident = match_target_files(question, all_file_names)
+        if not confident:
+            log_event("summarizer_ambiguous_match", candidates=target_files)
+            target_files = await aselect_files_with_llm(question, all_file_names)
+        log_event("summarizer_targets", targets=target_files, local=confident)
+    else:
+        target_files = []
+
+    # --- FAST PATH: PRECOMPUTED SUMMARIES ---
+    summaries = await asyncio.to_thread(precomputed_summaries, target_files, state.get("corpus_id"))
+    if summaries:
+        log_event("summarizer_precomputed", targets=target_files)
+        return await asummarize_from_cache(question, summaries)
+
+    # --- PHASE 2: COVERAGE-BASED SELECTION ---
+    if target_files:
+        k_per_doc = max(1, TOTAL_CHUNK_BUDGET // len(target_files))
+        doc_hashes = await asyncio.to_thread(get_indexed_documents, state.get("corpus_id"))
+        with span("retrieval:per_file", files=len(target_files)) as s:
+            per_file_results = await asyncio.gather(*[
+                asyncio.to_thread(coverage_group, vectorstore, file, doc_hashes, k_per_doc)
+                for file in target_files
+            ])
+            s.set(retrieved=sum(len(res) for res in per_file_results))
+        docs_by_file_group = [group for group in per_file_results if group]
+    else:
+        with span("embedding:query"):
+            query_vector = await asyncio.to_thread(vectorstore.embeddings.embed_query, question)
+        with span("retrieval:all_files"):
+            res = await asyncio.to_thread(vectorstore.similarity_search_by_vector_with_relevance_scores,
+                                          query_vector, k=20)
+        docs_by_file_group = [scored_group(res)]
+
+    # --- PHASE 3 + 4: INTERLEAVE, DEDUPLICATE, SUMMARIZE ---
+    all_results = interleave_unique(docs_by_file_group)
+    context_text, all_results, _ = pack_summary_context(all_results)
+    response = await agenerate_answer(SUMMARY_PROMPT, {"context": context_text})
     
     return {"messages": [response], "documents": all_results}
 
 
+def cached_summary_context(summaries):
+    return "\n\n".join(
+        f"== SOURCE DOC: {s['source_document']} ==\n{s['summary']}" for s in summaries
+    )
+
+
+def cached_summary_documents(summaries):
+    # Page-group summaries act as the supporting evidence
+    return [
+        Document(
+            page_content=group["summary"],
+            metadata={
+                "source_document": s["source_document"],
+                "page_number": int(group["pages"].split("-")[0]),
+                "doc_hash": s["doc_hash"],
+                # Indexed: a dense page range may have been summarized in several parts
+                "chunk_id": f"summary:{s['doc_hash'][:8]}:{i}:{group['pages']}"
+            }
+        )
+        for s in summaries for i, group in enumerate(s["groups"])
+    ]
+
+
+def summarize_from_cache(question, summaries):
+    """Answers a summarize request from precomputed per-document summaries (no retrieval)."""
+    response = generate_answer(CACHED_SUMMARY_PROMPT,
+                               {"context": cached_summary_context(summaries), "question": question})
+    return {"messages": [response], "documents": cached_summary_documents(summaries)}
+
+
+async def asummarize_from_cache(question, summaries):
+    response = await agenerate_answer(CACHED_SUMMARY_PROMPT,
+                                      {"context": cached_summary_context(summaries), "question": question})
+    return {"messages": [response], "documents": cached_summary_documents(summaries)}
+
+
 # ==========================================
 # 3. REASONING AGENT
 # Function: Multi-step logic using data ALREADY retrieved by RAG.
 # ==========================================
+def reasoning_context(state):
+    # We use the documents passed from the RAG agent (Chaining)
+    docs = state["documents"]
+    context_text, _, _ = pack_context(docs, formatter=lambda d, text: f"[{d.metadata.get('source_document')}] {text}")
+    return context_text
+
+
 def reasoning_agent(state):
-    print("--- Reasoning Agent Activated ---")
+    log_event("reasoning_agent", documents=len(state["documents"]))
     question = state["question"]
-    # We use the documents passed from the RAG agent (Chaining)
-    docs = state["documents"] 
+    response = generate_answer(REASONING_PROMPT, {"context": reasoning_context(state), "question": question})
     
-    context_text = "\n\n".join([f"[{d.metadata.get('source_document')}] {d.page_content}" for d in docs])
+    return {"messages": [response]} # Note: We don't return 'documents' here because they are already in state
 
-    prompt = ChatPromptTemplate.from_template(
-        """You are a specialized Reasoning Agent. 
-        The user has asked for a complex analysis (Comparison, Timeline, Aggregation, or Logic).
-        
-        Reference the context provided by the RAG agent.
-        If comparing, list similarities and differences.
-        If creating a timeline, order events chronologically.
-        
-        Context:
-        {context}
-        
-        User Request: 
-        {question}
-        """
-    )
-    chain = prompt | llm | StrOutputParser()
-    response = chain.invoke({"context": context_text, "question": question})
+
+async def areasoning_agent(state):
+    log_event("reasoning_agent", documents=len(state["documents"]))
+    question = state["question"]
+    response = await agenerate_answer(REASONING_PROMPT, {"context": reasoning_context(state), "question": question})
     
-    return {"messages": [response]} # Note: We don't return 'documents' here because they are already in state
\ No newline at end of file
+    return {"messages": [response]}
@@ -0,0 +1,133 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+import numpy as np
+from langchain_core.documents import Document
+from modules.embeddings import get_embedding_model
+from modules.telemetry import log_event, inc
+
+# ==========================================
+# CONFIGURATION
+# ==========================================
+ANSWER_CACHE_PATH = "./storage/answer_cache.sqlite"
+# Minimum cosine similarity between two questions to reuse an answer
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", 0.92))
+# Least recently used entries are evicted beyond this size
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", 1000))
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+class AnswerCache:
+    """
+    Persistent semantic cache in front of the agent graph.
+    Questions are matched by embedding similarity, and every entry is scoped to a
+    corpus version so answers never leak across different document sets.
+    """
+
+    def __init__(self, path=ANSWER_CACHE_PATH, threshold=ANSWER_CACHE_THRESHOLD,
+                 max_entries=ANSWER_CACHE_MAX_ENTRIES):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        # corpus_version -> (row ids, normalized question matrix)
+        self._matrices = {}
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("""CREATE TABLE IF NOT EXISTS answers (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            corpus_version TEXT, question TEXT, embedding BLOB,
+            intent TEXT, answer TEXT, documents TEXT, last_used REAL)""")
+        self._db.execute("CREATE INDEX IF NOT EXISTS idx_corpus ON answers (corpus_version)")
+        self._db.commit()
+
+    def _embed(self, question):
+        vector = np.asarray(get_embedding_model().embed_query(question), dtype=np.float32)
+        return vector / np.linalg.norm(vector)
+
+    def _matrix(self, corpus_version):
+        if corpus_version not in self._matrices:
+            rows = self._db.execute(
+                "SELECT id, embedding FROM answers WHERE corpus_version = ?", (corpus_version,)
+            ).fetchall()
+            ids = [r[0] for r in rows]
+            matrix = (np.stack([np.frombuffer(r[1], dtype=np.float32) for r in rows])
+                      if rows else np.zeros((0, 0), dtype=np.float32))
+            self._matrices[corpus_version] = (ids, matrix)
+        return self._matrices[corpus_version]
+
+    def lookup(self, question, corpus_version):
+        """Returns {"intent", "answer", "documents"} of the closest earlier question, or None."""
+        query = self._embed(question)
+        with self._lock:
+            ids, matrix = self._matrix(corpus_version)
+            if not ids:
+                self.misses += 1
+                inc("pdf_chat_cache_total", cache="answer", result="miss")
+                return None
+            sims = matrix @ query
+            best = int(np.argmax(sims))
+            if sims[best] < self.threshold:
+                self.misses += 1
+                inc("pdf_chat_cache_total", cache="answer", result="miss")
+                return None
+
+            self.hits += 1
+            inc("pdf_chat_cache_total", cache="answer", result="hit")
+            row = self._db.execute(
+                "SELECT intent, answer, documents FROM answers WHERE id = ?", (ids[best],)
+            ).fetchone()
+            self._db.execute("UPDATE answers SET last_used = ? WHERE id = ?", (time.time(), ids[best]))
+            self._db.commit()
+
+        intent, answer, documents = row
+        log_event("answer_cache_hit", similarity=round(float(sims[best]), 4))
+        return {
+            "intent": intent,
+            "answer": answer,
+            "documents": [Document(page_content=d["page_content"], metadata=d["metadata"])
+                          for d in json.loads(documents)]
+        }
+
+    def store(self, question, corpus_version, intent, answer, documents):
+        payload = json.dumps([{"page_content": d.page_content, "metadata": d.metadata} for d in documents])
+        embedding = self._embed(question).tobytes()
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO answers (corpus_version, question, embedding, intent, answer, documents, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (corpus_version, question, embedding, intent, answer, payload, time.time())
+            )
+            # LRU eviction by last use
+            self._db.execute(
+                "DELETE FROM answers WHERE id NOT IN (SELECT id FROM answers ORDER BY last_used DESC LIMIT ?)",
+                (self.max_entries,)
+            )
+            self._db.commit()
+            self._matrices.clear()
+
+    def stats(self):
+        with self._lock:
+            entries = self._db.execute("SELECT COUNT(*) FROM answers").fetchone()[0]
+        lookups = self.hits + self.misses
+        return {
+            "entries": entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0
+        }
+
+
+def get_answer_cache():
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = AnswerCache()
+    return _cache
@@ -0,0 +1,108 @@
+import os
+import time
+import queue
+import asyncio
+import weakref
+import threading
+import contextvars
+from concurrent.futures import Future
+from contextlib import asynccontextmanager
+from modules.telemetry import observe
+
+# ==========================================
+# CONFIGURATION
+# ==========================================
+# LLM requests in flight at once on the async path, shared by every session
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", 4))
+
+_loop = None
+_loop_lock = threading.Lock()
+_semaphores = weakref.WeakKeyDictionary()  # event loop -> LLM semaphore
+
+
+def get_event_loop():
+    """Process-wide event loop running on a daemon thread. All sessions share it."""
+    global _loop
+    if _loop is None:
+        with _loop_lock:
+            if _loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name="async-runtime", daemon=True).start()
+                _loop = loop
+    return _loop
+
+
+def _copy_outcome(task, future):
+    if future.cancelled():
+        return  # The caller stopped waiting (see iterate_async)
+    if task.cancelled():
+        future.cancel()
+    elif task.exception() is not None:
+        future.set_exception(task.exception())
+    else:
+        future.set_result(task.result())
+
+
+def submit(coro):
+    """
+    Schedules a coroutine on the shared loop from any thread and returns a concurrent Future.
+    The caller's context (e.g. the current trace) is carried over to the task.
+    Cancelling the Future cancels the task.
+    """
+    loop = get_event_loop()
+    future = Future()
+
+    def start():
+        if future.cancelled():
+            coro.close()
+            return
+        task = loop.create_task(coro)
+        task.add_done_callback(lambda t: _copy_outcome(t, future))
+        future.add_done_callback(lambda f: f.cancelled() and loop.call_soon_threadsafe(task.cancel))
+
+    loop.call_soon_threadsafe(start, context=contextvars.copy_context())
+    return future
+
+
+def run_async(coro):
+    """Blocking call from synchronous code (Streamlit, CLI) into the shared loop."""
+    return submit(coro).result()
+
+
+def iterate_async(async_iterable):
+    """Consumes an async iterator on the shared loop and yields its items to synchronous code."""
+    items = queue.Queue()
+    done = object()
+
+    async def pump():
+        try:
+            async for item in async_iterable:
+                items.put(item)
+        finally:
+            items.put(done)
+
+    future = submit(pump())
+    finished = False
+    try:
+        while (item := items.get()) is not done:
+            yield item
+        finished = True
+    finally:
+        if not finished:
+            # The consumer stopped early (e.g. an abandoned Streamlit run): stop the iterator
+            # too, so it does not keep its LLM slot
+            future.cancel()
+    future.result()  # re-raises errors from the iterator
+
+
+@asynccontextmanager
+async def llm_slot():
+    """Waits for one of the LLM_MAX_CONCURRENCY slots of the running loop."""
+    loop = asyncio.get_running_loop()
+    semaphore = _semaphores.get(loop)
+    if semaphore is None:
+        semaphore = _semaphores[loop] = asyncio.Semaphore(LLM_MAX_CONCURRENCY)
+    start = time.perf_counter()
+    async with semaphore:
+        observe("pdf_chat_llm_wait_seconds", time.perf_counter() - start)
+        yield
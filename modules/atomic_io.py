@@ -0,0 +1,27 @@
+import os
+import json
+import tempfile
+
+
+def atomic_write(path, data):
+    """
+    Replaces `path` with `data` (str or bytes) in one step: readers see the old file or the
+    new one, never a partial write. Every call writes its own temp file next to `path`, so
+    concurrent writers (threads or processes) never clobber each other; the last one wins.
+    """
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=f".{os.path.basename(path)}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data.encode("utf-8") if isinstance(data, str) else data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def atomic_write_json(path, obj, **dump_kwargs):
+    """atomic_write of json.dumps(obj, **dump_kwargs)."""
+    atomic_write(path, json.dumps(obj, **dump_kwargs))
@@ -0,0 +1,190 @@
+"""
+Headless batch question answering over an ingested corpus.
+
+Reads questions from JSONL ({"question": ..., optional "id" and "file_names", any other
+fields are copied to the output}), answers them with app_graph on a worker pool, and
+appends one JSON line per question: answer, intent, retrieved chunk IDs and timings.
+Re-running with the same output file resumes: questions already answered are skipped.
+
+Usage:
+    python -m modules.batch_qa --input questions.jsonl --output answers.jsonl --corpus <id> --workers 8 --rps 2
+    python -m modules.batch_qa --input questions.jsonl --output answers.jsonl --stub-llm   # offline
+
+The corpus ID is the ?corpus= parameter in the app's URL: every browser session uploads into
+its own corpus, so the default corpus is empty unless something ingested into it directly.
+"""
+import os
+import json
+import time
+import argparse
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dotenv import load_dotenv
+from langchain_core.rate_limiters import InMemoryRateLimiter
+from modules.telemetry import trace_request, log_event
+
+# ==========================================
+# CONFIGURATION
+# ==========================================
+# Questions answered at once (each runs the whole graph on its own thread)
+BATCH_WORKERS = int(os.getenv("BATCH_WORKERS", 4))
+# LLM requests per second across all workers (0 = no limit)
+BATCH_REQUESTS_PER_SECOND = float(os.getenv("BATCH_REQUESTS_PER_SECOND", 0))
+
+
+def load_questions(path):
+    """Questions from JSONL. Lines without an "id" get their line number as ID."""
+    questions = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line_number, line in enumerate(f, start=1):
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            record.setdefault("id", str(line_number))
+            record["id"] = str(record["id"])
+            questions.append(record)
+    return questions
+
+
+def load_finished(path):
+    """IDs already answered in an output file. Failed and half-written lines are retried."""
+    finished = set()
+    if not os.path.exists(path):
+        return finished
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if not record.get("error"):
+                finished.add(record["id"])
+    return finished
+
+
+def answer_question(graph, record, corpus_id, file_names):
+    """Runs one question through the graph. Never raises: errors are part of the result."""
+    result = {k: v for k, v in record.items() if k != "file_names"}
+    state = {
+        "question": record["question"], "messages": [], "documents": [], "intent": "",
+        "file_names": record.get("file_names") or file_names, "corpus_id": corpus_id
+    }
+    with trace_request("batch_question", question_id=record["id"]) as trace:
+        try:
+            output = graph.invoke(state)
+            documents = output.get("documents", [])
+            result.update(
+                intent=output["intent"],
+                answer=output["messages"][0] if output["messages"] else "",
+                chunk_ids=[d.metadata.get("chunk_id") for d in documents],
+                sources=[[d.metadata.get("source_document"), d.metadata.get("page_number")] for d in documents],
+                error=None,
+            )
+        except Exception as e:
+            result.update(intent=None, answer=None, chunk_ids=[], sources=[], error=f"{type(e).__name__}: {e}")
+    result["timings"] = {"total_ms": trace["total_ms"],
+                         "spans": [{"name": s["name"], "ms": s["ms"]} for s in trace["spans"]]}
+    return result
+
+
+def run_batch(input_path, output_path, corpus_id=None, workers=None, requests_per_second=None, resume=True):
+    """
+    Answers every question of `input_path` and appends the results to `output_path`.
+    The vector store, BM25 index and embedder are opened once and shared by all workers;
+    LLM calls of all workers go through one rate limiter. Returns a summary dict.
+    Raises ValueError if the corpus has no indexed documents (every answer would be empty).
+    """
+    from modules import agents
+    from modules.graph import app_graph
+    from modules.ingestion import get_vectorstore, get_indexed_documents
+    from modules.lexical import get_lexical_index
+
+    workers = workers or BATCH_WORKERS
+    requests_per_second = BATCH_REQUESTS_PER_SECOND if requests_per_second is None else requests_per_second
+
+    file_names = list(get_indexed_documents(corpus_id))
+    if not file_names:
+        raise ValueError(f"No documents are indexed in corpus {corpus_id or 'default'!r}. "
+                         "Pass --corpus with the ?corpus= ID shown in the app's URL.")
+    questions = load_questions(input_path)
+    finished = load_finished(output_path) if resume else set()
+    pending = [q for q in questions if q["id"] not in finished]
+    log_event("batch_started", questions=len(questions), skipped=len(questions) - len(pending), workers=workers)
+
+    # Opened before the workers start, so they share one store, index and embedding model
+    get_vectorstore(corpus_id)
+    get_lexical_index(corpus_id)
+
+    llm = agents.get_llm()
+    previous_limiter = llm.rate_limiter
+    if requests_per_second:
+        llm.rate_limiter = InMemoryRateLimiter(requests_per_second=requests_per_second,
+                                               check_every_n_seconds=0.05, max_bucket_size=workers)
+    failed, latencies = 0, []
+    start = time.perf_counter()
+    try:
+        # A partial last line (interrupted run) must not swallow the next record
+        needs_newline = False
+        if resume and os.path.exists(output_path) and os.path.getsize(output_path):
+            with open(output_path, "rb") as f:
+                f.seek(-1, os.SEEK_END)
+                needs_newline = f.read(1) != b"\n"
+        with open(output_path, "a" if resume else "w", encoding="utf-8") as out, \
+                ThreadPoolExecutor(max_workers=workers, thread_name_prefix="batch-qa") as pool:
+            if needs_newline:
+                out.write("\n")
+            futures = [pool.submit(answer_question, app_graph, q, corpus_id, file_names) for q in pending]
+            for done, future in enumerate(as_completed(futures), start=1):
+                result = future.result()
+                failed += bool(result["error"])
+                latencies.append(result["timings"]["total_ms"])
+                # Written and flushed one by one: an interrupted run loses at most the questions in flight
+                out.write(json.dumps(result, ensure_ascii=False) + "\n")
+                out.flush()
+                if done % 50 == 0 or done == len(futures):
+                    print(f"--- {done}/{len(futures)} answered ({failed} failed) ---")
+    finally:
+        llm.rate_limiter = previous_limiter
+
+    elapsed = time.perf_counter() - start
+    ordered = sorted(latencies)
+    summary = {
+        "questions": len(questions),
+        "skipped": len(questions) - len(pending),
+        "answered": len(pending) - failed,
+        "failed": failed,
+        "seconds": round(elapsed, 2),
+        "questions_per_second": round(len(pending) / elapsed, 2) if pending and elapsed else None,
+        "p50_ms": ordered[len(ordered) // 2] if ordered else None,
+        "p95_ms": ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))] if ordered else None,
+    }
+    log_event("batch_finished", **summary)
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--input", required=True, help="Questions (JSONL)")
+    parser.add_argument("--output", required=True, help="Answers (JSONL, appended to when resuming)")
+    parser.add_argument("--corpus", default=None,
+                        help="Corpus ID: the ?corpus= parameter in the app's URL (default: the default corpus, "
+                             "which the app does not upload into)")
+    parser.add_argument("--workers", type=int, default=None, help=f"Concurrent questions (default: {BATCH_WORKERS})")
+    parser.add_argument("--rps", type=float, default=None, help="LLM requests per second, 0 = unlimited")
+    parser.add_argument("--no-resume", action="store_true", help="Overwrite the output instead of resuming")
+    parser.add_argument("--stub-llm", action="store_true", help="Deterministic local LLM (no API key)")
+    args = parser.parse_args()
+
+    load_dotenv()
+    if args.stub_llm:
+        # Must be set before the LLM is created (modules.agents.get_llm)
+        os.environ["USE_STUB_LLM"] = "1"
+    try:
+        summary = run_batch(args.input, args.output, corpus_id=args.corpus, workers=args.workers,
+                            requests_per_second=args.rps, resume=not args.no_resume)
+    except ValueError as e:
+        parser.error(str(e))
+    print(json.dumps(summary, indent=2))
+
+
+if __name__ == "__main__":
+    main()
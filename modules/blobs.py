@@ -0,0 +1,161 @@
+import os
+import mmap
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+import fitz # PyMuPDF
+from modules.telemetry import inc
+from modules.atomic_io import atomic_write
+
+# ==========================================
+# CONFIGURATION
+# ==========================================
+# Uploaded PDFs, stored once by content (SHA-256): ./storage/blobs/<ab>/<hash>.pdf.
+# Shared by all corpora like the highlight indexes; file names live in each corpus' manifest.
+BLOB_DIR = "./storage/blobs"
+# Open fitz.Document handles kept per process (ingestion, highlighter and viewer share them)
+PDF_HANDLE_CACHE_SIZE = int(os.getenv("PDF_HANDLE_CACHE_SIZE", 8))
+# Unreferenced blobs younger than this are kept (an upload may still be waiting for its job)
+BLOB_GRACE_SECONDS = 3600
+
+_handles = OrderedDict()  # blob path -> _Handle, least recently used first
+_handles_lock = threading.Lock()
+
+
+def blob_hash(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def blob_path(doc_hash):
+    return os.path.join(BLOB_DIR, doc_hash[:2], f"{doc_hash}.pdf")
+
+
+def put_blob(data, doc_hash=None):
+    """Stores PDF bytes under their hash (written only if new) and returns the hash."""
+    doc_hash = doc_hash or blob_hash(data)
+    path = blob_path(doc_hash)
+    if os.path.exists(path):
+        os.utime(path)  # Restarts the grace period of a re-uploaded, unreferenced blob
+        return doc_hash
+    atomic_write(path, data)
+    return doc_hash
+
+
+def delete_blob(doc_hash):
+    path = blob_path(doc_hash)
+    _close_handle(path)
+    if os.path.exists(path):
+        os.remove(path)
+
+
+def list_blobs():
+    """(hash, modification time) of every stored blob."""
+    if not os.path.isdir(BLOB_DIR):
+        return []
+    blobs = []
+    for shard in os.listdir(BLOB_DIR):
+        shard_dir = os.path.join(BLOB_DIR, shard)
+        if not os.path.isdir(shard_dir):
+            continue
+        for name in os.listdir(shard_dir):
+            if name.endswith(".pdf"):
+                blobs.append((name[:-len(".pdf")], os.path.getmtime(os.path.join(shard_dir, name))))
+    return blobs
+
+
+def collect_orphaned_blobs(in_use):
+    """Deletes blobs no corpus references anymore (past the grace period). Returns how many."""
+    now = time.time()
+    orphans = [h for h, mtime in list_blobs() if h not in in_use and now - mtime > BLOB_GRACE_SECONDS]
+    for doc_hash in orphans:
+        delete_blob(doc_hash)
+    return len(orphans)
+
+
+# ==========================================
+# OPEN DOCUMENT HANDLES
+# ==========================================
+class _Handle:
+    """A PDF opened from a read-only memory map (no copy into the Python heap)."""
+
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._view = memoryview(self._map)
+        self.doc = fitz.open(stream=self._view, filetype="pdf")
+        # fitz.Document is not thread-safe: one user at a time
+        self.lock = threading.RLock()
+        self.closed = False
+
+    def close(self):
+        with self.lock:
+            self.closed = True
+            self.doc.close()
+            self.doc.stream = None
+            self._view.release()
+            self._map.close()
+
+
+def _reset_after_fork():
+    # A forked worker must not share (or wait on the locks of) the parent's handles.
+    # The hit/miss counters live in telemetry, which resets its own lock and counters.
+    global _handles, _handles_lock
+    _handles, _handles_lock = OrderedDict(), threading.Lock()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def _close_handle(path):
+    with _handles_lock:
+        handle = _handles.pop(path, None)
+    if handle:
+        handle.close()
+
+
+def _get_handle(path):
+    evicted = []
+    with _handles_lock:
+        handle = _handles.get(path)
+        if handle is None:
+            inc("pdf_chat_pdf_handles_total", result="miss")
+            handle = _handles[path] = _Handle(path)
+            while len(_handles) > PDF_HANDLE_CACHE_SIZE:
+                evicted.append(_handles.popitem(last=False)[1])
+        else:
+            inc("pdf_chat_pdf_handles_total", result="hit")
+            _handles.move_to_end(path)
+    # Closed outside the cache lock: an evicted handle may still be in use by another thread
+    for old in evicted:
+        old.close()
+    return handle
+
+
+def read_pdf(path):
+    """
+    The bytes of a PDF, copied from its shared memory map (for the viewer, which sends the
+    whole file to the browser): no open or read of the file per rerun.
+    """
+    while True:
+        handle = _get_handle(path)
+        with handle.lock:
+            if not handle.closed:
+                return bytes(handle._view)
+
+
+@contextmanager
+def open_pdf(path):
+    """
+    Yields the shared fitz.Document for a PDF path (usually a blob), opened on first use
+    and kept in a small LRU. The handle is locked while it is in use.
+    """
+    while True:
+        handle = _get_handle(path)
+        with handle.lock:
+            # Evicted by another thread in the meantime: open it again
+            if not handle.closed:
+                yield handle.doc
+                return
@@ -0,0 +1,107 @@
+import os
+from functools import lru_cache
+from modules.telemetry import log_event
+
+# ==========================================
+# CONFIGURATION
+# ==========================================
+# Token budget for the retrieved context of a single prompt
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", 3000))
+# Summaries read more text, but still with a predictable ceiling
+SUMMARY_TOKEN_BUDGET = int(os.getenv("SUMMARY_TOKEN_BUDGET", 6000))
+# Gemini has no public tokenizer; cl100k is a close enough proxy for budgeting
+ENCODING_NAME = "cl100k_base"
+
+
+@lru_cache(maxsize=1)
+def _get_encoding():
+    try:
+        import tiktoken
+        return tiktoken.get_encoding(ENCODING_NAME)
+    except Exception:
+        # No tiktoken data available (e.g. offline): fall back to ~4 chars per token
+        return None
+
+
+def count_tokens(text):
+    encoding = _get_encoding()
+    if encoding is None:
+        return (len(text) + 3) // 4
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def truncate_to_tokens(text, max_tokens):
+    encoding = _get_encoding()
+    if encoding is None:
+        return text[:max_tokens * 4]
+    return encoding.decode(encoding.encode(text, disallowed_special=())[:max_tokens])
+
+
+def _relevance_key(doc):
+    # Scores are distances (lower = more relevant); unscored chunks go last
+    try:
+        return float(doc.metadata.get("score"))
+    except (TypeError, ValueError):
+        return float("inf")
+
+
+def _trim_overlap(doc, taken):
+    """
+    Removes the part of a chunk that overlaps chunks already packed from the same page
+    (the splitter repeats up to 200 chars between neighbours). Returns "" if fully covered.
+    """
+    start = doc.metadata.get("start_index")
+    if start is None:
+        return doc.page_content
+    key = (doc.metadata.get("source_document"), doc.metadata.get("page_number"))
+    s, e = start, start + len(doc.page_content)
+    for s2, e2 in taken.get(key, []):
+        if s2 <= s < e2:
+            s = e2
+        if s2 < e <= e2:
+            e = s2
+        if s >= e:
+            return ""
+    return doc.page_content[s - start:e - start]
+
+
+def _mark_taken(doc, taken):
+    start = doc.metadata.get("start_index")
+    if start is not None:
+        key = (doc.metadata.get("source_document"), doc.metadata.get("page_number"))
+        taken.setdefault(key, []).append((start, start + len(doc.page_content)))
+
+
+def pack_context(docs, formatter, budget=None, order_by_score=True, separator="\n\n"):
+    """
+    Builds a prompt context that fits in `budget` tokens.
+    - Chunks are taken by relevance score (or in the given order if order_by_score=False).
+    - Overlap with an already packed neighbour from the same page is trimmed.
+    - `formatter(doc, text)` renders one chunk (source labels etc.).
+    Returns (context_text, packed_docs, tokens_used).
+    """
+    budget = budget or CONTEXT_TOKEN_BUDGET
+    ordered = sorted(docs, key=_relevance_key) if order_by_score else list(docs)
+    separator_tokens = count_tokens(separator)
+
+    parts, packed, taken = [], [], {}
+    used = 0
+    for doc in ordered:
+        text = _trim_overlap(doc, taken)
+        if not text.strip():
+            continue
+        part = formatter(doc, text)
+        cost = count_tokens(part) + (separator_tokens if parts else 0)
+        if used + cost > budget:
+            if parts:
+                continue # A smaller chunk further down may still fit
+            # Always keep at least the most relevant chunk, cut to the budget
+            part = truncate_to_tokens(part, budget)
+            cost = count_tokens(part)
+        parts.append(part)
+        packed.append(doc)
+        _mark_taken(doc, taken)
+        used += cost
+
+    log_event("context_packed", chunks=len(packed), candidates=len(docs), tokens=used, budget=budget)
+    return separator.join(parts), packed, used
@@ -0,0 +1,243 @@
+import os
+import re
+import json
+import time
+import uuid
+import shutil
+import threading
+from modules.highlights import HIGHLIGHT_INDEX_DIR, delete_highlight_index
+from modules.blobs import blob_path, collect_orphaned_blobs
+from modules.telemetry import log_event
+from modules.atomic_io import atomic_write_json
+
+# ==========================================
+# CONFIGURATION
+# ==========================================
+# The default corpus keeps the original single-store layout under ./storage.
+# Every other corpus (one per uploaded document set) gets ./storage/corpora/<id>/.
+# The PDFs themselves are content-addressed blobs shared by all corpora (see modules/blobs.py).
+STORAGE_DIR = "./storage"
+CORPORA_DIR = "./storage/corpora"
+UPLOAD_DIR = "temp_pdf"
+DEFAULT_CORPUS = "default"
+# Corpus ID -> {"created", "last_used", "documents"}
+REGISTRY_PATH = "./storage/corpora/registry.json"
+# Corpora not used for this long are evicted
+CORPUS_TTL_SECONDS = float(os.getenv("CORPUS_TTL_SECONDS", 24 * 3600))
+# Least recently used corpora are evicted while all corpora together exceed this size
+CORPUS_DISK_BUDGET_MB = float(os.getenv("CORPUS_DISK_BUDGET_MB", 2048))
+
+# Format of new_corpus_id(). IDs end up in paths, so nothing else (e.g. from a URL) is accepted.
+CORPUS_ID_PATTERN = re.compile(r"[0-9a-f]{12}")
+
+_registry_lock = threading.Lock()
+
+
+def new_corpus_id():
+    return uuid.uuid4().hex[:12]
+
+
+def is_default(corpus_id):
+    return not corpus_id or corpus_id == DEFAULT_CORPUS
+
+
+def is_valid_corpus_id(corpus_id):
+    return is_default(corpus_id) or (isinstance(corpus_id, str) and CORPUS_ID_PATTERN.fullmatch(corpus_id) is not None)
+
+
+def _check_corpus_id(corpus_id):
+    if not is_valid_corpus_id(corpus_id):
+        raise ValueError(f"Invalid corpus ID {corpus_id!r}")
+
+
+def corpus_dir(corpus_id):
+    """Directory of a named corpus: ./storage/corpora/<id>."""
+    _check_corpus_id(corpus_id)
+    return os.path.join(CORPORA_DIR, corpus_id)
+
+
+def corpus_path(path, corpus_id=None):
+    """Maps a storage path of the default corpus (e.g. ./storage/manifest.json) into `corpus_id`."""
+    if is_default(corpus_id):
+        return path
+    return os.path.join(corpus_dir(corpus_id), os.path.relpath(path, STORAGE_DIR))
+
+
+def upload_dir(corpus_id=None):
+    """Where uploaded PDFs of a corpus were written before the blob store (only cleaned up now)."""
+    _check_corpus_id(corpus_id)
+    return UPLOAD_DIR if is_default(corpus_id) else os.path.join(UPLOAD_DIR, corpus_id)
+
+
+# ==========================================
+# REGISTRY
+# ==========================================
+def load_registry():
+    if not os.path.exists(REGISTRY_PATH):
+        return {}
+    with open(REGISTRY_PATH, "r", encoding="utf-8") as f:
+        registry = json.load(f)
+    # A hand-edited or corrupted entry must never reach the path helpers or eviction
+    return {corpus_id: entry for corpus_id, entry in registry.items() if is_valid_corpus_id(corpus_id)}
+
+
+def _save_registry(registry):
+    atomic_write_json(REGISTRY_PATH, registry, indent=2)
+
+
+def touch_corpus(corpus_id, **fields):
+    """Registers a corpus (or refreshes its last use). The default corpus is never tracked."""
+    if is_default(corpus_id):
+        return
+    _check_corpus_id(corpus_id)
+    with _registry_lock:
+        registry = load_registry()
+        entry = registry.setdefault(corpus_id, {"created": time.time()})
+        entry["last_used"] = time.time()
+        entry.update(fields)
+        _save_registry(registry)
+
+
+def corpus_exists(corpus_id):
+    return is_default(corpus_id) or corpus_id in load_registry()
+
+
+def _dir_size(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+def _shared_files(doc_hash):
+    # Everything kept per document by content hash, shared by all corpora that index it
+    from modules.summaries import SUMMARY_DIR
+    from modules.representatives import REPRESENTATIVE_DIR
+
+    return [blob_path(doc_hash)] + [os.path.join(directory, f"{doc_hash}.json")
+                                    for directory in (HIGHLIGHT_INDEX_DIR, SUMMARY_DIR, REPRESENTATIVE_DIR)]
+
+
+def corpus_disk_usage(corpus_id):
+    """Bytes used by a corpus: vector store, sidecars, and the blobs and caches of its PDFs."""
+    from modules.ingestion import load_manifest
+
+    shared = 0
+    for doc_hash in _referenced(load_manifest(corpus_id)):
+        for path in _shared_files(doc_hash):
+            try:
+                shared += os.path.getsize(path)
+            except OSError:
+                pass
+    return _dir_size(corpus_dir(corpus_id)) + _dir_size(upload_dir(corpus_id)) + shared
+
+
+# ==========================================
+# EVICTION
+# ==========================================
+def _remove_tree(path, root):
+    """rmtree, but only for a directory strictly inside `root` (symlinks resolved)."""
+    real_path, real_root = os.path.realpath(path), os.path.realpath(root)
+    if real_path == real_root or os.path.commonpath([real_path, real_root]) != real_root:
+        raise ValueError(f"Refusing to delete {path!r}: not inside {root!r}")
+    shutil.rmtree(real_path, ignore_errors=True)
+
+
+def delete_corpus(corpus_id):
+    """Closes the corpus' open stores and removes all of its files and its registry entry."""
+    from modules.ingestion import close_vectorstore
+    from modules.lexical import drop_lexical_index
+
+    if is_default(corpus_id):
+        raise ValueError("The default corpus cannot be deleted")
+    _check_corpus_id(corpus_id)
+    close_vectorstore(corpus_id)
+    drop_lexical_index(corpus_id)
+    _remove_tree(corpus_dir(corpus_id), CORPORA_DIR)
+    _remove_tree(upload_dir(corpus_id), UPLOAD_DIR)
+    with _registry_lock:
+        registry = load_registry()
+        registry.pop(corpus_id, None)
+        _save_registry(registry)
+
+
+def _referenced(manifest):
+    # Indexed documents and the ones an interrupted job will resume
+    return set(manifest["documents"]) | set(manifest.get("in_progress", {}))
+
+
+def documents_in_use(exclude=None):
+    """Content hashes indexed (or being indexed) by any corpus (optionally ignoring one corpus)."""
+    from modules.ingestion import load_manifest
+
+    in_use = set()
+    for corpus_id in [DEFAULT_CORPUS] + list(load_registry()):
+        if corpus_id != exclude:
+            in_use.update(_referenced(load_manifest(corpus_id)))
+    return in_use
+
+
+def _orphans(directory, in_use):
+    if not os.path.isdir(directory):
+        return []
+    return [name[:-len(".json")] for name in os.listdir(directory)
+            if name.endswith(".json") and name[:-len(".json")] not in in_use]
+
+
+def collect_orphaned_highlights():
+    """
+    Highlight indexes, summaries, representative clusters and PDF blobs are shared by
+    content hash; drop the ones no corpus or pending job references anymore. Returns how
+    many highlight indexes were removed.
+    """
+    from modules.summaries import SUMMARY_DIR, delete_summary
+    from modules.representatives import REPRESENTATIVE_DIR, delete_clusters
+    from modules.jobs import blobs_in_active_jobs
+
+    # Uploads of jobs that have not started yet (e.g. re-queued after a restart) count as used
+    in_use = documents_in_use() | blobs_in_active_jobs()
+    collect_orphaned_blobs(in_use)
+    for doc_hash in _orphans(SUMMARY_DIR, in_use):
+        delete_summary(doc_hash)
+    for doc_hash in _orphans(REPRESENTATIVE_DIR, in_use):
+        delete_clusters(doc_hash)
+    orphans = _orphans(HIGHLIGHT_INDEX_DIR, in_use)
+    for doc_hash in orphans:
+        delete_highlight_index(doc_hash)
+    return len(orphans)
+
+
+def evict_idle_corpora(ttl_seconds=None, disk_budget_mb=None, keep=()):
+    """
+    Deletes corpora idle for longer than the TTL, then the least recently used ones
+    until the rest fit into the disk budget. Corpora in `keep` are never evicted.
+    Returns the evicted corpus IDs.
+    """
+    ttl_seconds = CORPUS_TTL_SECONDS if ttl_seconds is None else ttl_seconds
+    budget = (CORPUS_DISK_BUDGET_MB if disk_budget_mb is None else disk_budget_mb) * 1024 * 1024
+    registry = load_registry()
+    now = time.time()
+
+    # Oldest first
+    candidates = sorted((c for c in registry if c not in keep), key=lambda c: registry[c]["last_used"])
+    evicted = [c for c in candidates if now - registry[c]["last_used"] > ttl_seconds]
+    usage = {c: corpus_disk_usage(c) for c in registry if c not in evicted}
+    total = sum(usage.values())
+    for corpus_id in candidates:
+        if total <= budget:
+            break
+        if corpus_id not in evicted:
+            evicted.append(corpus_id)
+            total -= usage[corpus_id]
+
+    for corpus_id in evicted:
+        delete_corpus(corpus_id)
+        log_event("corpus_evicted", corpus_id=corpus_id,
+                  idle_seconds=round(now - registry[corpus_id]["last_used"]))
+    if evicted:
+        collect_orphaned_highlights()
+    return evicted
@@ -0,0 +1,75 @@
+import re
+import zlib
+import hashlib
+
+# ==========================================
+# CONFIGURATION
+# ==========================================
+SHINGLE_SIZE = 5          # words per shingle
+# Retrieved chunks at least this similar are shown/used once at query time
+# (unless their exact terms differ, see exact_terms)
+QUERY_DUPLICATE_THRESHOLD = 0.7
+# Codes, numbers and dates: "INV-2023-0001", "4.2.1", "12/05/2023", "1200"
+EXACT_TERM_PATTERN = re.compile(r"[a-z0-9]+(?:[-./:][a-z0-9]+)*")
+
+
+def shingles(text, size=SHINGLE_SIZE):
+    """Set of hashed word n-grams. crc32 keeps hashes stable across processes."""
+    words = re.findall(r"\w+", text.lower())
+    if len(words) < size:
+        return {zlib.crc32(" ".join(words).encode("utf-8"))} if words else set()
+    return {zlib.crc32(" ".join(words[i:i + size]).encode("utf-8")) for i in range(len(words) - size + 1)}
+
+
+def jaccard(a, b):
+    if not a and not b:
+        return 1.0
+    return len(a & b) / len(a | b)
+
+
+def exact_terms(text):
+    """Tokens containing a digit. Templated chunks that differ here state different facts."""
+    return {token for token in EXACT_TERM_PATTERN.findall(text.lower()) if any(c.isdigit() for c in token)}
+
+
+def normalize_for_dedup(text):
+    """Lowercase words only, so case, whitespace and punctuation differences do not count."""
+    return " ".join(re.findall(r"\w+", text.lower()))
+
+
+class DuplicateIndex:
+    """
+    Ingestion-time dedup. `find_or_add` returns the key of an already indexed chunk with
+    the same normalized text, or registers the text and returns None.
+    Only identical text is collapsed: templated pages that differ in an invoice number,
+    a date or a name carry different facts, so similar chunks are filtered at query time instead.
+    """
+
+    def __init__(self):
+        self.keys = {}
+
+    def find_or_add(self, key, text):
+        digest = hashlib.sha1(normalize_for_dedup(text).encode("utf-8")).digest()
+        existing = self.keys.get(digest)
+        if existing is None:
+            self.keys[digest] = key
+        return existing
+
+
+class DuplicateFilter:
+    """
+    Query-time dedup: keeps a text unless one already kept is too similar and has the same
+    exact terms. Two invoices from one template are both kept; a repeated header is not.
+    """
+
+    def __init__(self, threshold=QUERY_DUPLICATE_THRESHOLD):
+        self.threshold = threshold
+        self.kept = []
+
+    def is_new(self, text):
+        candidate, terms = shingles(text), exact_terms(text)
+        if any(terms == seen_terms and jaccard(candidate, seen) >= self.threshold
+               for seen, seen_terms in self.kept):
+            return False
+        self.kept.append((candidate, terms))
+        return True
@@ -0,0 +1,111 @@
+import os
+import hashlib
+import sqlite3
+import threading
+from functools import lru_cache
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from modules.telemetry import span, inc
+
+EMBEDDING_MODEL_NAME = "BAAI/bge-small-en-v1.5"
+# How many chunks are sent to the model per forward pass (override with EMBEDDING_BATCH_SIZE)
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", 64))
+# Persistent cache: hash(model name + chunk text) -> vector
+EMBEDDING_CACHE_PATH = "./storage/embedding_cache.sqlite"
+
+_model = None
+_model_lock = threading.Lock()
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Wraps HuggingFaceEmbeddings with an on-disk cache.
+    Document vectors are looked up by a hash of the model name and the chunk text,
+    so re-ingesting overlapping text never runs the model twice.
+    """
+
+    def __init__(self, model_name=EMBEDDING_MODEL_NAME, batch_size=EMBEDDING_BATCH_SIZE,
+                 cache_path=EMBEDDING_CACHE_PATH):
+        self.model_name = model_name
+        self.batch_size = batch_size
+        # Imported on first use: sentence-transformers pulls in torch
+        from langchain_huggingface import HuggingFaceEmbeddings
+        self.model = HuggingFaceEmbeddings(model_name=model_name, encode_kwargs={"batch_size": batch_size})
+
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        self._db_lock = threading.Lock()
+        self._db = sqlite3.connect(cache_path, check_same_thread=False)
+        self._db.execute("CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB)")
+        self._db.commit()
+
+    def _key(self, text):
+        return hashlib.sha256(f"{self.model_name}\x00{text}".encode("utf-8")).hexdigest()
+
+    def _lookup(self, keys):
+        found = {}
+        with self._db_lock:
+            # SQLite limits bound parameters, so look keys up in slices
+            for i in range(0, len(keys), 500):
+                part = keys[i:i + 500]
+                rows = self._db.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({','.join('?' * len(part))})", part
+                ).fetchall()
+                for key, blob in rows:
+                    found[key] = np.frombuffer(blob, dtype=np.float32).tolist()
+        return found
+
+    def _store(self, items):
+        with self._db_lock:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)",
+                [(key, np.asarray(vector, dtype=np.float32).tobytes()) for key, vector in items]
+            )
+            self._db.commit()
+
+    def embed_documents(self, texts):
+        keys = [self._key(t) for t in texts]
+        cached = self._lookup(list(set(keys)))
+
+        # Encode only the misses (deduplicated), in fixed-size batches
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in cached and key not in missing:
+                missing[key] = text
+        miss_keys = list(missing)
+        inc("pdf_chat_cache_total", len(texts) - len(miss_keys), cache="embedding", result="hit")
+        inc("pdf_chat_cache_total", len(miss_keys), cache="embedding", result="miss")
+        for i in range(0, len(miss_keys), self.batch_size):
+            batch_keys = miss_keys[i:i + self.batch_size]
+            with span("embedding:encode_batch", texts=len(batch_keys)):
+                vectors = self.model.embed_documents([missing[k] for k in batch_keys])
+            self._store(zip(batch_keys, vectors))
+            cached.update(zip(batch_keys, vectors))
+
+        return [list(cached[k]) for k in keys]
+
+    def embed_query(self, text):
+        # Agents embed the same question several times per request (routing, retrieval, caching)
+        return list(self._embed_query_cached(text))
+
+    @lru_cache(maxsize=256)
+    def _embed_query_cached(self, text):
+        with span("embedding:encode_query"):
+            return tuple(self.model.embed_query(text))
+
+
+def get_embedding_model():
+    """Process-wide embedder. The model is loaded once and shared by ingestion and all agents."""
+    global _model
+    if _model is None:
+        with _model_lock:
+            if _model is None:
+                with span("embedding:model_load", model=EMBEDDING_MODEL_NAME):
+                    _model = CachedEmbeddings()
+    return _model
+
+
+def set_embedding_model(model):
+    """Replaces the process-wide embedder (benchmarks use a deterministic fake model)."""
+    global _model
+    with _model_lock:
+        _model = model
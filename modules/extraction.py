@@ -0,0 +1,145 @@
+import os
+import re
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+from modules.blobs import open_pdf
+
+# Number of worker processes used for extraction (override with INGEST_WORKERS)
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", os.cpu_count() or 1))
+# Large PDFs are split into page ranges of this size so one file can use several cores
+PAGES_PER_TASK = 16
+
+def clean_text(text):
+    """
+    Minimal cleaning to keep text recognizable by the highlighter.
+    Replaces newlines with spaces to form paragraphs.
+    """
+    # Replace newlines with spaces
+    text = text.replace("\n", " ")
+    # Remove multiple spaces
+    text = re.sub(r'\s+', ' ', text)
+    return text.strip()
+
+def make_text_splitter():
+    return RecursiveCharacterTextSplitter(
+        chunk_size=1000,
+        chunk_overlap=200,
+        separators=[".", "!", "?", "\n", " ", ""],
+        add_start_index=True
+    )
+
+def map_word_offsets(cleaned_text, words):
+    """
+    Finds where each word from page.get_text("words") sits inside the cleaned page text.
+    Returns [(start, end, word_tuple), ...]. Words that cannot be placed are skipped.
+    """
+    placed, cursor = [], 0
+    for w in words:
+        pos = cleaned_text.find(w[4], cursor)
+        if pos == -1:
+            continue
+        placed.append((pos, pos + len(w[4]), w))
+        cursor = pos + len(w[4])
+    return placed
+
+def chunk_boxes(placed_words, start, end):
+    """
+    Bounding boxes of the words inside [start, end), merged into one rectangle per text line.
+    A chunk that wraps across lines or columns therefore gets one box per line it touches.
+    """
+    lines = {}
+    for w_start, w_end, w in placed_words:
+        if w_end <= start or w_start >= end:
+            continue
+        key = (w[5], w[6]) # (block_no, line_no)
+        box = lines.get(key)
+        if box is None:
+            lines[key] = [w[0], w[1], w[2], w[3]]
+        else:
+            box[0], box[1] = min(box[0], w[0]), min(box[1], w[1])
+            box[2], box[3] = max(box[2], w[2]), max(box[3], w[3])
+    return [[round(v, 1) for v in box] for box in lines.values()]
+
+def extract_page_range(file_path, start, end):
+    """
+    Worker task: extract, clean and chunk pages [start, end) of one PDF.
+    Returns plain tuples (page_number, offset, text, boxes) so results pickle cheaply.
+    `boxes` are the word rectangles the chunk covers, used for highlighting.
+    """
+    splitter = make_text_splitter()
+    chunks = []
+    # Handles are cached per process, so consecutive ranges of one file reuse the open document
+    with open_pdf(file_path) as doc:
+        for i in range(start, min(end, len(doc))):
+            page = doc[i]
+            cleaned_text = clean_text(page.get_text())
+            if not cleaned_text:
+                continue
+            placed_words = map_word_offsets(cleaned_text, page.get_text("words"))
+            for split in splitter.create_documents([cleaned_text]):
+                offset = split.metadata["start_index"]
+                boxes = chunk_boxes(placed_words, offset, offset + len(split.page_content))
+                chunks.append((i + 1, offset, split.page_content, boxes))
+    return chunks
+
+def plan_tasks(files, pages_per_task=PAGES_PER_TASK, start_pages=None):
+    """
+    Splits every file into page-range tasks. Files that cannot be opened get an error instead.
+    `start_pages` (key -> page) skips pages that were already committed by an interrupted run.
+    """
+    start_pages = start_pages or {}
+    tasks, results = [], {}
+    for key, file_path in files:
+        try:
+            with open_pdf(file_path) as doc:
+                page_count = len(doc)
+        except Exception as e:
+            results[key] = {"pages": 0, "error": str(e)}
+            continue
+        results[key] = {"pages": page_count, "error": None}
+        for start in range(start_pages.get(key, 0), page_count, pages_per_task):
+            tasks.append((key, file_path, start, start + pages_per_task))
+    return tasks, results
+
+def iter_extracted(tasks, workers=None, max_in_flight=None):
+    """
+    Runs page-range tasks on a process pool and yields (task, chunks_or_exception)
+    in task order. At most `max_in_flight` tasks are queued at once, so memory stays
+    bounded no matter how many pages are waiting.
+    """
+    workers = workers or INGEST_WORKERS
+    max_in_flight = max_in_flight or workers * 2
+
+    if workers <= 1 or len(tasks) <= 1:
+        for task in tasks:
+            _, file_path, start, end = task
+            try:
+                yield task, extract_page_range(file_path, start, end)
+            except Exception as e:
+                yield task, e
+        return
+
+    # Spawned, not forked: the app process is multi-threaded (a forked child could inherit
+    # a lock held by another thread, e.g. the metrics lock taken by open_pdf)
+    with ProcessPoolExecutor(max_workers=min(workers, len(tasks)),
+                             mp_context=multiprocessing.get_context("spawn")) as pool:
+        queue = deque()
+        remaining = iter(tasks)
+        for task in remaining:
+            queue.append((task, pool.submit(extract_page_range, *task[1:])))
+            if len(queue) >= max_in_flight:
+                break
+
+        while queue:
+            task, future = queue.popleft()
+            try:
+                output = future.result()
+            except Exception as e:
+                output = e
+            # Refill before yielding so workers stay busy while the consumer embeds
+            next_task = next(remaining, None)
+            if next_task is not None:
+                queue.append((next_task, pool.submit(extract_page_range, *next_task[1:])))
+            yield task, output
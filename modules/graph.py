@@ -1,7 +1,12 @@
-from typing import TypedDict, List
-from langgraph.graph import StateGraph, END
+from typing import TypedDict, List, Optional
+from langgraph.graph import StateGraph, START, END
 from langchain_core.documents import Document
-from modules.agents import rag_agent, summarization_agent, reasoning_agent, llm
+from modules.agents import (retrieve_documents, rag_agent, summarization_agent, reasoning_agent, get_llm, ANSWER_TAG,
+                            aretrieve_documents, arag_agent, asummarization_agent, areasoning_agent,
+                            prefetch_retrieval)
+from modules.router import route_intent, aroute_intent
+from modules.telemetry import span, trace_node, log_event
+from modules.async_runtime import llm_slot
 
 # CHANGED: Added 'file_names' to the state
 class AgentState(TypedDict):
@@ -10,38 +15,112 @@ class AgentState(TypedDict):
     documents: List[Document]
     intent: str
     file_names: List[str] # New field to track all uploaded files
+    corpus_id: Optional[str] # Document set searched by the agents (None = default corpus)
 
-def plan_route(state):
-    question = state["question"]
-    system_prompt = "Classify user intent as 'summarize', 'reason' (for comparison/timeline), or 'rag' (for lookup). Return ONLY the word."
-    response = llm.invoke(f"{system_prompt}\nUser Input: {question}")
+# State of the async graph: speculative retrieval results travel alongside the plan
+class AsyncAgentState(AgentState):
+    prefetched: Optional[list]
+
+PLANNER_PROMPT = "Classify user intent as 'summarize', 'reason' (for comparison/timeline), or 'rag' (for lookup). Return ONLY the word."
+
+def parse_intent(response):
     intent = response.content.strip().lower()
     
     if intent not in ["summarize", "reason", "rag"]: intent = "rag"
+    return intent
+
+def classify_with_llm(question):
+    with span("llm:planner"):
+        response = get_llm().invoke(f"{PLANNER_PROMPT}\nUser Input: {question}")
+    return parse_intent(response)
+
+async def aclassify_with_llm(question):
+    async with llm_slot():
+        with span("llm:planner"):
+            response = await get_llm().ainvoke(f"{PLANNER_PROMPT}\nUser Input: {question}")
+    return parse_intent(response)
+
+def plan_route(state):
+    # Local classifier first; the LLM is only asked when it is not confident
+    intent = route_intent(state["question"], llm_fallback=classify_with_llm)
+    
+    log_event("planner_decision", intent=intent)
+    return {"intent": intent}
+
+async def aplan_route(state):
+    intent = await aroute_intent(state["question"], llm_fallback=aclassify_with_llm)
     
-    print(f"--- PLANNER DECISION: {intent} ---")
+    log_event("planner_decision", intent=intent)
     return {"intent": intent}
 
 workflow = StateGraph(AgentState)
-workflow.add_node("planner", plan_route)
-workflow.add_node("rag_node", rag_agent)
-workflow.add_node("summarize_node", summarization_agent)
-workflow.add_node("reason_node", reasoning_agent)
+# Every node is timed as a "node:<name>" span (see modules/telemetry.py)
+workflow.add_node("planner", trace_node("planner")(plan_route))
+workflow.add_node("retrieve_node", trace_node("retrieve_node")(retrieve_documents))
+workflow.add_node("rag_node", trace_node("rag_node")(rag_agent))
+workflow.add_node("summarize_node", trace_node("summarize_node")(summarization_agent))
+workflow.add_node("reason_node", trace_node("reason_node")(reasoning_agent))
 
 workflow.set_entry_point("planner")
 
 def route_from_planner(state):
     if state["intent"] == "summarize": return "summarize_node"
-    return "rag_node"
+    return "retrieve_node"
 
 workflow.add_conditional_edges("planner", route_from_planner)
 
-def route_from_rag(state):
+# Retrieval is its own node, so its documents are streamed before the answer tokens
+def route_from_retrieve(state):
     if state["intent"] == "reason": return "reason_node"
-    return END
+    return "rag_node"
 
-workflow.add_conditional_edges("rag_node", route_from_rag)
+workflow.add_conditional_edges("retrieve_node", route_from_retrieve)
+workflow.add_edge("rag_node", END)
 workflow.add_edge("summarize_node", END)
 workflow.add_edge("reason_node", END)
 
-app_graph = workflow.compile()
\ No newline at end of file
+app_graph = workflow.compile()
+
+# ==========================================
+# ASYNC GRAPH
+# Planner and speculative retrieval start together; both finish before the agents run,
+# so the retrieval node finds its candidates already fetched. Use ainvoke/astream, or
+# modules.async_runtime.run_async() from synchronous code.
+# ==========================================
+async_workflow = StateGraph(AsyncAgentState)
+async_workflow.add_node("planner", trace_node("planner")(aplan_route))
+async_workflow.add_node("prefetch", trace_node("prefetch")(prefetch_retrieval))
+async_workflow.add_node("retrieve_node", trace_node("retrieve_node")(aretrieve_documents))
+async_workflow.add_node("rag_node", trace_node("rag_node")(arag_agent))
+async_workflow.add_node("summarize_node", trace_node("summarize_node")(asummarization_agent))
+async_workflow.add_node("reason_node", trace_node("reason_node")(areasoning_agent))
+
+async_workflow.add_edge(START, "planner")
+async_workflow.add_edge(START, "prefetch")
+async_workflow.add_edge("prefetch", END)
+async_workflow.add_conditional_edges("planner", route_from_planner)
+async_workflow.add_conditional_edges("retrieve_node", route_from_retrieve)
+async_workflow.add_edge("rag_node", END)
+async_workflow.add_edge("summarize_node", END)
+async_workflow.add_edge("reason_node", END)
+
+async_app_graph = async_workflow.compile()
+
+async def astream_graph(initial_state):
+    """
+    Runs async_app_graph and yields events as they happen:
+    - ("node", (node_name, update)) when a node finishes (retrieved documents come before the answer)
+    - ("token", text) for each token of the final answer
+    - ("final", state) once, with the same merged state async_app_graph.ainvoke() would return
+    """
+    state = dict(initial_state)
+    async for mode, chunk in async_app_graph.astream(initial_state, stream_mode=["updates", "messages"]):
+        if mode == "updates":
+            for node_name, update in chunk.items():
+                state.update(update or {})
+                yield "node", (node_name, update or {})
+        elif mode == "messages":
+            message, metadata = chunk
+            if ANSWER_TAG in metadata.get("tags", []) and message.content:
+                yield "token", message.content
+    yield "final", state
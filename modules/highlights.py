@@ -0,0 +1,109 @@
+import os
+import re
+import json
+from functools import lru_cache
+from modules.blobs import open_pdf
+from modules.atomic_io import atomic_write_json
+
+# One small JSON sidecar per document (keyed by content hash): chunk_id -> [page, [[x0, y0, x1, y1], ...]]
+HIGHLIGHT_INDEX_DIR = "./storage/highlights"
+
+def _index_path(doc_hash):
+    return os.path.join(HIGHLIGHT_INDEX_DIR, f"{doc_hash}.json")
+
+def save_highlight_index(doc_hash, boxes_by_chunk):
+    atomic_write_json(_index_path(doc_hash), boxes_by_chunk, separators=(",", ":"))
+    load_highlight_index.cache_clear()
+
+def delete_highlight_index(doc_hash):
+    if os.path.exists(_index_path(doc_hash)):
+        os.remove(_index_path(doc_hash))
+    load_highlight_index.cache_clear()
+
+@lru_cache(maxsize=32)
+def load_highlight_index(doc_hash):
+    if not os.path.exists(_index_path(doc_hash)):
+        return {}
+    with open(_index_path(doc_hash), "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def get_chunk_highlights(doc_hash, chunk_id):
+    """Instant lookup of the precomputed boxes for a chunk. Returns [] if the chunk is not indexed."""
+    entry = load_highlight_index(doc_hash).get(chunk_id)
+    if not entry:
+        return []
+    page_num, boxes = entry
+    return [{
+        "page": page_num,
+        "x": x0,
+        "y": y0,
+        "width": x1 - x0,
+        "height": y1 - y0,
+        "color": "red",
+        "opacity": 0.5
+    } for x0, y0, x1, y1 in boxes]
+
+def get_highlight_annotations(doc, pdf_path):
+    """
+    Annotations for a retrieved chunk.
+    Uses the word-bbox index written at ingestion time; falls back to text search
+    for chunks indexed before the sidecar existed.
+    """
+    doc_hash = doc.metadata.get("doc_hash")
+    chunk_id = doc.metadata.get("chunk_id")
+    if doc_hash and chunk_id:
+        annotations = get_chunk_highlights(doc_hash, chunk_id)
+        if annotations:
+            return annotations
+    return get_highlight_coordinates(pdf_path, doc.page_content, doc.metadata.get("page_number", 1))
+
+# --- ROBUST HIGHLIGHTER (Fixed for Rectangles) ---
+def get_highlight_coordinates(pdf_path, text_snippet, page_num):
+    """
+    Finds text using a flexible 'Bag of Words' approach.
+    Uses Standard Rectangles (x0, y0) to prevent AttributeErrors.
+    """
+    if not text_snippet: return []
+    # Shared, already open handle (memory-mapped blob): no re-read from disk per click
+    with open_pdf(pdf_path) as doc:
+        # Safety Check
+        if page_num < 1 or page_num > len(doc): return []
+        return _search_page(doc[page_num - 1], text_snippet, page_num)
+
+def _search_page(page, text_snippet, page_num):
+    annotations = []
+
+    # 1. Clean the snippet
+    clean_snippet = re.sub(r'[^\w\s]', '', text_snippet).lower()
+    words = clean_snippet.split()
+
+    # 2. Search Strategy: Try varying lengths of phrases
+    search_terms = []
+    if len(words) >= 15: search_terms.append(" ".join(words[:15]))
+    if len(words) >= 10: search_terms.append(" ".join(words[:10]))
+    if len(words) >= 5:  search_terms.append(" ".join(words[:5]))
+    if len(words) >= 3:  search_terms.append(" ".join(words[:3])) # Last resort
+
+    # Fallback if text is very short
+    if not search_terms:
+        search_terms.append(clean_snippet)
+
+    # 3. Execute Search
+    for term in search_terms:
+        # CRITICAL FIX: Use quads=False to get Rectangles (safer)
+        rects = page.search_for(term, quads=False)
+
+        if rects:
+            for rect in rects:
+                annotations.append({
+                    "page": page_num,
+                    "x": rect.x0,
+                    "y": rect.y0,
+                    "width": rect.width,
+                    "height": rect.height,
+                    "color": "red",
+                    "opacity": 0.5
+                })
+            break # Stop if we found a match
+
+    return annotations
@@ -1,74 +1,338 @@
 import os
-import uuid
-import fitz # PyMuPDF
-import re
+import json
+import hashlib
+import threading
 from langchain_core.documents import Document
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_chroma import Chroma
-from langchain_huggingface import HuggingFaceEmbeddings
+from modules.embeddings import get_embedding_model
+from modules.extraction import plan_tasks, iter_extracted
+from modules.highlights import save_highlight_index, delete_highlight_index, load_highlight_index
+from modules.lexical import get_lexical_index
+from modules.retrieval import fetch_documents
+from modules.vector_store import NumpyVectorStore
+from modules.dedup import DuplicateIndex
+from modules.summaries import build_summaries, delete_summary
+from modules.representatives import delete_clusters
+from modules.telemetry import span, log_event
+from modules.corpora import corpus_path, touch_corpus, documents_in_use, DEFAULT_CORPUS
+from modules.blobs import put_blob, blob_path
+from modules.atomic_io import atomic_write_json
 
+# "chroma" (default) or "numpy": compact memory-mapped exact search, see modules/vector_store.py
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "chroma")
+# Paths of the default corpus; named corpora use the same layout under ./storage/corpora/<id>/
 PERSIST_DIRECTORY = "./storage/chroma_db"
+NUMPY_STORE_DIRECTORY = "./storage/numpy_store"
+# Tracks which PDFs (by content hash) are already embedded and which chunk IDs they own
+MANIFEST_PATH = "./storage/manifest.json"
+# Chunks embedded and upserted together. Bounds memory for very large PDFs.
+INGEST_BATCH_SIZE = 64
 
-def clean_text(text):
+# One Chroma client (or NumPy store) per corpus, so an evicted corpus can be closed before its files are removed
+_clients = {}
+# LangChain wrapper of each Chroma client, built once (concurrent batch workers share it)
+_stores = {}
+_clients_lock = threading.Lock()
+
+def compute_file_hash(data):
+    """SHA-256 of the raw PDF bytes. Identifies a document independent of its file name."""
+    return hashlib.sha256(data).hexdigest()
+
+def unique_name(name, taken):
+    """Different files uploaded under the same name are told apart: report.pdf, report (2).pdf, ..."""
+    stem, ext = os.path.splitext(name)
+    candidate, n = name, 1
+    while candidate in taken:
+        n += 1
+        candidate = f"{stem} ({n}){ext}"
+    return candidate
+
+def make_chunk_id(doc_hash, page_number, offset):
+    """
+    Deterministic chunk ID derived from (document hash, page, character offset).
+    Re-ingesting the same PDF always produces the same IDs, so writes become upserts.
+    """
+    key = f"{doc_hash}:{page_number}:{offset}"
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()[:16]
+
+def load_manifest(corpus_id=None):
+    path = corpus_path(MANIFEST_PATH, corpus_id)
+    if not os.path.exists(path):
+        return {"documents": {}}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def save_manifest(manifest, corpus_id=None):
+    path = corpus_path(MANIFEST_PATH, corpus_id)
+    # Written to a temp file first so a crash never leaves a half-written manifest
+    atomic_write_json(path, manifest, indent=2)
+
+def get_corpus_version(manifest=None, corpus_id=None):
+    """
+    Fingerprint of the ingested document set. Changes whenever a document is
+    added, removed, renamed or modified, which invalidates cached answers.
+    """
+    manifest = manifest or load_manifest(corpus_id)
+    entries = sorted(f"{h}:{entry['source_document']}" for h, entry in manifest["documents"].items())
+    return hashlib.sha256("\n".join(entries).encode("utf-8")).hexdigest()[:16]
+
+def get_indexed_documents(corpus_id=None):
+    """Maps each indexed file name to its content hash (the PDF itself is at blobs.blob_path(hash))."""
+    return {entry["source_document"]: doc_hash for doc_hash, entry in load_manifest(corpus_id)["documents"].items()}
+
+def _upsert_batch(vectorstore, lexical_index, batch):
+    ids = [d.metadata["chunk_id"] for d in batch]
+    if batch:
+        with span("ingest:upsert_batch", chunks=len(batch)):
+            vectorstore.add_documents(documents=batch, ids=ids)
+            lexical_index.add_documents(batch)
+    return ids
+
+def _persist(vectorstore):
+    # Chroma writes through; the NumPy store commits explicitly
+    if isinstance(vectorstore, NumpyVectorStore):
+        vectorstore.persist()
+
+def _record_duplicate_locations(vectorstore, lexical_index, duplicates):
+    """
+    Stores every location of a collapsed chunk on the chunk itself:
+    metadata["locations"] = JSON list of [page_number, start_index], primary location first.
+    Re-upserting is cheap because the embedding cache already has these texts.
+    """
+    if not duplicates:
+        return
+    docs = fetch_documents(vectorstore, list(duplicates))
+    for chunk_id, doc in docs.items():
+        primary = [doc.metadata["page_number"], doc.metadata.get("start_index", 0)]
+        doc.metadata["locations"] = json.dumps([primary] + duplicates[chunk_id])
+        doc.metadata["duplicate_count"] = len(duplicates[chunk_id])
+    _upsert_batch(vectorstore, lexical_index, list(docs.values()))
+
+def _resume_document(f, checkpoint, doc_hash, vectorstore, lexical_index):
     """
-    Minimal cleaning to keep text recognizable by the highlighter.
-    Replaces newlines with spaces to form paragraphs.
+    Restores a document interrupted mid-way from its last checkpoint.
+    Committed chunks are read back from the vector store to rebuild the dedup and BM25 state.
     """
-    # Replace newlines with spaces
-    text = text.replace("\n", " ")
-    # Remove multiple spaces
-    text = re.sub(r'\s+', ' ', text)
-    return text.strip()
-
-def ingest_pdf(uploaded_files):
-    all_docs = []
-    
-    if not os.path.exists("temp_pdf"):
-        os.makedirs("temp_pdf")
-        
+    f["chunk_ids"] = list(checkpoint["chunk_ids"])
+    f["duplicates"] = {k: list(v) for k, v in checkpoint["duplicates"].items()}
+    f["boxes"] = dict(load_highlight_index(doc_hash))
+    docs = fetch_documents(vectorstore, f["chunk_ids"])
+    committed = [docs[c] for c in f["chunk_ids"] if c in docs]
+    for doc in committed:
+        f["dedup"].find_or_add(doc.metadata["chunk_id"], doc.page_content)
+    lexical_index.add_documents(committed)
+
+def ingest_pdf(uploaded_files, workers=None, progress_callback=None, summarize=False, corpus_id=None,
+               document_callback=None):
+    """
+    Incremental ingestion. The manifest maps each PDF's content hash to the chunk IDs it owns:
+    - Unchanged files (same hash, same name) are skipped entirely.
+    - New or changed files are chunked and upserted with deterministic chunk IDs.
+    - Files that are no longer uploaded have their chunks deleted.
+    - A file interrupted mid-way resumes after its last checkpoint (one per page-range task).
+    Extraction and chunking run on a process pool of `workers` (default: INGEST_WORKERS).
+    `progress_callback(pages_done, total_pages, message)` is called as pages are committed.
+    `document_callback(name, error)` is called once per file when it is committed (error=None) or fails.
+    With `summarize=True`, per-document map-reduce summaries are built (and cached by hash) at the end.
+    Everything is scoped to `corpus_id` (default: the shared default corpus); other corpora are untouched.
+    """
+    # Registered up front so eviction never removes a corpus that is being filled
+    touch_corpus(corpus_id)
+
+    manifest = load_manifest(corpus_id)
+    indexed = manifest["documents"]
+    vectorstore = get_vectorstore(corpus_id)
+    # BM25 index kept in sync with Chroma (same chunk IDs)
+    lexical_index = get_lexical_index(corpus_id)
+
+    # 1. HASH THE CURRENT DOCUMENT SET
+    current = {}
     for file in uploaded_files:
-        file_path = os.path.join("temp_pdf", file.name)
-        with open(file_path, "wb") as f:
-            f.write(file.getbuffer())
-            
-        # 1. RAW TEXT EXTRACTION (Page by Page)
-        doc = fitz.open(file_path)
-        for i, page in enumerate(doc):
-            text = page.get_text()
-            cleaned_text = clean_text(text)
-            
-            if cleaned_text:
-                all_docs.append(Document(
-                    page_content=cleaned_text,
-                    metadata={
-                        "source_document": file.name,
-                        "page_number": i + 1 
-                    }
-                ))
-
-    # 2. CHUNKING
-    text_splitter = RecursiveCharacterTextSplitter(
-        chunk_size=1000, 
-        chunk_overlap=200,
-        separators=[".", "!", "?", "\n", " ", ""]
-    )
-    
-    splits = text_splitter.split_documents(all_docs)
-
-    # 3. Add Chunk IDs
-    for split in splits:
-        split.metadata["chunk_id"] = str(uuid.uuid4())[:8]
-
-    # 4. EMBEDDING
-    embedding_model = HuggingFaceEmbeddings(model_name="BAAI/bge-small-en-v1.5")
-    
-    vectorstore = Chroma.from_documents(
-        documents=splits,
-        embedding=embedding_model,
-        persist_directory=PERSIST_DIRECTORY
-    )
+        data = file.getbuffer()
+        doc_hash = compute_file_hash(data)
+        if doc_hash in current:
+            log_event("ingest_duplicate_upload", source_document=file.name, same_as=current[doc_hash]["name"])
+            continue
+
+        # Content-addressed: written once, shared with every corpus holding the same PDF
+        put_blob(data, doc_hash)
+        name = unique_name(file.name, {info["name"] for info in current.values()})
+        if name != file.name:
+            log_event("ingest_name_conflict", source_document=file.name, renamed_to=name)
+        current[doc_hash] = {"name": name, "path": blob_path(doc_hash)}
+
+    # 2. DELETE CHUNKS OF REMOVED OR RENAMED DOCUMENTS
+    # (including interrupted ones that are not uploaded anymore)
+    in_progress = manifest.setdefault("in_progress", {})
+    stale = [(entries, h) for entries in (indexed, in_progress) for h, entry in entries.items()
+             if h not in current or entry["source_document"] != current[h]["name"]]
+    shared = documents_in_use(exclude=corpus_id or DEFAULT_CORPUS) if stale else set()
+    for entries, doc_hash in stale:
+        chunk_ids = entries.pop(doc_hash)["chunk_ids"]
+        if chunk_ids:
+            vectorstore.delete(ids=chunk_ids)
+            lexical_index.delete(chunk_ids)
+        # Highlight indexes and summary caches are keyed by content hash and may be used by another corpus
+        if doc_hash not in shared:
+            delete_highlight_index(doc_hash)
+            delete_summary(doc_hash)
+            delete_clusters(doc_hash)
+        log_event("ingest_removed", doc_hash=doc_hash, chunks=len(chunk_ids))
+
+    # 3. STREAMING PIPELINE: page -> clean -> chunk -> embed in batches -> upsert
+    # Only new or changed files are processed; nothing holds the whole corpus in memory.
+    pending = {h: info for h, info in current.items() if h not in indexed}
+    for doc_hash in current:
+        if doc_hash not in pending:
+            log_event("ingest_unchanged", source_document=current[doc_hash]["name"])
+
+    resume_from = {h: in_progress[h]["pages_done"] for h in pending if h in in_progress}
+    tasks, files = plan_tasks([(h, info["path"]) for h, info in pending.items()], start_pages=resume_from)
+    total_pages = sum(f["pages"] for f in files.values())
+    pages_done = 0
+    for doc_hash, f in files.items():
+        if f["error"]:
+            log_event("ingest_failed", source_document=pending[doc_hash]["name"], error=f["error"])
+            if document_callback:
+                document_callback(pending[doc_hash]["name"], f["error"])
+        f["chunk_ids"], f["batch"], f["boxes"] = [], [], {}
+        f["dedup"], f["duplicates"] = DuplicateIndex(), {}
+        if doc_hash in resume_from and not f["error"]:
+            _resume_document(f, in_progress[doc_hash], doc_hash, vectorstore, lexical_index)
+            pages_done += resume_from[doc_hash]
+            log_event("ingest_resumed", source_document=pending[doc_hash]["name"],
+                      pages_done=resume_from[doc_hash], chunks=len(f["chunk_ids"]))
+    if progress_callback:
+        progress_callback(pages_done, total_pages, "Starting...")
+
+    for (doc_hash, _, start, end), output in iter_extracted(tasks, workers=workers):
+        info, f = pending[doc_hash], files[doc_hash]
+        pages_done += min(end, f["pages"]) - start
+
+        if isinstance(output, Exception) and not f["error"]:
+            # Per-file isolation: roll back what this file already wrote, keep going with the rest.
+            # It is not recorded in the manifest, so the next run retries it.
+            f["error"] = str(output)
+            if f["chunk_ids"]:
+                vectorstore.delete(ids=f["chunk_ids"])
+                lexical_index.delete(f["chunk_ids"])
+            f["chunk_ids"], f["batch"], f["boxes"] = [], [], {}
+            f["dedup"], f["duplicates"] = DuplicateIndex(), {}
+            if in_progress.pop(doc_hash, None):
+                save_manifest(manifest, corpus_id)
+            log_event("ingest_failed", source_document=info["name"], error=str(output))
+            if document_callback:
+                document_callback(info["name"], f["error"])
+        if f["error"]:
+            continue
+
+        # 4. Deterministic Chunk IDs (doc hash, page, offset)
+        for page_number, offset, text, boxes in output:
+            chunk_id = make_chunk_id(doc_hash, page_number, offset)
+            # Chunks with identical text (repeated headers, boilerplate) are not stored again;
+            # their location is attached to the chunk that is already stored.
+            canonical_id = f["dedup"].find_or_add(chunk_id, text)
+            if canonical_id:
+                f["duplicates"].setdefault(canonical_id, []).append([page_number, offset])
+                continue
+            f["boxes"][chunk_id] = [page_number, boxes]
+            f["batch"].append(Document(
+                page_content=text,
+                metadata={
+                    "source_document": info["name"],
+                    "page_number": page_number,
+                    "doc_hash": doc_hash,
+                    "chunk_id": chunk_id,
+                    "start_index": offset
+                }
+            ))
+            # 5. EMBEDDING (Upsert keyed by chunk ID, one bounded batch at a time)
+            if len(f["batch"]) >= INGEST_BATCH_SIZE:
+                f["chunk_ids"] += _upsert_batch(vectorstore, lexical_index, f["batch"])
+                f["batch"] = []
+
+        if end >= f["pages"]:
+            f["chunk_ids"] += _upsert_batch(vectorstore, lexical_index, f["batch"])
+            f["batch"] = []
+            _record_duplicate_locations(vectorstore, lexical_index, f["duplicates"])
+            save_highlight_index(doc_hash, f["boxes"])
+            _persist(vectorstore)
+            lexical_index.save()
+            indexed[doc_hash] = {
+                "source_document": info["name"],
+                "pages": f["pages"],
+                "chunk_ids": f["chunk_ids"]
+            }
+            in_progress.pop(doc_hash, None)
+            # Commit per document so an interrupted run keeps finished files
+            save_manifest(manifest, corpus_id)
+            log_event("ingest_indexed", source_document=info["name"], doc_hash=doc_hash, pages=f["pages"],
+                      chunks=len(f["chunk_ids"]), duplicates=sum(len(v) for v in f["duplicates"].values()))
+            if document_callback:
+                document_callback(info["name"], None)
+        else:
+            # Checkpoint after every page range: an interrupted run resumes from here.
+            # The BM25 index is not saved here; resuming rebuilds it from the committed chunks.
+            f["chunk_ids"] += _upsert_batch(vectorstore, lexical_index, f["batch"])
+            f["batch"] = []
+            # Merged: another corpus may already hold the complete index of the same content
+            save_highlight_index(doc_hash, {**load_highlight_index(doc_hash), **f["boxes"]})
+            _persist(vectorstore)
+            in_progress[doc_hash] = {
+                "source_document": info["name"],
+                "pages": f["pages"],
+                "pages_done": end,
+                "chunk_ids": f["chunk_ids"],
+                "duplicates": f["duplicates"]
+            }
+            save_manifest(manifest, corpus_id)
+
+        if progress_callback:
+            progress_callback(pages_done, total_pages, f"Indexing {info['name']}")
+
+    _persist(vectorstore)
+    save_manifest(manifest, corpus_id)
+    lexical_index.save()
+    touch_corpus(corpus_id, documents=len(indexed))
+
+    # 6. OPTIONAL: precomputed hierarchical summaries for the summarize intent
+    if summarize:
+        if progress_callback:
+            progress_callback(total_pages, total_pages, "Building summaries")
+        build_summaries({h: current[h]["name"] for h in current if h in indexed}, vectorstore)
     return vectorstore
 
-def get_vectorstore():
-    embedding_model = HuggingFaceEmbeddings(model_name="BAAI/bge-small-en-v1.5")
-    return Chroma(persist_directory=PERSIST_DIRECTORY, embedding_function=embedding_model)
\ No newline at end of file
+def get_vectorstore(corpus_id=None, backend=None):
+    """Vector store of one corpus (VECTOR_BACKEND unless `backend` is given), opened once and reused."""
+    # Shared embedder: the model is loaded once per process, not on every question
+    embedding_model = get_embedding_model()
+    corpus_id = corpus_id or DEFAULT_CORPUS
+    backend = backend or VECTOR_BACKEND
+    with span("vectorstore:open", backend=backend):
+        with _clients_lock:
+            if (corpus_id, backend) not in _clients:
+                if backend == "numpy":
+                    _clients[corpus_id, backend] = NumpyVectorStore(corpus_path(NUMPY_STORE_DIRECTORY, corpus_id),
+                                                                    embedding_model)
+                else:
+                    # Imported here: chromadb is one of the slowest imports of the app
+                    import chromadb
+                    from langchain_chroma import Chroma
+                    _clients[corpus_id, backend] = chromadb.PersistentClient(
+                        path=corpus_path(PERSIST_DIRECTORY, corpus_id))
+                    _stores[corpus_id, backend] = Chroma(client=_clients[corpus_id, backend],
+                                                         embedding_function=embedding_model)
+            client = _clients[corpus_id, backend]
+        if backend == "numpy":
+            client.reload_if_changed()
+            return client
+        return _stores[corpus_id, backend]
+
+def close_vectorstore(corpus_id):
+    """Releases the vector stores of a corpus (before its directory is deleted)."""
+    with _clients_lock:
+        clients = [_clients.pop(key) for key in list(_clients) if key[0] == corpus_id]
+        for key in [key for key in _stores if key[0] == corpus_id]:
+            del _stores[key]
+    for client in clients:
+        if not isinstance(client, NumpyVectorStore):
+            client.close()
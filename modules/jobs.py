@@ -0,0 +1,221 @@
+import os
+import json
+import time
+import uuid
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from modules.ingestion import ingest_pdf
+from modules.corpora import evict_idle_corpora
+from modules.telemetry import trace_request, log_event
+from modules.atomic_io import atomic_write_json
+
+# ==========================================
+# CONFIGURATION
+# ==========================================
+# One JSON record per ingestion job (status, progress, per-document errors)
+JOBS_DIR = "./storage/jobs"
+# Ingestion jobs running at once (each one still uses the extraction process pool)
+INGEST_JOB_WORKERS = int(os.getenv("INGEST_JOB_WORKERS", 1))
+# Progress is written to the job record at most this often
+PROGRESS_WRITE_INTERVAL = 0.5
+# Idle corpora are evicted at startup, after every job and at least this often
+EVICTION_INTERVAL_SECONDS = float(os.getenv("EVICTION_INTERVAL_SECONDS", 600))
+ACTIVE_STATUSES = ("queued", "running")
+
+_queue = None
+_queue_lock = threading.Lock()
+_corpus_locks = {}
+_active = {}  # job ID -> corpus ID of queued or running jobs
+_eviction_lock = threading.Lock()
+
+
+class _StoredFile:
+    """An upload already in the blob store, with the `name` / `getbuffer()` interface ingest_pdf expects."""
+
+    def __init__(self, name, path):
+        self.name = name
+        self.path = path
+
+    def getbuffer(self):
+        with open(self.path, "rb") as f:
+            return f.read()
+
+
+# ==========================================
+# JOB RECORDS
+# ==========================================
+def _job_path(job_id):
+    return os.path.join(JOBS_DIR, f"{job_id}.json")
+
+
+def _save_job(job):
+    job["updated"] = time.time()
+    atomic_write_json(_job_path(job["job_id"]), job, indent=2)
+
+
+def get_job(job_id):
+    if not os.path.exists(_job_path(job_id)):
+        return None
+    with open(_job_path(job_id), "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def list_jobs(corpus_id=None):
+    """Job records, newest first (optionally only those of one corpus)."""
+    if not os.path.isdir(JOBS_DIR):
+        return []
+    jobs = [get_job(name[:-len(".json")]) for name in os.listdir(JOBS_DIR) if name.endswith(".json")]
+    jobs = [j for j in jobs if j and (corpus_id is None or j["corpus_id"] == corpus_id)]
+    return sorted(jobs, key=lambda j: j["created"], reverse=True)
+
+
+# ==========================================
+# WORKER
+# ==========================================
+def _corpus_lock(corpus_id):
+    with _queue_lock:
+        return _corpus_locks.setdefault(corpus_id, threading.Lock())
+
+
+def _run_job(job_id):
+    job = get_job(job_id)
+    corpus_id = job["corpus_id"]
+    # Two jobs of the same corpus would race on its manifest: they run one after the other
+    with _corpus_lock(corpus_id):
+        job.update(status="running", message="Starting...", pages_done=0, documents_done=[], errors={})
+        _save_job(job)
+        last_write = [0.0]
+
+        def on_progress(pages_done, total_pages, message):
+            job.update(pages_done=pages_done, total_pages=total_pages, message=message)
+            if time.time() - last_write[0] >= PROGRESS_WRITE_INTERVAL:
+                _save_job(job)
+                last_write[0] = time.time()
+
+        def on_document(name, error):
+            # Written immediately: the UI unlocks a document as soon as it is committed
+            if error:
+                job["errors"][name] = error
+            else:
+                job["documents_done"].append(name)
+            _save_job(job)
+
+        files = [_StoredFile(f["name"], f["path"]) for f in job["files"]]
+        try:
+            with trace_request("ingest", files=len(files), job_id=job_id) as trace:
+                ingest_pdf(files, progress_callback=on_progress, summarize=job["summarize"],
+                           corpus_id=corpus_id, document_callback=on_document)
+            job.update(status="done", message="Done", trace=trace)
+        except Exception as e:
+            job.update(status="failed", message=str(e))
+            log_event("ingest_job_failed", job_id=job_id, corpus_id=corpus_id, error=str(e))
+        _save_job(job)
+
+    with _queue_lock:
+        _active.pop(job_id, None)
+    evict_corpora(keep={corpus_id})
+
+
+# ==========================================
+# EVICTION
+# ==========================================
+def evict_corpora(keep=()):
+    """Drops idle corpora (TTL / disk budget), never those with a queued or running job."""
+    with _queue_lock:
+        keep = set(_active.values()) | set(keep)
+    try:
+        with _eviction_lock:
+            return evict_idle_corpora(keep=keep)
+    except Exception as e:
+        log_event("corpus_eviction_failed", error=str(e))
+        return []
+
+
+def _eviction_loop(stop, interval):
+    # Also runs when no uploads arrive: expired corpora must not stay on disk forever
+    while True:
+        evict_corpora()
+        if stop.wait(interval):
+            return
+
+
+def start_eviction_thread(interval=None, stop=None):
+    """Evicts now and then every `interval` seconds on a daemon thread, until `stop` is set."""
+    thread = threading.Thread(target=_eviction_loop, name="corpus-eviction", daemon=True,
+                              args=(stop or threading.Event(), interval or EVICTION_INTERVAL_SECONDS))
+    thread.start()
+    return thread
+
+
+def _enqueue(job):
+    with _queue_lock:
+        _active[job["job_id"]] = job["corpus_id"]
+    get_job_queue().submit(_run_job, job["job_id"])
+
+
+def resume_interrupted_jobs():
+    """
+    Re-queues jobs that were queued or running when the process stopped.
+    Ingestion resumes from the last committed page range of every unfinished document.
+    """
+    resumed = []
+    for job in list_jobs():
+        if job["status"] in ACTIVE_STATUSES and job["job_id"] not in _active:
+            job.update(status="queued", message="Resuming after interruption")
+            _save_job(job)
+            _enqueue(job)
+            resumed.append(job["job_id"])
+            log_event("ingest_job_resumed", job_id=job["job_id"], corpus_id=job["corpus_id"])
+    return resumed
+
+
+def get_job_queue():
+    """
+    Process-wide ingestion worker pool. Interrupted jobs are picked up when it starts,
+    then the periodic corpus eviction begins (it keeps the corpora of resumed jobs).
+    """
+    global _queue
+    if _queue is None:
+        with _queue_lock:
+            created = _queue is None
+            if created:
+                _queue = ThreadPoolExecutor(max_workers=INGEST_JOB_WORKERS, thread_name_prefix="ingest-job")
+        if created:
+            resume_interrupted_jobs()
+            start_eviction_thread()
+    return _queue
+
+
+def submit_ingestion(files, corpus_id, summarize=False):
+    """
+    Queues the ingestion of `files` ([(name, blob path)], already in the blob store)
+    and returns the job ID. Progress is read back with get_job().
+    """
+    now = time.time()
+    job = {
+        "job_id": uuid.uuid4().hex[:12],
+        "corpus_id": corpus_id,
+        "files": [{"name": name, "path": path} for name, path in files],
+        "summarize": summarize,
+        "status": "queued",
+        "message": "Queued",
+        "pages_done": 0,
+        "total_pages": 0,
+        "documents_done": [],
+        "errors": {},
+        "created": now,
+    }
+    _save_job(job)
+    _enqueue(job)
+    log_event("ingest_job_queued", job_id=job["job_id"], corpus_id=corpus_id, files=len(files))
+    return job["job_id"]
+
+
+def is_active(job):
+    return job is not None and job["status"] in ACTIVE_STATUSES
+
+
+def blobs_in_active_jobs():
+    """Content hashes of the uploads of queued or running jobs (not in any manifest yet)."""
+    return {os.path.basename(f["path"])[:-len(".pdf")]
+            for job in list_jobs() if is_active(job) for f in job["files"]}
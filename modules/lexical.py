@@ -0,0 +1,129 @@
+import os
+import re
+import json
+import math
+import threading
+from collections import Counter
+from modules.corpora import corpus_path, DEFAULT_CORPUS
+from modules.atomic_io import atomic_write_json
+
+# Persisted next to the Chroma directory (inside the corpus directory for named corpora)
+LEXICAL_INDEX_PATH = "./storage/bm25_index.json"
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+# Keeps codes like "INV-2023-001", "4.2.1" or "a/b" together as one token
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:[-./:][a-z0-9]+)*")
+
+_indexes = {}  # corpus_id -> LexicalIndex
+_index_lock = threading.Lock()
+
+
+def tokenize(text):
+    """Lowercased word tokens. Compound codes are indexed whole and also by their parts."""
+    tokens = []
+    for token in TOKEN_PATTERN.findall(text.lower()):
+        tokens.append(token)
+        parts = re.split(r"[-./:]", token)
+        if len(parts) > 1:
+            tokens.extend(p for p in parts if p)
+    return tokens
+
+
+class LexicalIndex:
+    """
+    Compact in-process BM25 index over chunk IDs.
+    Only term frequencies, lengths and the source file are stored; chunk text stays in Chroma.
+    """
+
+    def __init__(self, path=LEXICAL_INDEX_PATH):
+        self.path = path
+        # chunk_id -> [source_document, length, {term: tf}]
+        self.chunks = {}
+        self._postings = None
+        self._mtime = None
+        self._lock = threading.Lock()
+        self.load()
+
+    def load(self):
+        if os.path.exists(self.path):
+            with open(self.path, "r", encoding="utf-8") as f:
+                self.chunks = json.load(f)
+            self._mtime = os.path.getmtime(self.path)
+        self._postings = None
+
+    def reload_if_changed(self):
+        if os.path.exists(self.path) and os.path.getmtime(self.path) != self._mtime:
+            with self._lock:
+                self.load()
+
+    def save(self):
+        with self._lock:
+            atomic_write_json(self.path, self.chunks, separators=(",", ":"))
+            self._mtime = os.path.getmtime(self.path)
+
+    def add_documents(self, docs):
+        with self._lock:
+            for doc in docs:
+                tokens = tokenize(doc.page_content)
+                self.chunks[doc.metadata["chunk_id"]] = [
+                    doc.metadata.get("source_document"), len(tokens), dict(Counter(tokens))
+                ]
+            self._postings = None
+
+    def delete(self, ids):
+        with self._lock:
+            for chunk_id in ids:
+                self.chunks.pop(chunk_id, None)
+            self._postings = None
+
+    def _build_postings(self):
+        postings = {}
+        total_len = 0
+        for chunk_id, (_, length, tf) in self.chunks.items():
+            total_len += length
+            for term, count in tf.items():
+                postings.setdefault(term, []).append((chunk_id, count))
+        self._avg_len = total_len / len(self.chunks) if self.chunks else 0.0
+        self._postings = postings
+
+    def search(self, query, k=10, filter=None):
+        """Returns [(chunk_id, bm25_score), ...] best first. `filter` supports {"source_document": name}."""
+        with self._lock:
+            if self._postings is None:
+                self._build_postings()
+            postings, avg_len, n = self._postings, self._avg_len, len(self.chunks)
+            source = (filter or {}).get("source_document")
+
+            scores = Counter()
+            for term in set(tokenize(query)):
+                matches = postings.get(term)
+                if not matches:
+                    continue
+                idf = math.log(1 + (n - len(matches) + 0.5) / (len(matches) + 0.5))
+                for chunk_id, tf in matches:
+                    entry = self.chunks[chunk_id]
+                    if source and entry[0] != source:
+                        continue
+                    norm = tf + BM25_K1 * (1 - BM25_B + BM25_B * entry[1] / avg_len)
+                    scores[chunk_id] += idf * tf * (BM25_K1 + 1) / norm
+        return scores.most_common(k)
+
+
+def get_lexical_index(corpus_id=None):
+    """Per-corpus index, shared in-process and reloaded when ingestion (possibly in another process) rewrites it."""
+    corpus_id = corpus_id or DEFAULT_CORPUS
+    index = _indexes.get(corpus_id)
+    if index is None:
+        with _index_lock:
+            index = _indexes.get(corpus_id)
+            if index is None:
+                index = _indexes[corpus_id] = LexicalIndex(corpus_path(LEXICAL_INDEX_PATH, corpus_id))
+    else:
+        index.reload_if_changed()
+    return index
+
+
+def drop_lexical_index(corpus_id):
+    with _index_lock:
+        _indexes.pop(corpus_id, None)
@@ -0,0 +1,148 @@
+import os
+import json
+import threading
+import numpy as np
+from langchain_core.documents import Document
+from modules.retrieval import fetch_documents
+from modules.telemetry import span, inc
+from modules.atomic_io import atomic_write_json
+
+# ==========================================
+# CONFIGURATION
+# ==========================================
+# Cluster assignments per document (keyed by content hash, like the highlight indexes)
+REPRESENTATIVE_DIR = "./storage/representatives"
+# Lloyd iterations at most (stops earlier once the assignments are stable)
+KMEANS_MAX_ITERATIONS = 25
+
+_cache_lock = threading.Lock()
+
+
+def _cache_path(doc_hash):
+    return os.path.join(REPRESENTATIVE_DIR, f"{doc_hash}.json")
+
+
+def load_clusters(doc_hash):
+    """{"chunk_ids": [...], "by_k": {k: {"labels", "representatives", "distances"}}} or None."""
+    if not os.path.exists(_cache_path(doc_hash)):
+        return None
+    with open(_cache_path(doc_hash), "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _save_clusters(doc_hash, clusters):
+    atomic_write_json(_cache_path(doc_hash), clusters, separators=(",", ":"))
+
+
+def delete_clusters(doc_hash):
+    if os.path.exists(_cache_path(doc_hash)):
+        os.remove(_cache_path(doc_hash))
+
+
+# ==========================================
+# CLUSTERING
+# ==========================================
+def _normalize(vectors):
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def farthest_points(vectors, k):
+    """
+    Deterministic seeding: starts at the chunk closest to the document's mean, then keeps
+    adding the chunk least similar to everything picked so far. `vectors` are unit length.
+    """
+    picked = [int(np.argmax(vectors @ vectors.mean(axis=0)))]
+    nearest = vectors @ vectors[picked[0]]
+    for _ in range(1, k):
+        picked.append(int(np.argmin(nearest)))
+        nearest = np.maximum(nearest, vectors @ vectors[picked[-1]])
+    return picked
+
+
+def kmeans(vectors, k, max_iterations=KMEANS_MAX_ITERATIONS):
+    """
+    Spherical k-means (cosine) on unit vectors, seeded with farthest_points.
+    Returns (centroids, labels). Empty clusters keep their previous centroid.
+    """
+    centroids = vectors[farthest_points(vectors, k)]
+    labels = None
+    for _ in range(max_iterations):
+        new_labels = np.argmax(vectors @ centroids.T, axis=1)
+        if labels is not None and np.array_equal(new_labels, labels):
+            break
+        labels = new_labels
+        # Cluster sums in one matmul: one-hot (k x n) @ vectors (n x d)
+        one_hot = np.zeros((k, len(vectors)), dtype=vectors.dtype)
+        one_hot[labels, np.arange(len(vectors))] = 1
+        sums = one_hot @ vectors
+        filled = one_hot.sum(axis=1) > 0
+        centroids = np.where(filled[:, None], _normalize(sums), centroids)
+    return centroids, labels
+
+
+def representative_rows(vectors, k):
+    """
+    Clusters a document's chunk vectors into k groups and picks the chunk nearest each centroid.
+    Returns (labels, representative row indices, their cosine distance to the centroid).
+    """
+    vectors = _normalize(np.asarray(vectors, dtype=np.float32))
+    if len(vectors) <= k:
+        return np.arange(len(vectors)), list(range(len(vectors))), [0.0] * len(vectors)
+    centroids, labels = kmeans(vectors, k)
+    similarity = vectors @ centroids.T
+    rows, distances = [], []
+    for cluster in range(k):
+        members = np.flatnonzero(labels == cluster)
+        if len(members):
+            best = members[np.argmax(similarity[members, cluster])]
+            rows.append(int(best))
+            distances.append(float(1 - similarity[best, cluster]))
+    return labels, rows, distances
+
+
+# ==========================================
+# REPRESENTATIVE CHUNKS
+# ==========================================
+def representative_chunks(vectorstore, doc_hash, k):
+    """
+    Up to `k` chunks that together cover a document (one per embedding cluster), in page order.
+    The stored embeddings are loaded in one batch; assignments are cached per content hash and k,
+    so later requests only fetch the chosen chunks. metadata["score"] is the distance to the centroid.
+    """
+    key = str(k)
+    clusters = load_clusters(doc_hash)
+    cached = clusters is not None and key in clusters["by_k"]
+    inc("pdf_chat_cache_total", cache="representatives", result="hit" if cached else "miss")
+
+    if cached:
+        entry = clusters["by_k"][key]
+        chunk_ids = [clusters["chunk_ids"][row] for row in entry["representatives"]]
+        docs_by_id = fetch_documents(vectorstore, chunk_ids)
+        docs = [docs_by_id[c] for c in chunk_ids if c in docs_by_id]
+        distances = [d for c, d in zip(chunk_ids, entry["distances"]) if c in docs_by_id]
+    else:
+        with span("retrieval:representatives") as s:
+            data = vectorstore.get(where={"doc_hash": doc_hash},
+                                   include=["documents", "metadatas", "embeddings"])
+            if not data["ids"]:
+                return []
+            # Sorted by chunk ID so cached row numbers do not depend on the store's order
+            order = sorted(range(len(data["ids"])), key=lambda i: data["ids"][i])
+            chunk_ids = [data["ids"][i] for i in order]
+            labels, rows, distances = representative_rows(np.asarray(data["embeddings"])[order], k)
+            s.set(chunks=len(chunk_ids), clusters=len(rows))
+        docs = [Document(page_content=data["documents"][order[r]], metadata=data["metadatas"][order[r]] or {})
+                for r in rows]
+        with _cache_lock:
+            clusters = load_clusters(doc_hash)
+            if clusters is None or clusters["chunk_ids"] != chunk_ids:
+                # New document, or its stored chunks changed since the cache was written
+                clusters = {"chunk_ids": chunk_ids, "by_k": {}}
+            clusters["by_k"][key] = {"labels": [int(label) for label in labels],
+                                     "representatives": rows, "distances": distances}
+            _save_clusters(doc_hash, clusters)
+
+    for doc, distance in zip(docs, distances):
+        doc.metadata["score"] = f"{distance:.4f}"
+    return sorted(docs, key=lambda d: (d.metadata.get("page_number", 0), d.metadata.get("start_index", 0)))
@@ -0,0 +1,105 @@
+import re
+import asyncio
+from langchain_core.documents import Document
+from modules.lexical import get_lexical_index
+from modules.telemetry import log_event
+
+# Reciprocal-rank fusion constant (standard value from the RRF paper)
+RRF_K = 60
+# Each retriever contributes this many candidates per requested result
+CANDIDATE_MULTIPLIER = 2
+
+# Invoice numbers, clause IDs, part codes, quoted phrases: exact-term lookups
+EXACT_TERM_PATTERN = re.compile(
+    r'"[^"]+"'                             # "quoted phrase"
+    r"|\b[A-Za-z]*\d+[A-Za-z\d]*(?:[-./:][A-Za-z\d]+)+\b"  # INV-2023-001, 4.2.1, 12/05
+    r"|\b[A-Z]{2,}[-_]?\d+[A-Za-z\d]*\b"   # PO12345, SKU-99A
+    r"|\b\d{4,}\b"                         # long numbers
+)
+
+
+def looks_like_exact_lookup(question):
+    return bool(EXACT_TERM_PATTERN.search(question))
+
+
+def fetch_documents(vectorstore, chunk_ids):
+    """Loads chunks by ID from the vector store. Returns {chunk_id: Document}; unknown IDs are left out."""
+    if not chunk_ids:
+        return {}
+    data = vectorstore.get(ids=list(chunk_ids), include=["documents", "metadatas"])
+    return {
+        chunk_id: Document(page_content=text, metadata=metadata or {})
+        for chunk_id, text, metadata in zip(data["ids"], data["documents"], data["metadatas"])
+    }
+
+
+def lexical_search(vectorstore, question, k=10, filter=None, index=None):
+    """BM25 only. Never embeds the question."""
+    index = index or get_lexical_index()
+    hits = index.search(question, k=k, filter=filter)
+    if not hits:
+        return []
+    docs = fetch_documents(vectorstore, [chunk_id for chunk_id, _ in hits])
+    top = hits[0][1]
+    # Scores are reported as distances (lower = better) like Chroma's, so the UI bar still works
+    return [(docs[chunk_id], 1.0 - score / top) for chunk_id, score in hits if chunk_id in docs]
+
+
+def reciprocal_rank_fusion(ranked_lists, k=RRF_K):
+    """Fuses lists of chunk IDs. Returns [(chunk_id, fused_score), ...] best first."""
+    fused = {}
+    for ranked in ranked_lists:
+        for rank, chunk_id in enumerate(ranked):
+            fused[chunk_id] = fused.get(chunk_id, 0.0) + 1.0 / (k + rank + 1)
+    return sorted(fused.items(), key=lambda item: item[1], reverse=True)
+
+
+def hybrid_search(vectorstore, question, k=10, filter=None, index=None, mode="auto"):
+    """
+    Dense + BM25 retrieval merged with reciprocal-rank fusion.
+    - mode="auto": exact-term questions (codes, IDs, quoted text) take the lexical fast path
+      when BM25 finds something, skipping the query embedding entirely.
+    - mode="dense" / "lexical" / "hybrid" force one strategy (used by the benchmark).
+    Returns [(Document, score)] where score behaves like a distance (lower = better).
+    """
+    index = index or get_lexical_index()
+
+    if mode == "dense":
+        return vectorstore.similarity_search_with_score(question, k=k, filter=filter)
+    if mode == "lexical" or (mode == "auto" and looks_like_exact_lookup(question)):
+        results = lexical_search(vectorstore, question, k=k, filter=filter, index=index)
+        if results or mode == "lexical":
+            log_event("lexical_fast_path", hits=len(results))
+            return results
+
+    n_candidates = k * CANDIDATE_MULTIPLIER
+    dense = vectorstore.similarity_search_with_score(question, k=n_candidates, filter=filter)
+    lexical = index.search(question, k=n_candidates, filter=filter)
+    return _fuse(vectorstore, dense, lexical, k)
+
+
+async def ahybrid_search(vectorstore, question, k=10, filter=None, index=None, mode="auto"):
+    """Async hybrid_search: in hybrid mode the dense and BM25 searches run concurrently."""
+    index = index or get_lexical_index()
+    if mode in ("dense", "lexical") or (mode == "auto" and looks_like_exact_lookup(question)):
+        return await asyncio.to_thread(hybrid_search, vectorstore, question, k, filter, index, mode)
+
+    n_candidates = k * CANDIDATE_MULTIPLIER
+    dense, lexical = await asyncio.gather(
+        asyncio.to_thread(vectorstore.similarity_search_with_score, question, k=n_candidates, filter=filter),
+        asyncio.to_thread(index.search, question, k=n_candidates, filter=filter),
+    )
+    return await asyncio.to_thread(_fuse, vectorstore, dense, lexical, k)
+
+
+def _fuse(vectorstore, dense, lexical, k):
+    docs = {d.metadata.get("chunk_id"): d for d, _ in dense}
+    fused = reciprocal_rank_fusion([
+        [d.metadata.get("chunk_id") for d, _ in dense],
+        [chunk_id for chunk_id, _ in lexical],
+    ])[:k]
+    docs.update(fetch_documents(vectorstore, [c for c, _ in fused if c not in docs]))
+
+    # Normalize against the best possible fused score (rank 1 in both lists)
+    best_possible = 2.0 / (RRF_K + 1)
+    return [(docs[chunk_id], 1.0 - score / best_possible) for chunk_id, score in fused if chunk_id in docs]
@@ -0,0 +1,217 @@
+import os
+import re
+import asyncio
+import threading
+from collections import OrderedDict
+import numpy as np
+from modules.embeddings import get_embedding_model
+from modules.telemetry import log_event, inc
+
+# ==========================================
+# CONFIGURATION
+# ==========================================
+# Below this confidence the planner falls back to the LLM classifier
+ROUTER_CONFIDENCE_THRESHOLD = float(os.getenv("ROUTER_CONFIDENCE_THRESHOLD", 0.6))
+# Softmax temperature applied to centroid cosine similarities
+ROUTER_TEMPERATURE = 0.05
+# Decisions remembered per normalized question
+ROUTER_CACHE_SIZE = 1024
+
+INTENTS = ["summarize", "reason", "rag"]
+
+# Keyword/regex rules. A question matching rules of exactly one intent is routed without embeddings.
+KEYWORD_RULES = {
+    "summarize": [
+        r"\bsummar(y|ize|ise|ies|izing|ising)\b", r"\boverview\b", r"\btl;?dr\b",
+        r"\bkey (points|takeaways|findings)\b", r"\bgist\b", r"\bwhat (is|are) (this|these|the) (document|file|pdf)s? about\b"
+    ],
+    "reason": [
+        r"\bcompar(e|es|ed|ing|ison)\b", r"\bdifferen(ce|ces|t)\b", r"\bsimilarit(y|ies)\b", r"\btimeline\b",
+        r"\bversus\b", r"\bvs\.?\b", r"\bchronolog", r"\bcontrast\b", r"\b(why|analy[sz]e|evaluate|implications?)\b",
+        r"\b(better|worse|higher|lower|cheaper|larger|smaller) than\b"
+    ],
+    "rag": [
+        r"^(what|who|when|where|which) (is|are|was|were|does|did)\b", r"^how (much|many|long|old)\b",
+        r"\b(find|look ?up|locate|quote|cite)\b", r"\b(number|amount|date|name|id|code)\b"
+    ],
+}
+
+# Labelled examples used to build one embedding centroid per intent
+INTENT_EXAMPLES = {
+    "summarize": [
+        "Summarize the document", "Give me an overview of all the files", "What are the key points of the report?",
+        "Summarize the invoice", "TL;DR of these PDFs", "What is this document about?",
+    ],
+    "reason": [
+        "Compare document A and document B", "What are the differences between the two contracts?",
+        "Create a timeline of the events", "Which supplier is cheaper?", "Analyze the risks across both reports",
+        "How did revenue change from 2022 to 2023?",
+    ],
+    "rag": [
+        "What is the invoice number?", "Who signed the agreement?", "When is the payment due?",
+        "What is the total amount?", "Find the clause about termination", "What does section 4.2 say?",
+    ],
+}
+
+_centroids = None
+_lock = threading.Lock()
+_cache = OrderedDict()
+_stats = {"total": 0, "cache_hits": 0, "rule": 0, "centroid": 0, "llm_fallback": 0, "fallback_agreements": 0}
+
+
+def normalize_question(question):
+    question = question.lower().strip()
+    question = re.sub(r"\s+", " ", question)
+    return question.strip(" ?!.")
+
+
+def _get_centroids():
+    global _centroids
+    if _centroids is None:
+        embedder = get_embedding_model()
+        centroids = []
+        for intent in INTENTS:
+            vectors = np.asarray(embedder.embed_documents(INTENT_EXAMPLES[intent]), dtype=np.float32)
+            centroid = vectors.mean(axis=0)
+            centroids.append(centroid / np.linalg.norm(centroid))
+        _centroids = np.stack(centroids)
+    return _centroids
+
+
+def _rule_matches(normalized):
+    return [intent for intent in INTENTS
+            if any(re.search(pattern, normalized) for pattern in KEYWORD_RULES[intent])]
+
+
+def rule_intent(question):
+    """Intent decided by the keyword rules alone, or None when they are not decisive."""
+    matched = _rule_matches(normalize_question(question))
+    if len(matched) == 1 and matched[0] != "rag":
+        return matched[0]
+    return None
+
+
+def classify_local(question):
+    """
+    Local intent classifier: regex rules first, then nearest-centroid over bge embeddings.
+    Returns (intent, confidence, method).
+    """
+    normalized = normalize_question(question)
+
+    # 1. RULES: an unambiguous keyword hit decides immediately
+    matched = _rule_matches(normalized)
+    if len(matched) == 1 and matched[0] != "rag":
+        return matched[0], 0.95, "rule"
+
+    # 2. NEAREST CENTROID: softmax over cosine similarities
+    query = np.asarray(get_embedding_model().embed_query(question), dtype=np.float32)
+    query = query / np.linalg.norm(query)
+    sims = _get_centroids() @ query
+    probs = np.exp((sims - sims.max()) / ROUTER_TEMPERATURE)
+    probs = probs / probs.sum()
+
+    # Rule hits that were ambiguous still nudge the centroid decision
+    for intent in matched:
+        probs[INTENTS.index(intent)] += 0.15
+    probs = probs / probs.sum()
+
+    best = int(np.argmax(probs))
+    return INTENTS[best], float(probs[best]), "centroid"
+
+
+def _cached_intent(key):
+    with _lock:
+        _stats["total"] += 1
+        if key in _cache:
+            _cache.move_to_end(key)
+            _stats["cache_hits"] += 1
+            inc("pdf_chat_cache_total", cache="router", result="hit")
+            return _cache[key]
+    inc("pdf_chat_cache_total", cache="router", result="miss")
+    return None
+
+
+def _remember(key, intent, local_intent, confidence, method):
+    with _lock:
+        if method == "llm":
+            _stats["llm_fallback"] += 1
+            # Agreement with the LLM on uncertain questions approximates local accuracy
+            if intent == local_intent:
+                _stats["fallback_agreements"] += 1
+        else:
+            _stats[method] += 1
+        _cache[key] = intent
+        if len(_cache) > ROUTER_CACHE_SIZE:
+            _cache.popitem(last=False)
+    inc("pdf_chat_route_total", intent=intent, method=method)
+    log_event("route", intent=intent, method=method, confidence=round(confidence, 3))
+
+
+def route_intent(question, llm_fallback, threshold=None):
+    """
+    Picks the intent for a question.
+    Uses the local classifier when it is confident enough, otherwise calls
+    `llm_fallback(question)`. Decisions are cached per normalized question.
+    """
+    threshold = ROUTER_CONFIDENCE_THRESHOLD if threshold is None else threshold
+    key = normalize_question(question)
+    cached = _cached_intent(key)
+    if cached:
+        return cached
+
+    local_intent, confidence, method = classify_local(question)
+    intent = local_intent
+    if confidence < threshold:
+        intent, method = llm_fallback(question), "llm"
+    _remember(key, intent, local_intent, confidence, method)
+    return intent
+
+
+async def aroute_intent(question, llm_fallback, threshold=None):
+    """Async route_intent: the local classifier runs on a worker thread, `llm_fallback` is awaited."""
+    threshold = ROUTER_CONFIDENCE_THRESHOLD if threshold is None else threshold
+    key = normalize_question(question)
+    cached = _cached_intent(key)
+    if cached:
+        return cached
+
+    local_intent, confidence, method = await asyncio.to_thread(classify_local, question)
+    intent = local_intent
+    if confidence < threshold:
+        intent, method = await llm_fallback(question), "llm"
+    _remember(key, intent, local_intent, confidence, method)
+    return intent
+
+
+def get_router_stats():
+    """Counters plus derived rates, for tuning ROUTER_CONFIDENCE_THRESHOLD."""
+    with _lock:
+        stats = dict(_stats)
+    decided = stats["total"] - stats["cache_hits"]
+    stats["fallback_rate"] = stats["llm_fallback"] / decided if decided else 0.0
+    stats["fallback_agreement_rate"] = (stats["fallback_agreements"] / stats["llm_fallback"]
+                                        if stats["llm_fallback"] else None)
+    return stats
+
+
+def evaluate_router(labelled, threshold=None):
+    """
+    Offline evaluation on [(question, intent), ...] without calling the LLM.
+    Reports local accuracy overall, accuracy on the questions the local path would keep,
+    and the share that would be sent to the LLM at the given threshold.
+    """
+    threshold = ROUTER_CONFIDENCE_THRESHOLD if threshold is None else threshold
+    correct = kept = kept_correct = 0
+    for question, expected in labelled:
+        intent, confidence, _ = classify_local(question)
+        correct += intent == expected
+        if confidence >= threshold:
+            kept += 1
+            kept_correct += intent == expected
+    total = len(labelled)
+    return {
+        "threshold": threshold,
+        "accuracy": correct / total if total else None,
+        "confident_accuracy": kept_correct / kept if kept else None,
+        "fallback_rate": (total - kept) / total if total else None,
+    }
@@ -0,0 +1,49 @@
+import re
+import time
+import hashlib
+from typing import Any, Iterator, List, Optional
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+
+class StubChatModel(BaseChatModel):
+    """
+    Deterministic local stand-in for ChatGoogleGenerativeAI (tests, benchmarks, offline runs).
+    The reply is built from the prompt itself: a short digest of the words after the last
+    "Context" marker plus a stable hash, so identical prompts always give identical answers.
+    Supports streaming (word by word) and an optional fixed latency to mimic a real model.
+    """
+
+    latency_seconds: float = 0.0
+    max_words: int = 40
+
+    @property
+    def _llm_type(self) -> str:
+        return "stub-chat-model"
+
+    def _reply(self, messages: List[BaseMessage]) -> str:
+        prompt = "\n".join(str(m.content) for m in messages)
+        # Intent classification prompts get a valid label so the graph routes normally
+        if "Classify user intent" in prompt:
+            return "rag"
+        body = re.split(r"Context[^\n]*:", prompt)[-1]
+        words = body.split()[:self.max_words]
+        digest = hashlib.sha1(prompt.encode("utf-8")).hexdigest()[:8]
+        return f"[stub {digest}] " + " ".join(words)
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        if self.latency_seconds:
+            time.sleep(self.latency_seconds)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=self._reply(messages)))])
+
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                run_manager: Any = None, **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        if self.latency_seconds:
+            time.sleep(self.latency_seconds)
+        for i, word in enumerate(self._reply(messages).split(" ")):
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=word if i == 0 else " " + word))
+            if run_manager:
+                run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+            yield chunk
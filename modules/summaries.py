@@ -0,0 +1,156 @@
+import os
+import json
+from concurrent.futures import ThreadPoolExecutor
+from langchain_core.documents import Document
+from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.rate_limiters import InMemoryRateLimiter
+from modules.context import pack_context, count_tokens
+from modules.telemetry import span, log_event, submit_traced
+from modules.atomic_io import atomic_write_json
+
+# ==========================================
+# CONFIGURATION
+# ==========================================
+# One JSON file per document, keyed by the PDF's content hash. Shared by every corpus that
+# indexes the same content, so no file name is stored: it is looked up in the corpus manifest.
+SUMMARY_DIR = "./storage/summaries"
+# Pages summarized together in the "map" step
+PAGES_PER_GROUP = 5
+# Partial summaries combined per "reduce" call (repeated until one remains)
+REDUCE_FAN_IN = 8
+# Token budget of the text sent for one page group (larger groups are split, never truncated)
+GROUP_TOKEN_BUDGET = 3000
+# Concurrent LLM calls and request rate while building summaries
+SUMMARY_MAX_CONCURRENCY = int(os.getenv("SUMMARY_MAX_CONCURRENCY", 4))
+SUMMARY_REQUESTS_PER_SECOND = float(os.getenv("SUMMARY_REQUESTS_PER_SECOND", 1.0))
+
+MAP_PROMPT = ChatPromptTemplate.from_template(
+    """Summarize pages {pages} of the document.
+    Keep names, numbers, dates and obligations. Use concise bullet points.
+
+    Context:
+    {context}
+    """
+)
+REDUCE_PROMPT = ChatPromptTemplate.from_template(
+    """Combine these partial summaries of one document into one coherent summary.
+    Keep the most important facts, figures and dates. Use short headings and bullet points.
+
+    Context:
+    {context}
+    """
+)
+
+
+def _summary_path(doc_hash):
+    return os.path.join(SUMMARY_DIR, f"{doc_hash}.json")
+
+
+def load_summary(doc_hash):
+    """Cached summary of a document, or None if it was never built."""
+    if not os.path.exists(_summary_path(doc_hash)):
+        return None
+    with open(_summary_path(doc_hash), "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_summary(doc_hash, summary):
+    atomic_write_json(_summary_path(doc_hash), summary, indent=2)
+
+
+def delete_summary(doc_hash):
+    if os.path.exists(_summary_path(doc_hash)):
+        os.remove(_summary_path(doc_hash))
+
+
+def _load_page_groups(vectorstore, doc_hash):
+    """Stored chunks of one document, ordered by page/offset and grouped by PAGES_PER_GROUP pages."""
+    data = vectorstore.get(where={"doc_hash": doc_hash}, include=["documents", "metadatas"])
+    chunks = [Document(page_content=text, metadata=metadata)
+              for text, metadata in zip(data["documents"], data["metadatas"])]
+    chunks.sort(key=lambda d: (d.metadata["page_number"], d.metadata.get("start_index", 0)))
+
+    groups = {}
+    for chunk in chunks:
+        groups.setdefault((chunk.metadata["page_number"] - 1) // PAGES_PER_GROUP, []).append(chunk)
+    return [groups[k] for k in sorted(groups)]
+
+
+def _split_to_budget(group, budget):
+    """Splits a page group into consecutive runs of chunks that each fit into `budget` tokens."""
+    parts, current, used = [], [], 0
+    for chunk in group:
+        cost = count_tokens(chunk.page_content)
+        if current and used + cost > budget:
+            parts.append(current)
+            current, used = [], 0
+        current.append(chunk)
+        used += cost
+    if current:
+        parts.append(current)
+    return parts
+
+
+def build_document_summary(doc_hash, vectorstore, llm, limiter, pool):
+    """Map-reduce summary of one document: page groups in parallel, then hierarchical reduce."""
+    chain = MAP_PROMPT | llm | StrOutputParser()
+    reduce_chain = REDUCE_PROMPT | llm | StrOutputParser()
+
+    def call(chain, inputs):
+        limiter.acquire(blocking=True)
+        with span("llm:summary"):
+            return chain.invoke(inputs)
+
+    # 1. MAP: one call per page group (overlap between neighbouring chunks is trimmed).
+    # Dense page groups are split so no chunk is cut off by the token budget.
+    jobs = []
+    for group in [part for page_group in _load_page_groups(vectorstore, doc_hash)
+                  for part in _split_to_budget(page_group, GROUP_TOKEN_BUDGET)]:
+        context, _, _ = pack_context(group, formatter=lambda d, text: text, budget=GROUP_TOKEN_BUDGET,
+                                     order_by_score=False, separator=" ")
+        pages = f"{group[0].metadata['page_number']}-{group[-1].metadata['page_number']}"
+        jobs.append((pages, submit_traced(pool, call, chain, {"pages": pages, "context": context})))
+    groups = [{"pages": pages, "summary": future.result()} for pages, future in jobs]
+
+    # 2. REDUCE: combine partial summaries REDUCE_FAN_IN at a time until one is left
+    level = [g["summary"] for g in groups]
+    while len(level) > 1:
+        futures = [submit_traced(pool, call, reduce_chain, {"context": "\n\n".join(level[i:i + REDUCE_FAN_IN])})
+                   for i in range(0, len(level), REDUCE_FAN_IN)]
+        level = [f.result() for f in futures]
+
+    return {
+        "doc_hash": doc_hash,
+        "groups": groups,
+        "summary": level[0] if level else ""
+    }
+
+
+def build_summaries(documents, vectorstore, llm=None, max_concurrency=None, requests_per_second=None):
+    """
+    Optional ingestion stage. `documents` maps doc_hash -> file name.
+    Documents that already have a cached summary (same content hash) are skipped.
+    Pass a StubChatModel as `llm` to build summaries without calling Gemini.
+    """
+    if llm is None:
+        from modules.agents import get_llm
+        llm = get_llm()
+    limiter = InMemoryRateLimiter(
+        requests_per_second=requests_per_second or SUMMARY_REQUESTS_PER_SECOND,
+        check_every_n_seconds=0.05,
+        max_bucket_size=max_concurrency or SUMMARY_MAX_CONCURRENCY
+    )
+
+    built = 0
+    with ThreadPoolExecutor(max_workers=max_concurrency or SUMMARY_MAX_CONCURRENCY) as pool:
+        for doc_hash, name in documents.items():
+            if load_summary(doc_hash):
+                continue
+            try:
+                save_summary(doc_hash, build_document_summary(doc_hash, vectorstore, llm, limiter, pool))
+                built += 1
+                log_event("summary_built", source_document=name, doc_hash=doc_hash)
+            except Exception as e:
+                log_event("summary_failed", source_document=name, doc_hash=doc_hash, error=str(e))
+    return built
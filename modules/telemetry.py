@@ -0,0 +1,238 @@
+import os
+import json
+import time
+import uuid
+import inspect
+import logging
+import threading
+import contextvars
+from contextlib import contextmanager
+from functools import wraps
+from logging.handlers import RotatingFileHandler
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from modules.atomic_io import atomic_write
+
+# ==========================================
+# CONFIGURATION
+# ==========================================
+# Structured events, one JSON object per line, rotated at 5 MB (3 backups kept)
+EVENT_LOG_PATH = "./storage/logs/events.jsonl"
+EVENT_LOG_MAX_BYTES = 5 * 1024 * 1024
+EVENT_LOG_BACKUPS = 3
+# Prometheus text exposition, rewritten after every traced request
+METRICS_PATH = "./storage/metrics.prom"
+# Set METRICS_PORT to also serve /metrics over HTTP
+METRICS_PORT = os.getenv("METRICS_PORT")
+# Latency histogram buckets (seconds)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+_logger = None
+_logger_lock = threading.Lock()
+_metrics_lock = threading.Lock()
+_counters = {}    # (name, labels) -> value
+_histograms = {}  # (name, labels) -> [bucket counts..., sum, count]
+_current_trace = contextvars.ContextVar("current_trace", default=None)
+_server = None
+
+
+def _get_logger():
+    global _logger
+    if _logger is None:
+        with _logger_lock:
+            if _logger is None:
+                os.makedirs(os.path.dirname(EVENT_LOG_PATH), exist_ok=True)
+                logger = logging.getLogger("pdf_chat.events")
+                logger.setLevel(logging.INFO)
+                logger.propagate = False
+                handler = RotatingFileHandler(EVENT_LOG_PATH, maxBytes=EVENT_LOG_MAX_BYTES,
+                                              backupCount=EVENT_LOG_BACKUPS, encoding="utf-8")
+                handler.setFormatter(logging.Formatter("%(message)s"))
+                logger.addHandler(handler)
+                _logger = logger
+    return _logger
+
+
+def log_event(event, **fields):
+    """Writes one structured event (tagged with the current trace ID, if any)."""
+    trace = _current_trace.get()
+    record = {"ts": time.time(), "event": event}
+    if trace is not None:
+        record["trace_id"] = trace["trace_id"]
+    record.update(fields)
+    _get_logger().info(json.dumps(record, default=str))
+
+
+# ==========================================
+# METRICS (Prometheus text format)
+# ==========================================
+def _reset_after_fork():
+    # A lock held by another thread at fork time would never be released in the child;
+    # the child also starts with its own counters instead of a copy of the parent's
+    global _logger_lock, _metrics_lock, _counters, _histograms
+    _logger_lock, _metrics_lock = threading.Lock(), threading.Lock()
+    _counters, _histograms = {}, {}
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def _labels_key(labels):
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def inc(name, value=1, **labels):
+    key = (name, _labels_key(labels))
+    with _metrics_lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def observe(name, seconds, **labels):
+    key = (name, _labels_key(labels))
+    with _metrics_lock:
+        hist = _histograms.setdefault(key, [0] * len(LATENCY_BUCKETS) + [0.0, 0])
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if seconds <= bound:
+                hist[i] += 1
+        hist[-2] += seconds
+        hist[-1] += 1
+
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in pairs) + "}"
+
+
+def render_prometheus():
+    lines = []
+    with _metrics_lock:
+        for name in sorted({n for n, _ in _counters}):
+            lines.append(f"# TYPE {name} counter")
+            for (n, labels), value in sorted(_counters.items()):
+                if n == name:
+                    lines.append(f"{name}{_format_labels(labels)} {value}")
+        for name in sorted({n for n, _ in _histograms}):
+            lines.append(f"# TYPE {name} histogram")
+            for (n, labels), hist in sorted(_histograms.items()):
+                if n != name:
+                    continue
+                for bound, count in zip(LATENCY_BUCKETS, hist):
+                    lines.append(f"{name}_bucket{_format_labels(labels, [('le', bound)])} {count}")
+                lines.append(f"{name}_bucket{_format_labels(labels, [('le', '+Inf')])} {hist[-1]}")
+                lines.append(f"{name}_sum{_format_labels(labels)} {hist[-2]}")
+                lines.append(f"{name}_count{_format_labels(labels)} {hist[-1]}")
+    return "\n".join(lines) + "\n"
+
+
+def write_prometheus(path=METRICS_PATH):
+    # Concurrent requests finish (and write) at the same time: each write gets its own temp file
+    atomic_write(path, render_prometheus())
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        body = render_prometheus().encode("utf-8")
+        self.send_response(200 if self.path == "/metrics" else 404)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.end_headers()
+        if self.path == "/metrics":
+            self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def start_metrics_server(port=None):
+    """Serves /metrics on a daemon thread (once per process). No-op without a port."""
+    global _server
+    port = port or METRICS_PORT
+    if not port or _server is not None:
+        return
+    _server = ThreadingHTTPServer(("0.0.0.0", int(port)), _MetricsHandler)
+    threading.Thread(target=_server.serve_forever, daemon=True).start()
+
+
+# ==========================================
+# TRACING
+# ==========================================
+class Span:
+    def __init__(self, name, attrs):
+        self.name = name
+        self.attrs = dict(attrs)
+        self.start = time.perf_counter()
+        self.duration_ms = None
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+
+@contextmanager
+def span(name, **attrs):
+    """
+    Times a block (a graph node, an LLM call, a search...). Records a histogram sample,
+    appends the span to the current trace and writes a structured event.
+    Extra attributes (token counts, hit/miss...) can be added with `s.set(...)`.
+    """
+    s = Span(name, attrs)
+    status = "ok"
+    try:
+        yield s
+    except Exception as e:
+        status = "error"
+        s.set(error=str(e))
+        raise
+    finally:
+        s.duration_ms = (time.perf_counter() - s.start) * 1000
+        observe("pdf_chat_span_seconds", s.duration_ms / 1000, span=name)
+        trace = _current_trace.get()
+        if trace is not None:
+            trace["spans"].append({"name": name, "ms": round(s.duration_ms, 2), **s.attrs})
+        log_event("span", name=name, ms=round(s.duration_ms, 2), status=status, **s.attrs)
+
+
+def trace_node(name):
+    """Decorator for LangGraph nodes (sync or async): each call becomes a `node:<name>` span."""
+    def decorator(fn):
+        if inspect.iscoroutinefunction(fn):
+            @wraps(fn)
+            async def async_wrapper(state):
+                with span(f"node:{name}"):
+                    return await fn(state)
+            return async_wrapper
+
+        @wraps(fn)
+        def wrapper(state):
+            with span(f"node:{name}"):
+                return fn(state)
+        return wrapper
+    return decorator
+
+
+def submit_traced(pool, fn, *args, **kwargs):
+    """
+    pool.submit(fn, ...) in a copy of the caller's context: worker threads do not inherit
+    contextvars, so without it their spans would be missing from the current trace.
+    """
+    return pool.submit(contextvars.copy_context().run, fn, *args, **kwargs)
+
+
+@contextmanager
+def trace_request(kind, **attrs):
+    """
+    Groups all spans of one request. Yields the trace dict:
+    {"trace_id", "kind", "spans": [...], "total_ms"} (total_ms set on exit).
+    """
+    trace = {"trace_id": uuid.uuid4().hex[:12], "kind": kind, "spans": [], "total_ms": None}
+    token = _current_trace.set(trace)
+    start = time.perf_counter()
+    try:
+        yield trace
+    finally:
+        trace["total_ms"] = round((time.perf_counter() - start) * 1000, 2)
+        observe("pdf_chat_request_seconds", trace["total_ms"] / 1000, kind=kind)
+        inc("pdf_chat_requests_total", kind=kind)
+        log_event("request", kind=kind, total_ms=trace["total_ms"], **attrs)
+        _current_trace.reset(token)
+        write_prometheus()
@@ -0,0 +1,435 @@
+import os
+import json
+import uuid
+import shutil
+import threading
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.vectorstores import VectorStore
+from modules.atomic_io import atomic_write, atomic_write_json
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process write lock, one writing process at a time
+    fcntl = None
+
+# ==========================================
+# CONFIGURATION
+# ==========================================
+# "float16" (2 bytes/dim) or "int8" (1 byte/dim, per-row scale). Fixed once a store is created.
+NUMPY_STORE_DTYPE = os.getenv("NUMPY_STORE_DTYPE", "float16")
+# Rows scored per matrix product; bounds the float32 working set of one search
+SEARCH_BLOCK_ROWS = 4096
+# Deleted rows are compacted away once they exceed this share of the store (and this count)
+COMPACT_DEAD_RATIO = 0.25
+COMPACT_MIN_DEAD_ROWS = 1024
+# Metadata fields with precomputed row ranges (the filters the agents use)
+RANGE_KEYS = ("source_document", "doc_hash")
+
+
+class NumpyVectorStore(VectorStore):
+    """
+    Compact exact-search vector store for large corpora.
+
+    Layout of `path` (all row files are append-only; meta.json is the commit point):
+        meta.json                 generation, dim, dtype, committed rows and segments
+        gen-<n>/vectors.bin       unit vectors, float16 or int8 (memory-mapped)
+        gen-<n>/norms.bin         original vector norms (float32)
+        gen-<n>/scales.bin        int8 dequantization scale per row (1.0 for float16)
+        gen-<n>/spans.bin         [start, end) of each chunk's text in texts.bin
+        gen-<n>/texts.bin         chunk texts, UTF-8
+        gen-<n>/alive.bin         1 byte per row, 0 once deleted
+        gen-<n>/segments/<k>.json chunk IDs and metadata columns of the rows added by one persist()
+        write.lock                held (flock) by the one instance writing, from its first write to persist()
+
+    Scores are squared L2 distances like Chroma's, so lower is better and the UI bar still works.
+    Writes become durable on persist(); ingestion calls it when it commits a document.
+    Other processes (the app, batch_qa) read the rows listed in meta.json and never touch the files;
+    only the lock holder drops rows appended past meta.json (left by a writer that crashed).
+    """
+
+    def __init__(self, path, embedding_function, dtype=NUMPY_STORE_DTYPE):
+        if dtype not in ("float16", "int8"):
+            raise ValueError(f"Unsupported dtype {dtype!r} (use 'float16' or 'int8')")
+        self.path = path
+        self.dtype = dtype
+        self._embedding = embedding_function
+        self._lock = threading.RLock()
+        self._lock_file = None  # Open while this instance holds write.lock
+        self._load()
+
+    @property
+    def embeddings(self):
+        return self._embedding
+
+    # ------------------------------------------
+    # Loading and persistence
+    # ------------------------------------------
+    def _gen_dir(self, generation=None):
+        return os.path.join(self.path, f"gen-{self.generation if generation is None else generation}")
+
+    def _file(self, name, generation=None):
+        return os.path.join(self._gen_dir(generation), name)
+
+    def _read_meta(self):
+        meta_path = os.path.join(self.path, "meta.json")
+        if not os.path.exists(meta_path):
+            return {"generation": 0, "dim": None, "dtype": self.dtype, "rows": 0, "segments": 0}
+        with open(meta_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def _load(self):
+        """Loads the committed state: the first meta["rows"] rows. Files are never modified here."""
+        meta = self._read_meta()
+        self._meta = meta
+        self.generation, self.dim, self.dtype = meta["generation"], meta["dim"], meta["dtype"]
+        self.committed_rows, self.segments = meta["rows"], meta["segments"]
+        os.makedirs(os.path.join(self._gen_dir(), "segments"), exist_ok=True)
+
+        self.ids, self.columns = [], {}
+        for k in range(self.segments):
+            with open(os.path.join(self._gen_dir(), "segments", f"{k:05d}.json"), "r", encoding="utf-8") as f:
+                segment = json.load(f)
+            self._append_columns(segment["ids"], segment["columns"])
+        self._row_of = {chunk_id: row for row, chunk_id in enumerate(self.ids)}
+
+        alive_path = self._file("alive.bin")
+        self.alive = bytearray(b"\x01" * self.committed_rows)
+        if os.path.exists(alive_path):
+            with open(alive_path, "rb") as f:
+                self.alive[:] = f.read()[:self.committed_rows]
+        for chunk_id, row in list(self._row_of.items()):
+            if not self.alive[row]:
+                del self._row_of[chunk_id]
+        self._arrays_cache = None
+        self._ranges = {}
+
+    def _truncate_uncommitted(self):
+        """Drops rows appended after the last commit (a writer crashed mid-document). Lock holder only."""
+        n = self.committed_rows
+        text_end = 0
+        if n:
+            spans = np.fromfile(self._file("spans.bin"), dtype=np.int64, count=2 * n).reshape(n, 2)
+            text_end = int(spans[-1, 1])
+        row_bytes = {"vectors.bin": (self.dim or 0) * np.dtype(self._vector_dtype()).itemsize,
+                     "norms.bin": 4, "scales.bin": 4, "spans.bin": 16}
+        for name, size in row_bytes.items():
+            if os.path.exists(self._file(name)):
+                os.truncate(self._file(name), n * size)
+        if os.path.exists(self._file("texts.bin")):
+            os.truncate(self._file("texts.bin"), text_end)
+
+    def _vector_dtype(self):
+        return np.float16 if self.dtype == "float16" else np.int8
+
+    def _append_columns(self, ids, columns):
+        start = len(self.ids)
+        self.ids.extend(ids)
+        for key in set(self.columns) | set(columns):
+            column = self.columns.setdefault(key, [None] * start)
+            column.extend(columns.get(key, [None] * len(ids)))
+
+    def reload_if_changed(self):
+        """Picks up writes committed by another instance (only while this one is not writing)."""
+        with self._lock:
+            if self._lock_file is None and self._read_meta() != self._meta:
+                self._load()
+
+    def _begin_write(self):
+        """
+        Takes write.lock before the first change of a transaction (persist() releases it).
+        Commits made by other writers in the meantime are loaded first. Call with self._lock held.
+        """
+        if self._lock_file is not None:
+            return
+        self._lock_file = open(os.path.join(self.path, "write.lock"), "ab")
+        if fcntl:
+            fcntl.flock(self._lock_file, fcntl.LOCK_EX)
+        if self._read_meta() != self._meta:
+            self._load()
+        self._truncate_uncommitted()
+
+    def _end_write(self):
+        if self._lock_file is not None:
+            if fcntl:
+                fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+            self._lock_file.close()
+            self._lock_file = None
+
+    def _write_meta(self):
+        self._meta = {"generation": self.generation, "dim": self.dim, "dtype": self.dtype,
+                      "rows": len(self.ids), "segments": self.segments}
+        atomic_write_json(os.path.join(self.path, "meta.json"), self._meta)
+
+    def _write_alive(self, generation=None):
+        atomic_write(self._file("alive.bin", generation), bytes(self.alive))
+
+    def persist(self):
+        """Commits pending rows and deletions and releases the write lock. Compacts when too many rows are deleted."""
+        with self._lock:
+            if self._lock_file is None:
+                return  # Nothing written since the last commit
+            try:
+                self._commit()
+            finally:
+                self._end_write()
+
+    def _commit(self):
+        n = len(self.ids)
+        dead = n - len(self._row_of)
+        if dead >= COMPACT_MIN_DEAD_ROWS and dead / n > COMPACT_DEAD_RATIO:
+            self._compact()
+            return
+        if n > self.committed_rows:
+            segment = {
+                "ids": self.ids[self.committed_rows:],
+                "columns": {key: column[self.committed_rows:] for key, column in self.columns.items()}
+            }
+            atomic_write_json(os.path.join(self._gen_dir(), "segments", f"{self.segments:05d}.json"), segment,
+                              separators=(",", ":"))
+            self.segments += 1
+        self._write_alive()
+        self._write_meta()
+        self.committed_rows = n
+
+    def _compact(self):
+        """Rewrites the live rows into a new generation, then switches meta.json to it."""
+        rows = np.flatnonzero(np.frombuffer(bytes(self.alive), dtype=np.uint8))
+        vectors, norms, scales, spans, texts = self._arrays()
+        new_gen = self.generation + 1
+        os.makedirs(os.path.join(self._gen_dir(new_gen), "segments"), exist_ok=True)
+
+        new_texts = [bytes(texts[start:end]) for start, end in spans[rows]] if len(rows) else []
+        ends = np.cumsum([len(t) for t in new_texts], dtype=np.int64)
+        new_spans = np.stack([ends - [len(t) for t in new_texts], ends], axis=1) if len(rows) else np.zeros((0, 2), np.int64)
+        np.ascontiguousarray(vectors[rows]).tofile(self._file("vectors.bin", new_gen))
+        norms[rows].tofile(self._file("norms.bin", new_gen))
+        scales[rows].tofile(self._file("scales.bin", new_gen))
+        new_spans.astype(np.int64).tofile(self._file("spans.bin", new_gen))
+        with open(self._file("texts.bin", new_gen), "wb") as f:
+            f.write(b"".join(new_texts))
+
+        ids = [self.ids[r] for r in rows]
+        columns = {key: [column[r] for r in rows] for key, column in self.columns.items()}
+        with open(os.path.join(self._gen_dir(new_gen), "segments", "00000.json"), "w", encoding="utf-8") as f:
+            json.dump({"ids": ids, "columns": columns}, f, separators=(",", ":"))
+
+        old_gen = self.generation
+        self.generation, self.segments = new_gen, 1
+        self.ids, self.columns = ids, columns
+        self._row_of = {chunk_id: row for row, chunk_id in enumerate(ids)}
+        self.alive = bytearray(b"\x01" * len(ids))
+        self._write_alive()
+        self._write_meta()
+        self.committed_rows = len(ids)
+        self._arrays_cache = None
+        self._ranges = {}
+        # Open memory maps keep the old files readable until in-flight searches finish
+        shutil.rmtree(self._gen_dir(old_gen), ignore_errors=True)
+
+    # ------------------------------------------
+    # Writes
+    # ------------------------------------------
+    def add_texts(self, texts, metadatas=None, ids=None, **kwargs):
+        """Embeds and appends chunks. Existing IDs are replaced (upsert)."""
+        texts = list(texts)
+        if not texts:
+            return []
+        metadatas = list(metadatas) if metadatas is not None else [{} for _ in texts]
+        ids = list(ids) if ids is not None else [uuid.uuid4().hex for _ in texts]
+        matrix = np.asarray(self._embedding.embed_documents(texts), dtype=np.float32)
+
+        norms = np.linalg.norm(matrix, axis=1).astype(np.float32)
+        units = matrix / np.maximum(norms, 1e-12)[:, None]
+        if self.dtype == "int8":
+            scales = (np.abs(units).max(axis=1) / 127.0).astype(np.float32)
+            codes = np.round(units / np.maximum(scales, 1e-12)[:, None]).astype(np.int8)
+        else:
+            scales = np.ones(len(texts), dtype=np.float32)
+            codes = units.astype(np.float16)
+        encoded = [t.encode("utf-8") for t in texts]
+
+        with self._lock:
+            self._begin_write()
+            if self.dim is None:
+                self.dim = matrix.shape[1]
+            for chunk_id in ids:
+                old = self._row_of.pop(chunk_id, None)
+                if old is not None:
+                    self.alive[old] = 0
+
+            text_start = os.path.getsize(self._file("texts.bin")) if os.path.exists(self._file("texts.bin")) else 0
+            ends = text_start + np.cumsum([len(t) for t in encoded], dtype=np.int64)
+            spans = np.stack([ends - [len(t) for t in encoded], ends], axis=1).astype(np.int64)
+            for name, data in (("vectors.bin", codes), ("norms.bin", norms), ("scales.bin", scales),
+                               ("spans.bin", spans)):
+                with open(self._file(name), "ab") as f:
+                    f.write(np.ascontiguousarray(data).tobytes())
+            with open(self._file("texts.bin"), "ab") as f:
+                f.write(b"".join(encoded))
+
+            start = len(self.ids)
+            keys = {key for m in metadatas for key in m}
+            self._append_columns(ids, {key: [m.get(key) for m in metadatas] for key in keys})
+            for offset, chunk_id in enumerate(ids):
+                self._row_of[chunk_id] = start + offset
+            self.alive.extend(b"\x01" * len(ids))
+            self._arrays_cache = None
+            self._ranges = {}
+        return ids
+
+    def delete(self, ids=None, **kwargs):
+        with self._lock:
+            self._begin_write()
+            for chunk_id in ids or []:
+                row = self._row_of.pop(chunk_id, None)
+                if row is not None:
+                    self.alive[row] = 0
+        return True
+
+    # ------------------------------------------
+    # Reads
+    # ------------------------------------------
+    def _arrays(self):
+        """Memory-mapped (vectors, norms, scales, spans, texts) over all appended rows."""
+        n = len(self.ids)
+        if self._arrays_cache is None or self._arrays_cache[0] != n:
+            if n == 0:
+                empty = (np.zeros((0, self.dim or 0), self._vector_dtype()), np.zeros(0, np.float32),
+                         np.zeros(0, np.float32), np.zeros((0, 2), np.int64), b"")
+                self._arrays_cache = (n, empty)
+            else:
+                spans = np.memmap(self._file("spans.bin"), dtype=np.int64, mode="r", shape=(n, 2))
+                texts_size = int(spans[-1, 1])
+                self._arrays_cache = (n, (
+                    np.memmap(self._file("vectors.bin"), dtype=self._vector_dtype(), mode="r", shape=(n, self.dim)),
+                    np.memmap(self._file("norms.bin"), dtype=np.float32, mode="r", shape=(n,)),
+                    np.memmap(self._file("scales.bin"), dtype=np.float32, mode="r", shape=(n,)),
+                    spans,
+                    np.memmap(self._file("texts.bin"), dtype=np.uint8, mode="r", shape=(texts_size,))
+                    if texts_size else b"",
+                ))
+        return self._arrays_cache[1]
+
+    def _value_ranges(self, key):
+        """value -> [(start, end), ...] row ranges where `key` equals that value."""
+        if key not in self._ranges:
+            ranges = {}
+            column = self.columns.get(key, [])
+            start = 0
+            for row in range(1, len(column) + 1):
+                if row == len(column) or column[row] != column[start]:
+                    ranges.setdefault(column[start], []).append((start, row))
+                    start = row
+            self._ranges[key] = ranges
+        return self._ranges[key]
+
+    def _row_spans(self, where):
+        """Row ranges that can match a Chroma-style equality filter ({"field": value, ...})."""
+        n = len(self.ids)
+        if not where:
+            return [(0, n)]
+        for key, value in where.items():
+            if key.startswith("$") or isinstance(value, dict):
+                raise ValueError(f"Only equality filters are supported, got {where}")
+        if len(where) == 1:
+            (key, value), = where.items()
+            if key in RANGE_KEYS:
+                return self._value_ranges(key).get(value, [])
+        mask = np.ones(n, dtype=bool)
+        for key, value in where.items():
+            column = self.columns.get(key, [None] * n)
+            mask &= np.fromiter((v == value for v in column), dtype=bool, count=n)
+        rows = np.flatnonzero(mask)
+        if not len(rows):
+            return []
+        breaks = np.flatnonzero(np.diff(rows) != 1) + 1
+        return [(int(r[0]), int(r[-1]) + 1) for r in np.split(rows, breaks)]
+
+    def _document(self, row, texts, spans, columns):
+        start, end = spans[row]
+        metadata = {key: column[row] for key, column in columns.items() if column[row] is not None}
+        return Document(page_content=bytes(texts[start:end]).decode("utf-8"), metadata=metadata)
+
+    def _search(self, embedding, k, filter):
+        with self._lock:
+            spans_to_scan = self._row_spans(filter)
+            vectors, norms, scales, spans, texts = self._arrays()
+            alive = np.frombuffer(bytes(self.alive), dtype=np.uint8)
+            # Appends never move rows and compaction swaps in new objects, so this snapshot stays valid
+            columns = self.columns
+
+        query = np.asarray(embedding, dtype=np.float32)
+        query_norm = float(np.linalg.norm(query)) or 1.0
+        unit = query / query_norm
+
+        # Exact top-k by squared L2 distance (as Chroma reports it), per block then over the block winners:
+        # |q - x|^2 = |q|^2 + |x|^2 - 2 |q| |x| cos(q, x)
+        cand_rows, cand_dists = [], []
+        for span_start, span_end in spans_to_scan:
+            for start in range(span_start, span_end, SEARCH_BLOCK_ROWS):
+                end = min(span_end, start + SEARCH_BLOCK_ROWS)
+                cos = (np.asarray(vectors[start:end], dtype=np.float32) @ unit) * scales[start:end]
+                row_norms = norms[start:end]
+                dists = query_norm ** 2 + row_norms ** 2 - 2 * query_norm * row_norms * cos
+                dists[alive[start:end] == 0] = np.inf
+                top = np.argpartition(dists, k)[:k] if len(dists) > k else np.arange(len(dists))
+                cand_rows.append(top + start)
+                cand_dists.append(dists[top])
+        if not cand_rows:
+            return []
+        rows, dists = np.concatenate(cand_rows), np.concatenate(cand_dists)
+        if len(rows) > k:
+            keep = np.argpartition(dists, k)[:k]
+            rows, dists = rows[keep], dists[keep]
+        order = np.argsort(dists, kind="stable")
+        rows, dists = rows[order], dists[order]
+        finite = np.isfinite(dists)
+        return [(self._document(r, texts, spans, columns), float(max(d, 0.0)))
+                for r, d in zip(rows[finite], dists[finite])]
+
+    def similarity_search_with_score(self, query, k=4, filter=None, **kwargs):
+        return self._search(self._embedding.embed_query(query), k, filter)
+
+    def similarity_search_by_vector_with_relevance_scores(self, embedding, k=4, filter=None, **kwargs):
+        # Same convention as langchain_chroma: the "relevance score" is the raw distance
+        return self._search(embedding, k, filter)
+
+    def similarity_search_by_vector(self, embedding, k=4, filter=None, **kwargs):
+        return [doc for doc, _ in self._search(embedding, k, filter)]
+
+    def similarity_search(self, query, k=4, filter=None, **kwargs):
+        return [doc for doc, _ in self.similarity_search_with_score(query, k=k, filter=filter)]
+
+    def _select_relevance_score_fn(self):
+        return self._euclidean_relevance_score_fn
+
+    def get(self, ids=None, where=None, limit=None, include=("documents", "metadatas")):
+        """Chroma-compatible get(): {"ids", "documents", "metadatas", "embeddings"} (not included -> None)."""
+        with self._lock:
+            if ids is not None:
+                rows = [self._row_of[i] for i in ids if i in self._row_of]
+            else:
+                rows = [r for start, end in self._row_spans(where) for r in range(start, end) if self.alive[r]]
+            if limit is not None:
+                rows = rows[:limit]
+            vectors, norms, scales, spans, texts = self._arrays()
+            result = {"ids": [self.ids[r] for r in rows], "documents": None, "metadatas": None, "embeddings": None}
+            if "documents" in include or "metadatas" in include:
+                docs = [self._document(r, texts, spans, self.columns) for r in rows]
+                if "documents" in include:
+                    result["documents"] = [d.page_content for d in docs]
+                if "metadatas" in include:
+                    result["metadatas"] = [d.metadata for d in docs]
+            if "embeddings" in include:
+                rows_arr = np.asarray(rows, dtype=np.int64)
+                result["embeddings"] = (np.asarray(vectors[rows_arr], dtype=np.float32)
+                                        * (scales[rows_arr] * norms[rows_arr])[:, None])
+        return result
+
+    @classmethod
+    def from_texts(cls, texts, embedding, metadatas=None, ids=None, path=None, **kwargs):
+        store = cls(path, embedding, **kwargs)
+        store.add_texts(texts, metadatas=metadatas, ids=ids)
+        store.persist()
+        return store
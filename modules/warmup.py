@@ -0,0 +1,88 @@
+import time
+import threading
+from modules.telemetry import log_event
+
+# ==========================================
+# CONFIGURATION
+# ==========================================
+# Loaded in this order: the first question needs the graph and the embedder before the LLM
+WARMUP_STEPS = ["graph", "embeddings", "router", "vectorstore", "answer_cache", "llm"]
+
+_thread = None
+_thread_lock = threading.Lock()
+_timings = {}
+
+
+def _warm_graph():
+    # Importing langgraph (and compiling both graphs) is most of the module's cost
+    import modules.graph  # noqa: F401
+
+
+def _warm_embeddings():
+    from modules.embeddings import get_embedding_model
+    # The first call also initialises the model's tokenizer and weights
+    get_embedding_model().embed_query("warm up")
+
+
+def _warm_router():
+    from modules.router import classify_local
+    classify_local("warm up")  # Builds the intent centroids
+
+
+def _warm_vectorstore():
+    # Only the imports: stores are per corpus and opened on first use
+    import chromadb  # noqa: F401
+    import langchain_chroma  # noqa: F401
+
+
+def _warm_answer_cache():
+    from modules.answer_cache import get_answer_cache
+    get_answer_cache()
+
+
+def _warm_llm():
+    from modules.agents import get_llm
+    get_llm()
+
+
+_STEP_FUNCTIONS = {
+    "graph": _warm_graph,
+    "embeddings": _warm_embeddings,
+    "router": _warm_router,
+    "vectorstore": _warm_vectorstore,
+    "answer_cache": _warm_answer_cache,
+    "llm": _warm_llm,
+}
+
+
+def warm_up(steps=None):
+    """
+    Loads the process-wide resources (graph, embedder, Chroma, answer cache, LLM client)
+    so the first question does not pay for them. Returns {step: ms}. A failing step is
+    logged and skipped: the resource is then loaded on first use as before.
+    """
+    for step in steps or WARMUP_STEPS:
+        start = time.perf_counter()
+        try:
+            _STEP_FUNCTIONS[step]()
+        except Exception as e:
+            log_event("warmup_failed", step=step, error=str(e))
+            continue
+        _timings[step] = round((time.perf_counter() - start) * 1000, 2)
+    log_event("warmup", **_timings)
+    return dict(_timings)
+
+
+def start_warmup():
+    """Starts warm_up() once per process on a daemon thread and returns the thread."""
+    global _thread
+    with _thread_lock:
+        if _thread is None:
+            _thread = threading.Thread(target=warm_up, name="warmup", daemon=True)
+            _thread.start()
+    return _thread
+
+
+def get_warmup_timings():
+    """{step: ms} of the steps finished so far."""
+    return dict(_timings)
@@ -0,0 +1,45 @@
+import os
+import sys
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Deterministic local LLM: no API key, no network
+os.environ.setdefault("USE_STUB_LLM", "1")
+
+
+@pytest.fixture(autouse=True)
+def workdir(tmp_path, monkeypatch):
+    """
+    Every test runs in its own empty working directory (all storage paths are relative)
+    with deterministic hash embeddings, and leaves no open stores behind.
+    """
+    from langchain_core.embeddings import DeterministicFakeEmbedding
+    from modules import ingestion, lexical, highlights
+    from modules.embeddings import set_embedding_model
+
+    monkeypatch.chdir(tmp_path)
+    set_embedding_model(DeterministicFakeEmbedding(size=64))
+    highlights.load_highlight_index.cache_clear()
+    yield tmp_path
+    for corpus_id in {key[0] for key in list(ingestion._clients)}:
+        ingestion.close_vectorstore(corpus_id)
+    for corpus_id in list(lexical._indexes):
+        lexical.drop_lexical_index(corpus_id)
+    highlights.load_highlight_index.cache_clear()
+
+
+@pytest.fixture
+def text_pdf():
+    """make(path, pages): writes a PDF with one page per text in `pages` and returns an upload of it."""
+    import fitz
+    from benchmarks.synthetic import LocalUpload
+
+    def make(path, pages):
+        doc = fitz.open()
+        for text in pages:
+            page = doc.new_page()
+            page.insert_textbox(fitz.Rect(50, 50, 550, 800), text, fontsize=9)
+        doc.save(path)
+        doc.close()
+        return LocalUpload(path)
+    return make
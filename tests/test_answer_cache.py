@@ -0,0 +1,28 @@
+from langchain_core.documents import Document
+from modules.answer_cache import AnswerCache
+
+
+def make_cache(**kwargs):
+    return AnswerCache(path="storage/answer_cache.sqlite", **kwargs)
+
+
+def test_answers_are_reused_only_for_the_same_corpus_version(workdir):
+    cache = make_cache()
+    doc = Document(page_content="Total: 1200 EUR", metadata={"chunk_id": "c1", "page_number": 2})
+    cache.store("What is the total?", "v1", "rag", "1200 EUR", [doc])
+
+    hit = make_cache().lookup("What is the total?", "v1")  # Persisted across instances
+    assert hit["intent"] == "rag" and hit["answer"] == "1200 EUR"
+    assert hit["documents"][0].metadata == {"chunk_id": "c1", "page_number": 2}
+    assert cache.lookup("What is the total?", "v2") is None
+    assert cache.lookup("Who signed the contract?", "v1") is None
+    assert cache.stats()["misses"] == 2
+
+
+def test_least_recently_used_answers_are_evicted(workdir):
+    cache = make_cache(max_entries=2)
+    for question in ["first question", "second question", "third question"]:
+        cache.store(question, "v1", "rag", question.upper(), [])
+    assert cache.stats()["entries"] == 2
+    assert cache.lookup("first question", "v1") is None
+    assert cache.lookup("third question", "v1")["answer"] == "THIRD QUESTION"
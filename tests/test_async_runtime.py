@@ -0,0 +1,52 @@
+import asyncio
+import threading
+import pytest
+from modules.async_runtime import run_async, iterate_async, submit, llm_slot, LLM_MAX_CONCURRENCY
+
+
+async def fail():
+    raise RuntimeError("boom")
+
+
+def test_run_async_returns_results_and_raises_errors():
+    assert run_async(asyncio.sleep(0, result=42)) == 42
+    with pytest.raises(RuntimeError):
+        run_async(fail())
+
+
+def test_iterate_async_yields_everything_in_order():
+    async def numbers():
+        for i in range(5):
+            yield i
+            await asyncio.sleep(0)
+    assert list(iterate_async(numbers())) == [0, 1, 2, 3, 4]
+
+
+def test_abandoned_iteration_cancels_the_task_and_frees_its_llm_slot():
+    released = []
+
+    def endless_stream():
+        done = threading.Event()
+        released.append(done)
+
+        async def stream():
+            try:
+                async with llm_slot():
+                    while True:
+                        yield "token"
+                        await asyncio.sleep(0.01)
+            finally:
+                done.set()
+        return stream()
+
+    # More abandoned streams than there are LLM slots
+    for _ in range(LLM_MAX_CONCURRENCY + 1):
+        items = iterate_async(endless_stream())
+        assert next(items) == "token"
+        items.close()
+    assert all(done.wait(5) for done in released)
+
+    async def needs_slot():
+        async with llm_slot():
+            return "ok"
+    assert submit(needs_slot()).result(timeout=5) == "ok"
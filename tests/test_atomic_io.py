@@ -0,0 +1,38 @@
+import os
+import json
+import threading
+from modules.atomic_io import atomic_write, atomic_write_json
+
+
+def test_concurrent_writers_never_leave_a_partial_file(workdir):
+    path = os.path.join("storage", "summaries", "doc.json")
+    errors = []
+
+    def write(worker):
+        try:
+            for i in range(50):
+                atomic_write_json(path, {"worker": worker, "i": i, "pad": "x" * 20000})
+        except Exception as e:  # A shared temp path fails with FileNotFoundError on os.replace
+            errors.append(e)
+
+    threads = [threading.Thread(target=write, args=(n,)) for n in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    with open(path, "r", encoding="utf-8") as f:
+        assert json.load(f)["i"] == 49
+    assert os.listdir(os.path.dirname(path)) == ["doc.json"]
+
+
+def test_failed_write_keeps_the_old_file_and_no_temp_file(workdir):
+    atomic_write("blob.pdf", b"old")
+    try:
+        atomic_write("blob.pdf", object())
+    except TypeError:
+        pass
+    with open("blob.pdf", "rb") as f:
+        assert f.read() == b"old"
+    assert os.listdir(".") == ["blob.pdf"]
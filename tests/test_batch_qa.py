@@ -0,0 +1,51 @@
+import json
+import pytest
+from modules.batch_qa import run_batch
+from modules.corpora import new_corpus_id
+from modules.ingestion import ingest_pdf
+from benchmarks.synthetic import make_pdf, LocalUpload
+
+
+def write_questions(path, questions):
+    with open(path, "w", encoding="utf-8") as f:
+        for record in questions:
+            f.write(json.dumps(record) + "\n")
+
+
+def read_answers(path):
+    """Complete records only (a half-written line of an interrupted run is skipped)."""
+    answers = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                answers.append(json.loads(line))
+            except json.JSONDecodeError:
+                continue
+    return answers
+
+
+def test_empty_corpus_is_an_error(workdir):
+    write_questions("questions.jsonl", [{"id": "q1", "question": "What is the payment amount?"}])
+    with pytest.raises(ValueError, match=r"\?corpus="):
+        run_batch("questions.jsonl", "answers.jsonl", corpus_id=new_corpus_id(), workers=1)
+    assert not (workdir / "answers.jsonl").exists()
+
+
+def test_rerun_skips_answered_questions(workdir):
+    corpus_id = new_corpus_id()
+    ingest_pdf([LocalUpload(make_pdf(str(workdir / "report.pdf"), pages=2, seed=3))], workers=1,
+               corpus_id=corpus_id)
+    questions = [{"id": "q1", "question": "What is the payment amount?"},
+                 {"id": "q2", "question": "Who is the supplier?", "batch": "b1"}]
+    write_questions("questions.jsonl", questions[:1])
+    assert run_batch("questions.jsonl", "answers.jsonl", corpus_id=corpus_id, workers=2)["answered"] == 1
+    # Interrupted mid-write: the partial line is ignored and q1 is not answered again
+    with open("answers.jsonl", "a", encoding="utf-8") as f:
+        f.write('{"id": "q2", "answ')
+
+    write_questions("questions.jsonl", questions)
+    summary = run_batch("questions.jsonl", "answers.jsonl", corpus_id=corpus_id, workers=2)
+    assert (summary["skipped"], summary["answered"], summary["failed"]) == (1, 1, 0)
+    answers = read_answers("answers.jsonl")
+    assert [a["id"] for a in answers] == ["q1", "q2"]
+    assert answers[1]["batch"] == "b1" and answers[1]["answer"] and answers[1]["chunk_ids"]
@@ -0,0 +1,73 @@
+import os
+import time
+import signal
+import pytest
+from modules import blobs, telemetry
+from modules.blobs import put_blob, blob_path, open_pdf
+
+
+def test_put_blob_stores_content_once(workdir):
+    doc_hash = put_blob(b"%PDF-1.4 data")
+    assert put_blob(b"%PDF-1.4 data") == doc_hash
+    with open(blob_path(doc_hash), "rb") as f:
+        assert f.read() == b"%PDF-1.4 data"
+    assert os.listdir(os.path.dirname(blob_path(doc_hash))) == [f"{doc_hash}.pdf"]
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="needs os.fork")
+def test_forked_child_does_not_inherit_held_locks(workdir, text_pdf):
+    path = str(workdir / "a.pdf")
+    text_pdf(path, ["hello"])
+    with open_pdf(path):
+        pass
+    # Another thread of the parent holds both locks at fork time
+    with blobs._handles_lock, telemetry._metrics_lock:
+        pid = os.fork()
+        if pid == 0:
+            try:
+                with open_pdf(path) as doc:
+                    ok = doc.page_count == 1 and "pdf_chat_pdf_handles_total" in telemetry.render_prometheus()
+                os._exit(0 if ok else 1)
+            finally:
+                os._exit(2)
+    deadline = time.monotonic() + 10
+    while True:
+        done, status = os.waitpid(pid, os.WNOHANG)
+        if done:
+            break
+        if time.monotonic() > deadline:
+            os.kill(pid, signal.SIGKILL)
+            os.waitpid(pid, 0)
+            pytest.fail("forked child deadlocked on a lock held by the parent")
+        time.sleep(0.05)
+    assert os.WEXITSTATUS(status) == 0
+
+
+def test_blobs_of_queued_jobs_are_not_collected(workdir, monkeypatch):
+    from modules import jobs
+    from modules.corpora import collect_orphaned_highlights, new_corpus_id
+
+    queued, orphan = put_blob(b"%PDF queued upload"), put_blob(b"%PDF orphan")
+    # A job re-queued after a restart, whose upload is older than the grace period
+    monkeypatch.setattr(jobs, "_enqueue", lambda job: None)
+    jobs.submit_ingestion([("queued.pdf", blob_path(queued))], new_corpus_id())
+    monkeypatch.setattr(blobs, "BLOB_GRACE_SECONDS", -1)
+
+    collect_orphaned_highlights()
+    assert os.path.exists(blob_path(queued))
+    assert not os.path.exists(blob_path(orphan))
+
+
+def test_read_pdf_reuses_the_shared_handle(workdir, text_pdf, monkeypatch):
+    path = str(workdir / "a.pdf")
+    text_pdf(path, ["hello"])
+    with open(path, "rb") as f:
+        data = f.read()
+    assert blobs.read_pdf(path) == data
+
+    opened = []
+    monkeypatch.setattr(blobs, "_Handle", lambda p: opened.append(p))
+    assert blobs.read_pdf(path) == data
+    with open_pdf(path) as doc:
+        assert doc.page_count == 1
+    assert opened == []
@@ -0,0 +1,52 @@
+import random
+from langchain_core.documents import Document
+from modules.context import pack_context, count_tokens
+
+PAGE = " ".join(f"word{i}" for i in range(300))
+
+
+def chunk(start, length, score=None, page=1, source="report.pdf"):
+    metadata = {"source_document": source, "page_number": page, "start_index": start}
+    if score is not None:
+        metadata["score"] = f"{score:.4f}"
+    return Document(page_content=PAGE[start:start + length], metadata=metadata)
+
+
+def plain(doc, text):
+    return text
+
+
+def test_packed_context_never_exceeds_the_budget():
+    rng = random.Random(0)
+    docs = [chunk(rng.randrange(0, 1500), rng.randrange(50, 600), score=rng.random(), page=i) for i in range(40)]
+    for budget in (5, 50, 200, 1000):
+        context, packed, used = pack_context(docs, formatter=plain, budget=budget)
+        assert packed and used <= budget
+        assert count_tokens(context) <= budget
+
+
+def test_most_relevant_chunks_come_first_and_survive_a_small_budget():
+    docs = [chunk(0, 200, score=0.9, page=1), chunk(0, 200, score=0.1, page=2), chunk(0, 200, score=0.5, page=3)]
+    _, packed, _ = pack_context(docs, formatter=plain, budget=10_000)
+    assert [d.metadata["page_number"] for d in packed] == [2, 3, 1]
+
+    _, packed, _ = pack_context(docs, formatter=plain, budget=count_tokens(PAGE[:200]) + 5)
+    assert [d.metadata["page_number"] for d in packed] == [2]
+
+
+def test_overlap_between_neighbouring_chunks_is_packed_once():
+    first, second = chunk(0, 400, score=0.1), chunk(300, 400, score=0.2)  # 100 characters shared
+    overlap = PAGE[300:400]
+    context, packed, _ = pack_context([second, first], formatter=plain, budget=10_000, separator="|")
+    assert packed == [first, second]
+    assert context == PAGE[0:400] + "|" + PAGE[400:700]
+    assert context.count(overlap) == 1
+
+    # Another page or document with the same offsets is not an overlap
+    other = chunk(300, 400, score=0.3, source="other.pdf")
+    context, packed, _ = pack_context([first, other], formatter=plain, budget=10_000, separator="|")
+    assert context.count(overlap) == 2
+
+    # A chunk entirely inside one already packed adds nothing
+    _, packed, _ = pack_context([first, chunk(100, 200, score=0.5)], formatter=plain, budget=10_000)
+    assert packed == [first]
@@ -0,0 +1,82 @@
+import os
+import json
+import time
+import pytest
+from modules import corpora
+from modules.corpora import (new_corpus_id, is_valid_corpus_id, corpus_path, upload_dir, delete_corpus,
+                             touch_corpus, load_registry, evict_idle_corpora, DEFAULT_CORPUS)
+
+
+@pytest.mark.parametrize("corpus_id", ["../..", "..", "/etc", "abc", "0123456789ab/..", "0123456789AB",
+                                       "0123456789ab\n", 123])
+def test_rejects_corpus_ids_not_minted_by_new_corpus_id(corpus_id):
+    assert not is_valid_corpus_id(corpus_id)
+    with pytest.raises(ValueError):
+        corpus_path("./storage/manifest.json", corpus_id)
+    with pytest.raises(ValueError):
+        upload_dir(corpus_id)
+    with pytest.raises(ValueError):
+        delete_corpus(corpus_id)
+    with pytest.raises(ValueError):
+        touch_corpus(corpus_id)
+
+
+def test_accepts_minted_and_default_ids():
+    corpus_id = new_corpus_id()
+    assert is_valid_corpus_id(corpus_id)
+    assert is_valid_corpus_id(DEFAULT_CORPUS) and is_valid_corpus_id(None)
+    assert corpus_path("./storage/manifest.json", corpus_id) == os.path.join(corpora.CORPORA_DIR, corpus_id,
+                                                                            "manifest.json")
+
+
+def test_delete_corpus_refuses_paths_outside_the_storage_dir(workdir):
+    # A corpus directory that is a symlink out of the storage dir must not be followed
+    outside = workdir / "precious"
+    outside.mkdir()
+    (outside / "keep.txt").write_text("x")
+    corpus_id = new_corpus_id()
+    os.makedirs(corpora.CORPORA_DIR)
+    os.symlink(outside, os.path.join(corpora.CORPORA_DIR, corpus_id))
+    with pytest.raises(ValueError):
+        delete_corpus(corpus_id)
+    assert (outside / "keep.txt").exists()
+
+
+def test_invalid_registry_entries_are_never_evicted(workdir):
+    os.makedirs(corpora.CORPORA_DIR)
+    (workdir / "app_file.txt").write_text("x")
+    with open(corpora.REGISTRY_PATH, "w", encoding="utf-8") as f:
+        json.dump({"../..": {"created": 0, "last_used": 0}}, f)
+    assert load_registry() == {}
+    assert evict_idle_corpora(ttl_seconds=0) == []
+    assert (workdir / "app_file.txt").exists()
+
+
+def test_idle_corpus_is_evicted(workdir):
+    corpus_id = new_corpus_id()
+    touch_corpus(corpus_id)
+    os.makedirs(corpus_path("./storage/chroma_db", corpus_id))
+    time.sleep(0.01)
+    assert evict_idle_corpora(ttl_seconds=0) == [corpus_id]
+    assert not os.path.exists(os.path.join(corpora.CORPORA_DIR, corpus_id))
+    assert corpus_id not in load_registry()
+
+
+def test_shared_caches_are_counted_and_collected_with_the_last_corpus(workdir):
+    from modules.ingestion import save_manifest
+    from modules.summaries import SUMMARY_DIR
+    from modules.representatives import REPRESENTATIVE_DIR
+
+    corpus_id, doc_hash = new_corpus_id(), "ab" * 32
+    touch_corpus(corpus_id)
+    save_manifest({"documents": {doc_hash: {"chunk_ids": []}}}, corpus_id)
+    caches = [os.path.join(directory, f"{doc_hash}.json") for directory in (SUMMARY_DIR, REPRESENTATIVE_DIR)]
+    for path in caches:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write("x" * 1000)
+    assert corpora.corpus_disk_usage(corpus_id) >= 2000
+
+    delete_corpus(corpus_id)
+    corpora.collect_orphaned_highlights()
+    assert not any(os.path.exists(path) for path in caches)
@@ -0,0 +1,58 @@
+import json
+from modules.dedup import DuplicateIndex, DuplicateFilter, normalize_for_dedup
+from modules.ingestion import ingest_pdf, get_vectorstore
+from modules.agents import retrieve_documents
+
+INVOICE = ("Invoice {number}. Supplier Acme Logistics GmbH delivers the goods listed in the annex to the "
+           "customer within thirty days of receipt of this order. Payment of the total amount is due within "
+           "fourteen days of delivery to the account named in the contract. Late payments incur a penalty of "
+           "two percent per month. Questions about this invoice are answered by the accounts team.")
+
+
+def test_only_identical_text_is_collapsed():
+    index = DuplicateIndex()
+    assert index.find_or_add("a", "Page header:  ACME Corp.") is None
+    assert index.find_or_add("b", "page header acme corp") == "a"
+    assert index.find_or_add("c", INVOICE.format(number="INV-2023-0001")) is None
+    assert index.find_or_add("d", INVOICE.format(number="INV-2023-0002")) is None
+
+
+def test_normalization_ignores_case_whitespace_and_punctuation():
+    assert normalize_for_dedup("Total:\n  EUR 1,200.") == normalize_for_dedup("total eur 1 200")
+
+
+def test_query_filter_keeps_templated_chunks_with_different_codes():
+    seen = DuplicateFilter()
+    assert seen.is_new(INVOICE.format(number="INV-2023-0001"))
+    assert seen.is_new(INVOICE.format(number="INV-2023-0002"))
+    # The same invoice again, with different whitespace and a trailing remark, is a near-duplicate
+    assert not seen.is_new(INVOICE.format(number="INV-2023-0001").replace(". ", ".  ") + " Thank you.")
+
+
+def test_comparing_two_templated_invoices_retrieves_both(workdir, text_pdf):
+    uploads = [text_pdf(str(workdir / f"{number}.pdf"), [INVOICE.format(number=number)])
+               for number in ("INV-2023-0001", "INV-2023-0002")]
+    ingest_pdf(uploads, workers=1)
+
+    result = retrieve_documents({"question": "Compare invoice INV-2023-0001 with INV-2023-0002",
+                                 "intent": "reason", "corpus_id": None})
+    texts = " ".join(doc.page_content for doc in result["documents"])
+    assert "INV-2023-0001" in texts and "INV-2023-0002" in texts
+
+
+def test_templated_pages_are_all_indexed(workdir, text_pdf):
+    upload = text_pdf(str(workdir / "invoices.pdf"),
+                      [INVOICE.format(number="INV-2023-0001"), INVOICE.format(number="INV-2023-0002"),
+                       INVOICE.format(number="INV-2023-0001")])
+    ingest_pdf([upload], workers=1)
+
+    data = get_vectorstore().get(include=["documents", "metadatas"])
+    assert len(data["ids"]) == 2
+    assert any("INV-2023-0002" in text for text in data["documents"])
+    # The identical third page is collapsed into the first one, with its location recorded
+    first = next(m for t, m in zip(data["documents"], data["metadatas"]) if "INV-2023-0001" in t)
+    assert [3, 0] in json.loads(first["locations"])
+
+    result = retrieve_documents({"question": "What is the amount of invoice INV-2023-0002?", "intent": "rag",
+                                 "corpus_id": None})
+    assert "INV-2023-0002" in result["documents"][0].page_content
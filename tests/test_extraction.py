@@ -0,0 +1,22 @@
+from modules.extraction import plan_tasks, iter_extracted
+from benchmarks.synthetic import make_pdf
+
+
+def test_process_pool_matches_in_process_extraction(workdir):
+    path = make_pdf(str(workdir / "report.pdf"), pages=6, seed=3)
+    tasks, files = plan_tasks([("report", path)], pages_per_task=2)
+    assert files["report"] == {"pages": 6, "error": None} and len(tasks) == 3
+
+    in_process = [output for _, output in iter_extracted(tasks, workers=1)]
+    pooled = [output for _, output in iter_extracted(tasks, workers=2)]
+    assert pooled == in_process
+    assert {chunk[0] for output in pooled for chunk in output} == {1, 2, 3, 4, 5, 6}
+
+
+def test_resume_skips_committed_pages_and_reports_unreadable_files(workdir):
+    path = make_pdf(str(workdir / "report.pdf"), pages=6, seed=3)
+    (workdir / "broken.pdf").write_bytes(b"not a pdf")
+    tasks, files = plan_tasks([("report", path), ("broken", str(workdir / "broken.pdf"))],
+                              pages_per_task=2, start_pages={"report": 4})
+    assert [task[2:] for task in tasks] == [(4, 6)]
+    assert files["broken"]["error"]
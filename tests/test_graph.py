@@ -0,0 +1,38 @@
+import asyncio
+from modules.ingestion import ingest_pdf
+from modules.graph import app_graph, astream_graph
+
+PAGES = ["Payment terms. The customer pays invoice INV-7731 within fourteen days of delivery. "
+         "Late payment incurs a penalty of two percent per month.",
+         "Warranty. The supplier warrants the goods for twenty four months from delivery."]
+
+
+def initial_state(question):
+    return {"question": question, "messages": [], "documents": [], "intent": "", "file_names": ["terms.pdf"],
+            "corpus_id": None}
+
+
+def test_rag_evidence_is_streamed_before_the_answer(workdir, text_pdf):
+    ingest_pdf([text_pdf(str(workdir / "terms.pdf"), PAGES)], workers=1)
+
+    async def collect():
+        return [event async for event in astream_graph(initial_state("What is the payment amount of INV-7731?"))]
+
+    events = asyncio.run(collect())
+    kinds = [kind if kind != "node" else payload[0] for kind, payload in events]
+    assert "token" in kinds
+    evidence = next(i for i, (kind, payload) in enumerate(events)
+                    if kind == "node" and payload[1].get("documents"))
+    assert events[evidence][1][0] == "retrieve_node"
+    assert evidence < kinds.index("token")
+
+    final = events[-1][1]
+    assert final["intent"] == "rag" and final["messages"] and final["documents"]
+    assert "".join(payload for kind, payload in events if kind == "token") == final["messages"][0]
+
+
+def test_sync_graph_routes_reason_through_retrieval(workdir, text_pdf):
+    ingest_pdf([text_pdf(str(workdir / "terms.pdf"), PAGES)], workers=1)
+    nodes = [name for update in app_graph.stream(initial_state("Compare the payment and warranty terms"),
+                                                 stream_mode="updates") for name in update]
+    assert nodes == ["planner", "retrieve_node", "reason_node"]
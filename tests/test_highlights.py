@@ -0,0 +1,42 @@
+from modules import highlights
+from modules.highlights import get_highlight_annotations, load_highlight_index
+from modules.ingestion import ingest_pdf, get_vectorstore, get_indexed_documents
+from modules.blobs import blob_path
+
+PAGES = ["The customer pays the invoice within thirty days of delivery.",
+         "The supplier repairs warranty defects reported within twenty four months."]
+
+
+def indexed_chunks(workdir, text_pdf):
+    ingest_pdf([text_pdf(str(workdir / "contract.pdf"), PAGES)], workers=1)
+    doc_hash = get_indexed_documents()["contract.pdf"]
+    docs = get_vectorstore().similarity_search("warranty", k=10)
+    return doc_hash, {doc.metadata["page_number"]: doc for doc in docs}
+
+
+def test_indexed_chunks_use_the_precomputed_boxes(workdir, text_pdf, monkeypatch):
+    doc_hash, docs = indexed_chunks(workdir, text_pdf)
+    monkeypatch.setattr(highlights, "get_highlight_coordinates",
+                        lambda *args: (_ for _ in ()).throw(AssertionError("searched the PDF")))
+
+    annotations = get_highlight_annotations(docs[2], blob_path(doc_hash))
+    page, boxes = load_highlight_index(doc_hash)[docs[2].metadata["chunk_id"]]
+    assert page == 2 and len(annotations) == len(boxes) > 0
+    assert all(a["page"] == 2 and a["width"] > 0 and a["height"] > 0 for a in annotations)
+
+
+def test_chunks_without_a_sidecar_entry_fall_back_to_text_search(workdir, text_pdf):
+    doc_hash, docs = indexed_chunks(workdir, text_pdf)
+    expected = get_highlight_annotations(docs[2], blob_path(doc_hash))
+
+    # Indexed before the sidecar existed: no doc_hash in the metadata
+    legacy = docs[2].model_copy()
+    legacy.metadata = {k: v for k, v in docs[2].metadata.items() if k != "doc_hash"}
+    found = get_highlight_annotations(legacy, blob_path(doc_hash))
+    assert found and all(a["page"] == 2 for a in found)
+    # The text search finds the start of the chunk, i.e. the first precomputed line
+    assert abs(found[0]["y"] - expected[0]["y"]) < 2
+
+    # Unknown chunk ID (sidecar written before the chunk existed)
+    legacy.metadata = dict(docs[2].metadata, chunk_id="unknown")
+    assert get_highlight_annotations(legacy, blob_path(doc_hash)) == found
@@ -0,0 +1,101 @@
+import functools
+import pytest
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from modules import ingestion, extraction
+from modules.ingestion import ingest_pdf, load_manifest, get_vectorstore, get_indexed_documents
+from modules.embeddings import set_embedding_model
+from modules.lexical import get_lexical_index
+from modules.corpora import new_corpus_id
+
+PAGES = [f"Page {n} of the annual report. Revenue in region {n} grew by {n} percent." for n in range(1, 6)]
+
+
+class CountingEmbedding(DeterministicFakeEmbedding):
+    embedded: list = []
+
+    def embed_documents(self, texts):
+        self.embedded.extend(texts)
+        return super().embed_documents(texts)
+
+
+class Interrupted(Exception):
+    pass
+
+
+@pytest.fixture
+def embedder():
+    model = CountingEmbedding(size=64)
+    set_embedding_model(model)
+    return model
+
+
+def stored_ids(corpus_id=None):
+    return set(get_vectorstore(corpus_id).get()["ids"])
+
+
+def test_unchanged_reupload_embeds_nothing(workdir, text_pdf, embedder):
+    upload = text_pdf(str(workdir / "report.pdf"), PAGES)
+    ingest_pdf([upload], workers=1)
+    ids, embedded = stored_ids(), len(embedder.embedded)
+    assert embedded == len(ids) > 0
+
+    ingest_pdf([upload], workers=1)
+    assert len(embedder.embedded) == embedded
+    assert stored_ids() == ids
+
+
+def test_changed_file_replaces_its_chunks(workdir, text_pdf, embedder):
+    other = text_pdf(str(workdir / "other.pdf"), ["An unrelated memo about office supplies."])
+    ingest_pdf([text_pdf(str(workdir / "report.pdf"), PAGES), other], workers=1)
+    old_hash = get_indexed_documents()["report.pdf"]
+    old_ids = set(load_manifest()["documents"][old_hash]["chunk_ids"])
+    other_ids = stored_ids() - old_ids
+
+    changed = text_pdf(str(workdir / "report.pdf"), PAGES[:2] + ["Page 3 was rewritten entirely."])
+    ingest_pdf([changed, other], workers=1)
+    new_hash = get_indexed_documents()["report.pdf"]
+    new_ids = set(load_manifest()["documents"][new_hash]["chunk_ids"])
+    assert new_hash != old_hash and old_hash not in load_manifest()["documents"]
+    assert stored_ids() == new_ids | other_ids
+    assert not new_ids & old_ids  # Chunk IDs include the content hash
+    assert get_lexical_index().search("rewritten")[0][0] in new_ids
+
+
+def test_removed_file_loses_its_chunks_and_manifest_entry(workdir, text_pdf, embedder):
+    report = text_pdf(str(workdir / "report.pdf"), PAGES)
+    memo = text_pdf(str(workdir / "memo.pdf"), ["An unrelated memo about office supplies."])
+    ingest_pdf([report, memo], workers=1)
+    memo_hash = get_indexed_documents()["memo.pdf"]
+    memo_ids = set(load_manifest()["documents"][memo_hash]["chunk_ids"])
+
+    ingest_pdf([report], workers=1)
+    assert list(get_indexed_documents()) == ["report.pdf"]
+    assert not stored_ids() & memo_ids
+    assert get_lexical_index().search("office supplies") == []
+
+
+def test_interrupted_ingestion_resumes_to_the_same_chunks(workdir, text_pdf, embedder, monkeypatch):
+    # One page per task: a checkpoint after every page
+    monkeypatch.setattr(ingestion, "plan_tasks", functools.partial(extraction.plan_tasks, pages_per_task=1))
+    upload = text_pdf(str(workdir / "report.pdf"), PAGES)
+    reference = new_corpus_id()
+    ingest_pdf([upload], workers=1, corpus_id=reference)
+
+    def stop_after_two_pages(pages_done, total_pages, message):
+        if pages_done >= 2:
+            raise Interrupted()
+
+    corpus_id = new_corpus_id()
+    with pytest.raises(Interrupted):
+        ingest_pdf([upload], workers=1, corpus_id=corpus_id, progress_callback=stop_after_two_pages)
+    checkpoint = load_manifest(corpus_id)["in_progress"]
+    assert [entry["pages_done"] for entry in checkpoint.values()] == [2]
+
+    embedder.embedded.clear()
+    ingest_pdf([upload], workers=1, corpus_id=corpus_id)
+    manifest, expected = load_manifest(corpus_id), load_manifest(reference)
+    assert manifest["in_progress"] == {}
+    assert manifest["documents"] == expected["documents"]
+    assert stored_ids(corpus_id) == stored_ids(reference)
+    # Only the pages after the checkpoint were embedded again
+    assert embedder.embedded and all("Page 1 " not in text and "Page 2 " not in text for text in embedder.embedded)
@@ -0,0 +1,49 @@
+import time
+from modules import extraction
+from modules.ingestion import load_manifest
+from modules.corpora import new_corpus_id
+from modules.blobs import put_blob, blob_path
+from modules.jobs import submit_ingestion, get_job, is_active
+
+PAGES = [f"Page {n} of the annual report. Revenue in region {n} grew by {n} percent." for n in range(1, 6)]
+
+
+def test_submitted_job_reports_progress_and_documents(workdir, text_pdf, monkeypatch):
+    monkeypatch.setattr(extraction, "INGEST_WORKERS", 1)
+    upload = text_pdf(str(workdir / "report.pdf"), PAGES)
+    doc_hash = put_blob(bytes(upload.getbuffer()))
+    corpus_id = new_corpus_id()
+
+    job_id = submit_ingestion([("report.pdf", blob_path(doc_hash))], corpus_id)
+    deadline = time.monotonic() + 30
+    while is_active(get_job(job_id)) and time.monotonic() < deadline:
+        time.sleep(0.05)
+
+    job = get_job(job_id)
+    assert job["status"] == "done", job["message"]
+    assert job["documents_done"] == ["report.pdf"] and job["errors"] == {}
+    assert job["pages_done"] == job["total_pages"] == len(PAGES)
+    assert doc_hash in load_manifest(corpus_id)["documents"]
+
+
+def test_idle_corpora_are_evicted_without_new_uploads(workdir, monkeypatch):
+    import threading
+    from modules import corpora, jobs
+    from modules.corpora import touch_corpus, load_registry
+
+    monkeypatch.setattr(corpora, "CORPUS_TTL_SECONDS", 0.2)
+    idle, busy = new_corpus_id(), new_corpus_id()
+    touch_corpus(idle)
+    touch_corpus(busy)
+    monkeypatch.setitem(jobs._active, "job-of-busy", busy)
+
+    stop = threading.Event()
+    thread = jobs.start_eviction_thread(interval=0.05, stop=stop)
+    try:
+        deadline = time.monotonic() + 5
+        while idle in load_registry() and time.monotonic() < deadline:
+            time.sleep(0.05)
+    finally:
+        stop.set()
+        thread.join(5)
+    assert load_registry().keys() == {busy}
@@ -0,0 +1,43 @@
+import numpy as np
+from modules.representatives import representative_rows, representative_chunks, load_clusters
+from modules.ingestion import ingest_pdf, get_vectorstore, get_indexed_documents
+from benchmarks.synthetic import make_pdf, LocalUpload
+
+
+def test_one_representative_per_cluster_nearest_its_centroid():
+    rng = np.random.default_rng(0)
+    centers = np.eye(8, dtype=np.float32)[:3] * 10
+    vectors = np.concatenate([center + rng.normal(scale=0.5, size=(10, 8)) for center in centers])
+    labels, rows, distances = representative_rows(vectors, 3)
+
+    assert sorted(row // 10 for row in rows) == [0, 1, 2]  # One chunk from each group
+    assert [len(set(labels[i * 10:(i + 1) * 10])) for i in range(3)] == [1, 1, 1]
+    assert all(0 <= d < 0.05 for d in distances)
+    # Fewer chunks than clusters: every chunk represents itself
+    assert representative_rows(vectors[:2], 3)[1] == [0, 1]
+
+
+def test_assignments_are_cached_per_document_and_k(workdir, monkeypatch):
+    ingest_pdf([LocalUpload(make_pdf(str(workdir / "report.pdf"), pages=6, seed=2))], workers=1)
+    doc_hash = get_indexed_documents()["report.pdf"]
+    vectorstore = get_vectorstore()
+    total = len(vectorstore.get(where={"doc_hash": doc_hash})["ids"])
+
+    docs = representative_chunks(vectorstore, doc_hash, 3)
+    assert len(docs) == 3 < total
+    assert len({d.metadata["chunk_id"] for d in docs}) == 3
+    pages = [(d.metadata["page_number"], d.metadata["start_index"]) for d in docs]
+    assert pages == sorted(pages) and all("score" in d.metadata for d in docs)
+
+    # Cached: no embeddings are loaded again for the same k
+    loads = []
+    original_get = vectorstore.get
+    monkeypatch.setattr(vectorstore, "get", lambda *a, **kw: loads.append(kw.get("include")) or original_get(*a, **kw))
+    assert [d.metadata["chunk_id"] for d in representative_chunks(vectorstore, doc_hash, 3)] == \
+        [d.metadata["chunk_id"] for d in docs]
+    assert not any("embeddings" in (include or []) for include in loads)
+
+    # Another k is clustered once and stored next to the first
+    assert len(representative_chunks(vectorstore, doc_hash, 2)) == 2
+    assert sorted(load_clusters(doc_hash)["by_k"]) == ["2", "3"]
+    assert len(load_clusters(doc_hash)["chunk_ids"]) == total
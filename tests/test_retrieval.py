@@ -0,0 +1,63 @@
+from langchain_core.documents import Document
+from modules.lexical import tokenize, LexicalIndex
+from modules.retrieval import (reciprocal_rank_fusion, hybrid_search, looks_like_exact_lookup, RRF_K)
+from modules.vector_store import NumpyVectorStore
+from modules.embeddings import get_embedding_model
+
+TEXTS = {
+    "c1": "Invoice INV-2023-0001 covers the delivery of pallets to Berlin.",
+    "c2": "Invoice INV-2023-0002 covers the delivery of crates to Hamburg.",
+    "c3": "The warranty period of the supplier is twenty four months.",
+    "c4": "Termination requires ninety days of written notice by either party.",
+}
+
+
+def make_docs():
+    return [Document(page_content=text, metadata={"chunk_id": chunk_id, "source_document": f"{chunk_id}.pdf"})
+            for chunk_id, text in TEXTS.items()]
+
+
+def make_stores():
+    docs = make_docs()
+    vectorstore = NumpyVectorStore("store", get_embedding_model())
+    vectorstore.add_documents(docs, ids=[d.metadata["chunk_id"] for d in docs])
+    index = LexicalIndex(path="bm25.json")
+    index.add_documents(docs)
+    return vectorstore, index
+
+
+def test_tokenize_keeps_codes_whole_and_by_parts():
+    assert tokenize("See INV-2023-0001, clause 4.2.") == ["see", "inv-2023-0001", "inv", "2023", "0001",
+                                                          "clause", "4.2", "4", "2"]
+
+
+def test_bm25_ranks_the_exact_code_first_and_survives_a_reload(workdir):
+    _, index = make_stores()
+    assert index.search("INV-2023-0002")[0][0] == "c2"
+    assert index.search("warranty", filter={"source_document": "c4.pdf"}) == []
+    index.save()
+    assert LexicalIndex(path="bm25.json").search("written notice")[0][0] == "c4"
+
+
+def test_rrf_rewards_agreement_between_lists():
+    fused = reciprocal_rank_fusion([["a", "b", "c"], ["b", "d"]])
+    assert [chunk_id for chunk_id, _ in fused] == ["b", "a", "d", "c"]
+    assert fused[0][1] == 1.0 / (RRF_K + 2) + 1.0 / (RRF_K + 1)
+
+
+def test_exact_lookups_take_the_lexical_fast_path(workdir):
+    vectorstore, index = make_stores()
+    assert looks_like_exact_lookup("What does INV-2023-0002 say?")
+    assert not looks_like_exact_lookup("How long is the warranty?")
+    results = hybrid_search(vectorstore, "What does INV-2023-0002 say?", k=2, index=index)
+    assert results[0][0].metadata["chunk_id"] == "c2" and results[0][1] == 0.0
+
+
+def test_hybrid_mode_returns_fused_documents_with_distance_scores(workdir):
+    vectorstore, index = make_stores()
+    # Hash embeddings: only the identical text is close, so both retrievers rank c3 first
+    results = hybrid_search(vectorstore, TEXTS["c3"], k=3, index=index, mode="hybrid")
+    assert len(results) == 3
+    assert results[0][0].metadata["chunk_id"] == "c3" and results[0][1] == 0.0
+    assert all(0.0 <= score <= 1.0 for _, score in results)
+    assert [s for _, s in results] == sorted(s for _, s in results)
@@ -0,0 +1,51 @@
+import pytest
+from modules import router
+from modules.router import rule_intent, classify_local, route_intent, normalize_question
+
+
+@pytest.fixture(autouse=True)
+def fresh_router(monkeypatch):
+    # Centroids depend on the embedding model, which every test replaces
+    monkeypatch.setattr(router, "_centroids", None)
+    monkeypatch.setattr(router, "_cache", type(router._cache)())
+    monkeypatch.setattr(router, "_stats", dict.fromkeys(router._stats, 0))
+
+
+@pytest.mark.parametrize("question, intent", [
+    ("Summarize all documents", "summarize"),
+    ("Give me an overview", "summarize"),
+    ("Compare the warranty terms across the reports", "reason"),
+    ("What is the invoice number?", None),  # "rag" rules alone never decide
+    ("Compare the summary of both contracts", None),  # Ambiguous
+])
+def test_rule_intent(question, intent):
+    assert rule_intent(question) == intent
+
+
+def test_unambiguous_rule_hits_skip_the_embeddings(monkeypatch):
+    monkeypatch.setattr(router, "get_embedding_model", lambda: pytest.fail("embedded the question"))
+    assert classify_local("Summarize the report") == ("summarize", 0.95, "rule")
+
+
+def test_example_questions_are_close_to_their_own_centroid():
+    intent, confidence, method = classify_local("Who signed the agreement?")
+    assert (intent, method) == ("rag", "centroid") and confidence > 0.5
+
+
+def test_uncertain_questions_fall_back_to_the_llm_once():
+    calls = []
+
+    def fallback(question):
+        calls.append(question)
+        return "reason"
+
+    assert route_intent("Tell me something about pallets", fallback, threshold=1.01) == "reason"
+    assert route_intent("tell me something about pallets!", fallback, threshold=1.01) == "reason"
+    assert calls == ["Tell me something about pallets"]
+    stats = router.get_router_stats()
+    assert stats["llm_fallback"] == 1 and stats["cache_hits"] == 1 and stats["fallback_rate"] == 1.0
+
+
+def test_confident_questions_never_call_the_llm():
+    assert route_intent("Summarize the invoice", lambda q: pytest.fail("called the LLM")) == "summarize"
+    assert normalize_question("  Summarize   the invoice?! ") == "summarize the invoice"
@@ -0,0 +1,89 @@
+from langchain_core.documents import Document
+from modules import summaries, agents
+from modules.summaries import build_summaries, load_summary, _split_to_budget
+from modules.context import count_tokens
+from modules.ingestion import ingest_pdf, get_vectorstore, get_indexed_documents
+from modules.agents import summarization_agent
+from modules.corpora import new_corpus_id
+from modules.stub_llm import StubChatModel
+from benchmarks.synthetic import make_pdf, LocalUpload
+
+
+class RecordingChatModel(StubChatModel):
+    prompts: list = []
+
+    def _reply(self, messages):
+        self.prompts.append("\n".join(str(m.content) for m in messages))
+        return super()._reply(messages)
+
+
+def test_split_to_budget_keeps_every_chunk():
+    chunks = [Document(page_content=f"chunk {i} " + "word " * 90) for i in range(7)]
+    parts = _split_to_budget(chunks, budget=250)
+    assert [c for part in parts for c in part] == chunks
+    assert all(sum(count_tokens(c.page_content) for c in part) <= 250 for part in parts)
+    assert len(parts) > 1
+
+
+def test_dense_page_groups_are_summarized_without_dropping_chunks(workdir, monkeypatch):
+    monkeypatch.setattr(summaries, "GROUP_TOKEN_BUDGET", 300)
+    ingest_pdf([LocalUpload(make_pdf(str(workdir / "dense.pdf"), pages=3, seed=5))], workers=1)
+    doc_hash = get_indexed_documents()["dense.pdf"]
+    model = RecordingChatModel()
+    assert build_summaries({doc_hash: "dense.pdf"}, get_vectorstore(), llm=model, requests_per_second=1000) == 1
+
+    map_prompts = "\n".join(p for p in model.prompts if p.startswith("Summarize pages"))
+    for text in get_vectorstore().get(where={"doc_hash": doc_hash})["documents"]:
+        assert " ".join(text.split()[-8:]) in " ".join(map_prompts.split())
+    assert len(load_summary(doc_hash)["groups"]) > 1  # One page group, split to fit the budget
+
+
+def test_cached_summary_evidence_carries_the_document_hash(workdir):
+    ingest_pdf([LocalUpload(make_pdf(str(workdir / "report.pdf"), pages=2, seed=1))], workers=1, summarize=True)
+    doc_hash = get_indexed_documents()["report.pdf"]
+    result = summarization_agent({"question": "Summarize report", "file_names": ["report.pdf"], "corpus_id": None})
+    assert result["documents"]
+    assert all(d.metadata["chunk_id"].startswith("summary:") for d in result["documents"])
+    assert {d.metadata["doc_hash"] for d in result["documents"]} == {doc_hash}
+    assert len({d.metadata["chunk_id"] for d in result["documents"]}) == len(result["documents"])
+
+
+def test_shared_summary_is_cited_under_each_corpus_file_name(workdir, monkeypatch):
+    path = make_pdf(str(workdir / "report.pdf"), pages=2, seed=1)
+    corpus_a, corpus_b = new_corpus_id(), new_corpus_id()
+    ingest_pdf([LocalUpload(path)], workers=1, summarize=True, corpus_id=corpus_a)
+    renamed = LocalUpload(path)
+    renamed.name = "q3_results.pdf"
+    ingest_pdf([renamed], workers=1, summarize=True, corpus_id=corpus_b)
+
+    assert "source_document" not in load_summary(get_indexed_documents(corpus_b)["q3_results.pdf"])
+    model = RecordingChatModel()
+    monkeypatch.setattr(agents, "get_llm", lambda: model)
+    result = summarization_agent({"question": "Summarize q3_results", "file_names": ["q3_results.pdf"],
+                                  "corpus_id": corpus_b})
+    assert {d.metadata["source_document"] for d in result["documents"]} == {"q3_results.pdf"}
+    assert "q3_results.pdf" in model.prompts[-1] and "report.pdf" not in model.prompts[-1]
+
+
+def test_summary_llm_calls_are_part_of_the_request_trace(workdir):
+    from modules.telemetry import trace_request
+
+    ingest_pdf([LocalUpload(make_pdf(str(workdir / "report.pdf"), pages=12, seed=4))], workers=1)
+    doc_hash = get_indexed_documents()["report.pdf"]
+    with trace_request("summarize") as trace:
+        build_summaries({doc_hash: "report.pdf"}, get_vectorstore(), llm=StubChatModel(), requests_per_second=1000)
+    groups = len(load_summary(doc_hash)["groups"])
+    assert groups > 1
+    # One map call per page group plus the reduce call, all recorded on worker threads
+    assert sum(s["name"] == "llm:summary" for s in trace["spans"]) == groups + 1
+
+
+def test_per_file_retrieval_spans_are_part_of_the_request_trace(workdir):
+    from modules.telemetry import trace_request
+
+    ingest_pdf([LocalUpload(make_pdf(str(workdir / f"{name}.pdf"), pages=2, seed=seed))
+                for seed, name in enumerate(["a", "b"])], workers=1)
+    with trace_request("summarize") as trace:
+        summarization_agent({"question": "Summarize all documents", "file_names": ["a.pdf", "b.pdf"],
+                             "corpus_id": None})
+    assert sum(s["name"] == "retrieval:representatives" for s in trace["spans"]) == 2
@@ -0,0 +1,86 @@
+import os
+import threading
+import pytest
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from modules.vector_store import NumpyVectorStore
+
+EMBEDDINGS = DeterministicFakeEmbedding(size=8)
+
+
+def add(store, names):
+    return store.add_texts([f"text of {n}" for n in names], metadatas=[{"source_document": n} for n in names],
+                           ids=list(names))
+
+
+@pytest.fixture(params=["float16", "int8"])
+def dtype(request):
+    return request.param
+
+
+def test_persisted_rows_survive_reopen_and_search_finds_the_nearest(workdir, dtype):
+    store = NumpyVectorStore("store", EMBEDDINGS, dtype=dtype)
+    add(store, ["a", "b", "c"])
+    store.persist()
+    store.delete(ids=["b"])
+    store.persist()
+
+    reopened = NumpyVectorStore("store", EMBEDDINGS, dtype=dtype)
+    assert reopened.get()["ids"] == ["a", "c"]
+    doc, score = reopened.similarity_search_with_score("text of c", k=1)[0]
+    assert doc.page_content == "text of c" and score < 0.05  # int8 quantization error
+    assert [d.page_content for d in reopened.similarity_search("text of a", k=5, filter={"source_document": "a"})] \
+        == ["text of a"]
+
+
+def test_reader_never_truncates_rows_of_a_writer_in_progress(workdir):
+    writer = NumpyVectorStore("store", EMBEDDINGS)
+    add(writer, ["a", "b"])
+    writer.persist()
+    add(writer, ["c", "d"])  # Appended, not committed yet
+    vectors_size = os.path.getsize(os.path.join("store", "gen-0", "vectors.bin"))
+
+    # Another process opening or reloading the store in the meantime
+    reader = NumpyVectorStore("store", EMBEDDINGS)
+    reader.reload_if_changed()
+    assert reader.get()["ids"] == ["a", "b"]
+    assert len(reader.similarity_search("text of a", k=10)) == 2
+    assert os.path.getsize(os.path.join("store", "gen-0", "vectors.bin")) == vectors_size
+
+    writer.persist()
+    reader.reload_if_changed()
+    assert reader.get()["ids"] == ["a", "b", "c", "d"]
+    assert reader.get(ids=["d"])["documents"] == ["text of d"]
+
+
+def test_second_writer_waits_for_the_first_and_sees_its_rows(workdir):
+    first = NumpyVectorStore("store", EMBEDDINGS)
+    second = NumpyVectorStore("store", EMBEDDINGS)
+    add(first, ["a"])
+
+    thread = threading.Thread(target=lambda: (add(second, ["b"]), second.persist()))
+    thread.start()
+    thread.join(0.3)
+    assert thread.is_alive()  # Blocked on write.lock
+    first.persist()
+    thread.join(5)
+    assert not thread.is_alive()
+
+    assert NumpyVectorStore("store", EMBEDDINGS).get()["ids"] == ["a", "b"]
+
+
+def test_rows_of_a_crashed_writer_are_dropped_by_the_next_writer(workdir):
+    crashed = NumpyVectorStore("store", EMBEDDINGS)
+    add(crashed, ["a", "b"])
+    crashed.persist()
+    add(crashed, ["lost-1", "lost-2", "lost-3"])
+    crashed._lock_file.close()  # The process dies: its flock is released, meta.json never updated
+
+    recovered = NumpyVectorStore("store", EMBEDDINGS)
+    assert recovered.get()["ids"] == ["a", "b"]
+    add(recovered, ["c"])
+    recovered.persist()
+
+    store = NumpyVectorStore("store", EMBEDDINGS)
+    assert store.get()["ids"] == ["a", "b", "c"]
+    assert store.get()["documents"] == ["text of a", "text of b", "text of c"]
+    assert os.path.getsize(os.path.join("store", "gen-0", "spans.bin")) == 3 * 16